@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'seo_api.profiling.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -88,6 +90,29 @@ DATABASES = {
     }
 }
 
+# Cache
+# Upstream results (keyword search volumes, SERP indexes), posted task ids, encoded
+# report bodies and delta snapshots are cached here. The default LocMemCache is per
+# process: gunicorn workers and the refresh scheduler each keep their own copy. In
+# production point it at a shared backend, e.g.
+#   DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   DJANGO_CACHE_LOCATION=redis://redis:6379/1
+# MAX_ENTRIES bounds the local, file and database backends; Django's default of 300
+# would evict a large keyword list while it is being written.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', 'seo-api'),
+    }
+}
+if 'redis' not in CACHES['default']['BACKEND'].lower() and 'memcached' not in CACHES['default']['BACKEND'].lower():
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('DJANGO_CACHE_MAX_ENTRIES', '100000')),
+    }
+
+SEO_KEYWORD_VOLUME_CACHE_TTL = int(os.getenv('SEO_KEYWORD_VOLUME_CACHE_TTL', str(30 * 24 * 60 * 60)))
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -141,3 +166,140 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Request profiling (cProfile + tracemalloc captures)
+# Privileged requests can force a capture with ?profile=1 and the X-Profile-Token header
+
+SEO_PROFILING = {
+    'SAMPLE_RATE': float(os.getenv('SEO_PROFILING_SAMPLE_RATE', '0')),
+    'TOKEN': os.getenv('SEO_PROFILING_TOKEN', ''),
+    'DIR': BASE_DIR / 'profiles',
+    'MAX_CAPTURES': int(os.getenv('SEO_PROFILING_MAX_CAPTURES', '50')),
+    'PATH_PREFIXES': ['/api/seo-report/'],
+}
+
+# Section planner
+# Sections whose derivation fidelity (0-1) reaches MIN_FIDELITY are built from
+# another section's upstream result instead of their own call. 1.0 fetches every
+# section from its own endpoint; e.g. 0.6 builds gmb_profile and local_rankings
+# from the maps SERP. SECTIONS overrides the threshold per section.
+
+SEO_SECTION_PLANNER = {
+    'MIN_FIDELITY': float(os.getenv('SEO_PLANNER_MIN_FIDELITY', '1.0')),
+    'SECTIONS': {},
+}
+
+# Per-section freshness (seconds). A report refresh only re-fetches sections older
+# than this; ?refresh=pagespeed (or =all) forces a section, e.g. after a deploy.
+# Defaults live in seo_api.reports.DEFAULT_SECTION_FRESHNESS; list overrides here,
+# e.g. {'pagespeed': 6 * 60 * 60}.
+
+SEO_SECTION_FRESHNESS = {}
+
+# Background refresh scheduler (python manage.py run_refresh_scheduler)
+# Daily or slower cadences are spread across the off-peak window. Newly tracked
+# domains get their first run at a random point of their first interval.
+# CONCURRENCY is per scheduler process: N processes generate up to N * CONCURRENCY
+# reports at once.
+
+SEO_SCHEDULER = {
+    'CONCURRENCY': int(os.getenv('SEO_SCHEDULER_CONCURRENCY', '4')),
+    'WINDOW_START_HOUR': int(os.getenv('SEO_SCHEDULER_WINDOW_START_HOUR', '1')),
+    'WINDOW_HOURS': int(os.getenv('SEO_SCHEDULER_WINDOW_HOURS', '5')),
+    'JITTER_SECONDS': 15 * 60,
+    'POLL_SECONDS': 30,
+}
+
+# Latency budget
+# Each report runs its sections concurrently within ?budget_ms= (default below,
+# capped at the maximum). Sections that miss it are reported as "timeout".
+# SEO_SECTION_BUDGET_SHARE optionally caps a section at a fraction of the budget.
+
+SEO_REPORT_BUDGET_MS = int(os.getenv('SEO_REPORT_BUDGET_MS', '30000'))
+SEO_REPORT_MAX_BUDGET_MS = int(os.getenv('SEO_REPORT_MAX_BUDGET_MS', '120000'))
+SEO_SECTION_BUDGET_SHARE = {}
+SEO_UPSTREAM_TIMEOUT = int(os.getenv('SEO_UPSTREAM_TIMEOUT', '60'))
+
+# Request hedging for DataForSEO /live endpoints
+# A call still running past the endpoint's recent PERCENTILE latency gets a
+# duplicate; BUDGET_RATIO caps duplicates at that fraction of calls per endpoint.
+
+SEO_HEDGING = {
+    'ENABLED': os.getenv('SEO_HEDGING_ENABLED', 'False') == 'True',
+    'PERCENTILE': 90,
+    'MIN_SAMPLES': 20,
+    'BUDGET_RATIO': float(os.getenv('SEO_HEDGING_BUDGET_RATIO', '0.1')),
+}
+
+# Multi-domain comparison (/api/seo-compare/)
+
+SEO_COMPARE_MAX_DOMAINS = int(os.getenv('SEO_COMPARE_MAX_DOMAINS', '11'))
+
+# Metric history (seo_score, Lighthouse metrics, local rank, benchmark, authority)
+# One append-only file per (domain, metric) column under SEO_TIMESERIES_DIR.
+
+SEO_TIMESERIES_DIR = os.getenv('SEO_TIMESERIES_DIR', str(BASE_DIR / 'timeseries'))
+SEO_TIMESERIES_MAX_POINTS = 1000
+
+# Geo-grid local rank scans (/api/geo-grid/)
+# Grid points are posted as multi-task local_finder task_post batches and
+# collected with task_get; REQUESTS_PER_MINUTE is shared by all scans in a process.
+# Each point's task is remembered for TASK_TTL, so a rescan collects it instead of posting again.
+
+SEO_GEOGRID = {
+    'SPACING_KM': float(os.getenv('SEO_GEOGRID_SPACING_KM', '1.0')),
+    'MAX_WORKERS': int(os.getenv('SEO_GEOGRID_MAX_WORKERS', '8')),
+    'REQUESTS_PER_MINUTE': int(os.getenv('SEO_GEOGRID_REQUESTS_PER_MINUTE', '1000')),
+}
+
+# Organic rank tracking (/api/rank-tracking/)
+# One serp/google/organic task per keyword, posted TASKS_PER_POST at a time; each
+# SERP is cached as a domain -> position index shared by every tracked domain.
+
+SEO_RANK_TRACKING = {
+    'DEPTH': int(os.getenv('SEO_RANK_TRACKING_DEPTH', '100')),
+    'MAX_KEYWORDS': int(os.getenv('SEO_RANK_TRACKING_MAX_KEYWORDS', '1000')),
+    'MAX_WORKERS': int(os.getenv('SEO_RANK_TRACKING_MAX_WORKERS', '4')),
+}
+
+# Site crawls (/api/site-crawl/)
+# Reports crawl REPORT_PAGES pages (the homepage); site crawls take a page budget up
+# to MAX_PAGES. Crawled pages are streamed to DIR/<domain>/<task id>.jsonl.gz.
+
+SEO_SITE_CRAWL = {
+    'REPORT_PAGES': int(os.getenv('SEO_SITE_CRAWL_REPORT_PAGES', '1')),
+    'MAX_PAGES': int(os.getenv('SEO_SITE_CRAWL_MAX_PAGES', '1000')),
+    'DIR': BASE_DIR / 'crawls',
+}
+
+# Report tracing
+# Spans are appended to DIR/spans.jsonl by a background writer; privileged requests
+# can list traces at /api/traces/ and view one as a waterfall at /api/traces/<id>/waterfall/.
+# Raise SAMPLE_RATE (up to 1.0) while investigating; every sampled request writes its spans.
+
+SEO_TRACING = {
+    'SAMPLE_RATE': float(os.getenv('SEO_TRACING_SAMPLE_RATE', '0.01')),
+    'DIR': BASE_DIR / 'traces',
+}
+
+# Admission control for report generation (per process)
+# Fresh stored reports always pass. Generations beyond MAX_CONCURRENT wait up to
+# QUEUE_TIMEOUT_MS in a queue of MAX_QUEUE, then get the stale report or a 503.
+
+SEO_ADMISSION = {
+    'MAX_CONCURRENT': int(os.getenv('SEO_ADMISSION_MAX_CONCURRENT', '8')),
+    'MAX_QUEUE': int(os.getenv('SEO_ADMISSION_MAX_QUEUE', '16')),
+    'QUEUE_TIMEOUT_MS': int(os.getenv('SEO_ADMISSION_QUEUE_TIMEOUT_MS', '2000')),
+}
+
+# Upstream call slots (per process)
+# Interactive requests go first and bulk work (scheduler refreshes, clients sending
+# X-Priority: bulk) never takes the last INTERACTIVE_RESERVE slots. Tenants (the
+# authenticated user, else the client address; X-Tenant from privileged callers
+# only) share each class by weighted fair queuing.
+
+SEO_UPSTREAM_SLOTS = {
+    'CAPACITY': int(os.getenv('SEO_UPSTREAM_CAPACITY', '30')),
+    'INTERACTIVE_RESERVE': int(os.getenv('SEO_UPSTREAM_INTERACTIVE_RESERVE', '10')),
+    'TENANT_WEIGHTS': {},
+}
@@ -1,8 +1,42 @@
 from django.contrib import admin
-from .models import SEORequestLog
+from .models import SEORequestLog, DataForSEOLocation, DataForSEOLanguage, ReportSection, SEOReport, TrackedDomain
 
 @admin.register(SEORequestLog)
 class SEORequestLogAdmin(admin.ModelAdmin):
     list_display = ('domain', 'request_time', 'response_status', 'seo_score')
     list_filter = ('response_status', 'request_time')
-    search_fields = ('domain',)
\ No newline at end of file
+    search_fields = ('domain',)
+
+
+@admin.register(DataForSEOLocation)
+class DataForSEOLocationAdmin(admin.ModelAdmin):
+    list_display = ('location_name', 'location_code', 'location_type', 'country_iso_code')
+    list_filter = ('location_type',)
+    search_fields = ('location_name',)
+
+
+@admin.register(DataForSEOLanguage)
+class DataForSEOLanguageAdmin(admin.ModelAdmin):
+    list_display = ('language_name', 'language_code')
+    search_fields = ('language_name', 'language_code')
+
+
+@admin.register(ReportSection)
+class ReportSectionAdmin(admin.ModelAdmin):
+    list_display = ('section', 'scope_key', 'source', 'fetched_at')
+    list_filter = ('section', 'source')
+    exclude = ('data',)
+
+
+@admin.register(SEOReport)
+class SEOReportAdmin(admin.ModelAdmin):
+    list_display = ('website', 'business_name', 'location', 'seo_score', 'generated_at')
+    search_fields = ('website', 'business_name')
+    exclude = ('data',)
+
+
+@admin.register(TrackedDomain)
+class TrackedDomainAdmin(admin.ModelAdmin):
+    list_display = ('website', 'keywords', 'location', 'cadence_hours', 'is_active', 'next_run_at', 'last_status')
+    list_filter = ('is_active', 'last_status')
+    search_fields = ('website', 'keywords')
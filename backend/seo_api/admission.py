@@ -0,0 +1,102 @@
+# seo_api/admission.py
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+DEFAULT_ADMISSION = {
+    "MAX_CONCURRENT": 8,         # Uncached report generations at once, per process
+    "MAX_QUEUE": 16,             # Requests allowed to wait for a slot; more are rejected at once
+    "QUEUE_TIMEOUT_MS": 2000,    # Longest a request waits for a slot before it is rejected
+    "DEFAULT_RETRY_AFTER": 5,    # Retry-After (seconds) before any generation time is known
+}
+
+
+def get_admission_config():
+    config = dict(DEFAULT_ADMISSION)
+    config.update(getattr(settings, "SEO_ADMISSION", {}))
+    return config
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many reports in progress; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a short bounded wait queue.
+
+    Up to MAX_CONCURRENT generations run at once; up to MAX_QUEUE more wait at
+    most QUEUE_TIMEOUT_MS for a slot, and anything beyond that is rejected
+    straight away, so an upstream slowdown turns into fast 503s instead of a
+    growing backlog. Limits are per process (per gunicorn worker).
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_admission_config()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._avg_seconds = None
+        self._cond = threading.Condition()
+
+    def retry_after(self):
+        """Seconds until a slot is likely free: the queue ahead drained at the recent generation rate"""
+        if self._avg_seconds is None:
+            return self.config["DEFAULT_RETRY_AFTER"]
+        backlog = (self.waiting + 1) / self.config["MAX_CONCURRENT"]
+        return max(1, math.ceil(self._avg_seconds * backlog))
+
+    def _reject(self):
+        self.rejected += 1
+        raise AdmissionRejected(self.retry_after())
+
+    @contextmanager
+    def admit(self):
+        """Hold a generation slot for the block; yields the milliseconds spent waiting for it"""
+        start = time.monotonic()
+        with self._cond:
+            if self.active >= self.config["MAX_CONCURRENT"]:
+                if self.waiting >= self.config["MAX_QUEUE"]:
+                    self._reject()
+                self.waiting += 1
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self.active < self.config["MAX_CONCURRENT"],
+                        timeout=self.config["QUEUE_TIMEOUT_MS"] / 1000,
+                    )
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self._reject()
+            self.active += 1
+
+        began = time.monotonic()
+        try:
+            yield (began - start) * 1000
+        finally:
+            elapsed = time.monotonic() - began
+            with self._cond:
+                self.active -= 1
+                # Moving average of generation time for Retry-After
+                self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+                self._cond.notify()
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Process-wide controller shared by every report request"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
@@ -0,0 +1,140 @@
+# seo_api/competitors.py
+from django.db.models import Avg, Count, Max, Min, Q
+from django.utils import timezone
+
+from .domains import registrable_domain
+from .models import CompetitorObservation
+
+
+def _normalize(value):
+    return str(value or '').strip().lower()
+
+
+def record_competitors(website, location, keywords, competitor_data=None, maps_data=None):
+    """
+    Feed the competitor index from one report's serp_competitors and maps results.
+
+    Existing observations for the same (subject, location, keyword, domain, source)
+    are updated in place, so the index grows incrementally as reports arrive.
+    """
+    subject = registrable_domain(website)
+    location = _normalize(location)
+    keywords = [_normalize(k) for k in keywords if _normalize(k)]
+    observed_at = timezone.now()
+    rows = {}
+
+    def add(keyword, domain, source, position, visibility=None, rating=None):
+        keyword, domain = _normalize(keyword), registrable_domain(domain)
+        if not keyword or not domain:
+            return
+        key = (keyword, domain, source)
+        previous = rows.get(key)
+        if previous and previous.position is not None and (position is None or previous.position <= position):
+            return
+        rows[key] = CompetitorObservation(
+            subject_domain=subject,
+            location=location,
+            keyword=keyword,
+            domain=domain,
+            source=source,
+            position=position,
+            visibility=visibility,
+            rating=rating,
+            observed_at=observed_at,
+        )
+
+    for item in (competitor_data or {}).get('items') or []:
+        positions = item.get('keywords_positions') or {}
+        if positions:
+            for keyword, ranks in positions.items():
+                ranks = [r for r in (ranks or []) if isinstance(r, (int, float))]
+                add(keyword, item.get('domain'), 'serp_competitors',
+                    min(ranks) if ranks else item.get('avg_position'),
+                    item.get('visibility'), item.get('rating'))
+        else:
+            for keyword in keywords:
+                add(keyword, item.get('domain'), 'serp_competitors',
+                    item.get('avg_position'), item.get('visibility'), item.get('rating'))
+
+    # The maps search is made for the comma-joined keyword list; record it under each keyword
+    maps_keywords = [k for k in _normalize((maps_data or {}).get('keyword')).split(',') if k.strip()] or keywords
+    for item in (maps_data or {}).get('items') or []:
+        for keyword in maps_keywords:
+            add(keyword, item.get('domain'), 'maps',
+                item.get('rank_absolute'), None, (item.get('rating') or {}).get('value'))
+
+    if rows:
+        CompetitorObservation.objects.bulk_create(
+            list(rows.values()),
+            update_conflicts=True,
+            unique_fields=['subject_domain', 'location', 'keyword', 'domain', 'source'],
+            update_fields=['position', 'visibility', 'rating', 'observed_at'],
+        )
+    return len(rows)
+
+
+def competitors_of(domain, location, limit=20, source=None):
+    """
+    Who competes with `domain` in `location`: every other domain seen on the
+    keywords the domain ranks for or was reported on, across all reports.
+    With `source` ("serp_competitors" or "maps") positions come from that
+    source only.
+    """
+    domain, location = registrable_domain(domain), _normalize(location)
+    keywords = (
+        CompetitorObservation.objects
+        .filter(location=location)
+        .filter(Q(domain=domain) | Q(subject_domain=domain))
+        .values_list('keyword', flat=True)
+        .distinct()
+    )
+    observations = CompetitorObservation.objects.filter(location=location, keyword__in=keywords)
+    if source:
+        observations = observations.filter(source=source)
+    return list(
+        observations
+        .exclude(domain=domain)
+        .values('domain')
+        .annotate(
+            shared_keywords=Count('keyword', distinct=True),
+            avg_position=Avg('position'),
+            best_position=Min('position'),
+            visibility=Max('visibility'),
+        )
+        .order_by('-shared_keywords', 'avg_position')[:limit]
+    )
+
+
+def top_domains_for_keyword(keyword, location, limit=20):
+    return list(
+        CompetitorObservation.objects
+        .filter(location=_normalize(location), keyword=_normalize(keyword))
+        .values('domain')
+        .annotate(
+            avg_position=Avg('position'),
+            best_position=Min('position'),
+            visibility=Max('visibility'),
+            rating=Max('rating'),
+        )
+        .order_by('avg_position')[:limit]
+    )
+
+
+def rank_among_competitors(domain, location, source='serp_competitors'):
+    """
+    `domain`'s rank by average position among its indexed competitors. Maps
+    and organic positions are different metrics, so only `source` is used;
+    rank is None when the domain has no position there.
+    """
+    domain, location = registrable_domain(domain), _normalize(location)
+    own = (
+        CompetitorObservation.objects
+        .filter(location=location, domain=domain, source=source)
+        .aggregate(avg_position=Avg('position'))
+    )['avg_position']
+    competitors = competitors_of(domain, location, limit=None, source=source)
+    if own is None:
+        return {'rank': None, 'total': len(competitors) + 1, 'avg_position': None}
+
+    ahead = sum(1 for c in competitors if c['avg_position'] is not None and c['avg_position'] < own)
+    return {'rank': ahead + 1, 'total': len(competitors) + 1, 'avg_position': own}
@@ -0,0 +1,182 @@
+# seo_api/crawls.py
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+from .domains import canonical_host
+
+
+DEFAULT_SITE_CRAWL = {
+    "REPORT_PAGES": 1,           # Pages crawled for a report's on-page section (1 = homepage only)
+    "MAX_PAGES": 1000,           # Largest page budget a site crawl may ask for
+    "PAGE_SIZE": 1000,           # Pages read per on_page/pages call (the API maximum)
+    "SLOWEST_PAGES": 10,         # Slowest pages kept in the audit
+    "DUPLICATE_TITLES": 20,      # Duplicate title groups kept in the audit
+    "SAMPLE_URLS": 3,            # URLs listed per duplicate title
+    "DIR": "crawls",             # Crawled pages directory (relative to BASE_DIR)
+}
+
+# on_page checks that report something present or correct rather than a problem
+NON_ISSUE_CHECKS = frozenset({
+    "is_www", "is_https", "is_http", "has_micromarkup", "has_html_doctype", "canonical",
+    "meta_charset_consistency", "seo_friendly_url", "seo_friendly_url_characters_check",
+    "seo_friendly_url_dynamic_check", "seo_friendly_url_keywords_check",
+    "seo_friendly_url_relative_length_check",
+})
+
+_TASK_ID = re.compile(r'^[\w-]+$')
+
+
+def get_site_crawl_config():
+    config = dict(DEFAULT_SITE_CRAWL)
+    config.update(getattr(settings, "SEO_SITE_CRAWL", {}))
+    return config
+
+
+def get_crawl_dir(website):
+    crawl_dir = Path(get_site_crawl_config()["DIR"])
+    if not crawl_dir.is_absolute():
+        crawl_dir = Path(settings.BASE_DIR) / crawl_dir
+    return crawl_dir / canonical_host(website)
+
+
+def crawl_pages_file(website, task_id):
+    """Where a finished crawl's pages are kept (gzipped JSON lines); None for a malformed task id"""
+    if not task_id or not _TASK_ID.match(task_id):
+        return None
+    return get_crawl_dir(website) / f"{task_id}.jsonl.gz"
+
+
+def load_site_audit(website, task_id):
+    """The stored audit of a crawl already ingested, or None"""
+    path = crawl_pages_file(website, task_id)
+    if path is None:
+        return None
+    try:
+        with open(path.with_name(f"{task_id}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class SiteAudit:
+    """
+    Site-wide aggregates over crawled pages, updated one batch at a time so
+    only the current batch, the slowest-pages heap and the title index are
+    ever held in memory.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_site_crawl_config()
+        self.pages = 0
+        self.issues = {}
+        self.status_codes = {}
+        self._score_total = 0.0
+        self._scored = 0
+        self._slowest = []
+        # Title digest -> first URL; promoted to _duplicates when seen again
+        self._titles = {}
+        self._duplicates = {}
+
+    def add(self, pages):
+        for page in pages:
+            self.pages += 1
+            url = page.get("url")
+
+            for check, failed in (page.get("checks") or {}).items():
+                if failed and check not in NON_ISSUE_CHECKS:
+                    self.issues[check] = self.issues.get(check, 0) + 1
+
+            status_class = f"{str(page.get('status_code') or 0)[0]}xx"
+            self.status_codes[status_class] = self.status_codes.get(status_class, 0) + 1
+
+            if page.get("onpage_score") is not None:
+                self._score_total += page["onpage_score"]
+                self._scored += 1
+
+            duration = (page.get("page_timing") or {}).get("duration_time")
+            if duration is not None:
+                entry = (duration, url or "")
+                if len(self._slowest) < self.config["SLOWEST_PAGES"]:
+                    heapq.heappush(self._slowest, entry)
+                elif entry > self._slowest[0]:
+                    heapq.heapreplace(self._slowest, entry)
+
+            title = ((page.get("meta") or {}).get("title") or "").strip()
+            if title:
+                self._add_title(title, url)
+
+    def _add_title(self, title, url):
+        digest = hashlib.sha1(title.lower().encode("utf-8")).digest()[:8]
+        duplicate = self._duplicates.get(digest)
+        if duplicate is not None:
+            duplicate["count"] += 1
+            if len(duplicate["urls"]) < self.config["SAMPLE_URLS"]:
+                duplicate["urls"].append(url)
+        elif digest in self._titles:
+            first_url = self._titles.pop(digest)
+            self._duplicates[digest] = {"title": title, "count": 2, "urls": [first_url, url][:self.config["SAMPLE_URLS"]]}
+        else:
+            self._titles[digest] = url
+
+    def result(self):
+        duplicates = sorted(self._duplicates.values(), key=lambda d: d["count"], reverse=True)
+        return {
+            "pages": self.pages,
+            "average_onpage_score": round(self._score_total / self._scored, 2) if self._scored else None,
+            "issues": dict(sorted(self.issues.items(), key=lambda item: item[1], reverse=True)),
+            "status_codes": self.status_codes,
+            "slowest_pages": [
+                {"url": url, "duration_time": duration}
+                for duration, url in sorted(self._slowest, reverse=True)
+            ],
+            "duplicate_titles": duplicates[:self.config["DUPLICATE_TITLES"]],
+            "duplicate_title_pages": sum(d["count"] for d in duplicates),
+        }
+
+
+class CrawlPageWriter:
+    """
+    Streams a crawl's pages to disk batch by batch. Pages go to a .part file
+    that replaces the final file only on commit(), so an ingestion cut short
+    (deadline, upstream error) leaves nothing behind and is simply redone.
+    """
+
+    def __init__(self, website, task_id):
+        self.path = crawl_pages_file(website, task_id)
+        if self.path is None:
+            raise ValueError(f"Invalid crawl task id: {task_id}")
+        self._part = self.path.with_name(self.path.name + ".part")
+        self._file = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self._part, "wt", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        # Still there unless committed
+        if self._part.exists():
+            self._part.unlink()
+
+    def write(self, pages):
+        for page in pages:
+            self._file.write(json.dumps(page, separators=(",", ":"), default=str) + "\n")
+
+    def commit(self, audit):
+        """Publish the pages and their audit"""
+        self._file.close()
+        self._file = None
+        os.replace(self._part, self.path)
+        summary = self.path.with_name(self.path.name.replace(".jsonl.gz", ".json"))
+        with open(summary, "w", encoding="utf-8") as f:
+            json.dump(audit, f)
@@ -0,0 +1,92 @@
+# seo_api/deadlines.py
+import contextvars
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+# Timeout for upstream calls made outside any report deadline (seconds)
+DEFAULT_UPSTREAM_TIMEOUT = 60
+
+# Whole-report budget when the request does not pass ?budget_ms= (milliseconds)
+DEFAULT_REPORT_BUDGET_MS = 30000
+
+_current_deadline = contextvars.ContextVar('seo_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """A point in time (monotonic clock) a piece of work has to finish by"""
+
+    def __init__(self, budget_ms, parent=None):
+        expires_at = time.monotonic() + budget_ms / 1000
+        if parent is not None:
+            expires_at = min(expires_at, parent.expires_at)
+        self.budget_ms = budget_ms
+        self.expires_at = expires_at
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def child(self, share):
+        """A deadline for part of the work, limited to `share` of this budget"""
+        return Deadline(self.budget_ms * share, parent=self)
+
+
+def get_report_budget_ms():
+    return getattr(settings, 'SEO_REPORT_BUDGET_MS', DEFAULT_REPORT_BUDGET_MS)
+
+
+def get_section_budget_share(section):
+    """Fraction (0-1] of the report budget one section may use; sections run concurrently"""
+    return getattr(settings, 'SEO_SECTION_BUDGET_SHARE', {}).get(section, 1.0)
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline):
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def upstream_timeout():
+    """
+    Timeout for the next upstream call: the remaining time of the current
+    deadline, capped at SEO_UPSTREAM_TIMEOUT.
+    """
+    timeout = getattr(settings, 'SEO_UPSTREAM_TIMEOUT', DEFAULT_UPSTREAM_TIMEOUT)
+    deadline = current_deadline()
+    if deadline is None:
+        return timeout
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded("Deadline expired before the upstream call was sent")
+    return min(timeout, remaining)
+
+
+def sleep_within_deadline(seconds):
+    """time.sleep that never sleeps past the current deadline"""
+    deadline = current_deadline()
+    if deadline is not None:
+        seconds = min(seconds, deadline.remaining())
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's context variables (deadline, etc.) into the worker"""
+    context = contextvars.copy_context()
+    return executor.submit(context.run, fn, *args, **kwargs)
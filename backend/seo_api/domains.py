@@ -0,0 +1,120 @@
+# seo_api/domains.py
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+
+# Multi-label public suffixes we see in practice. Any other host falls back to its
+# last label as the suffix. SEO_PUBLIC_SUFFIX_FILE can point at a full
+# publicsuffix.org list to extend this.
+MULTI_LABEL_SUFFIXES = {
+    'co.uk', 'org.uk', 'me.uk', 'ltd.uk', 'plc.uk', 'net.uk', 'ac.uk', 'gov.uk', 'nhs.uk',
+    'com.au', 'net.au', 'org.au', 'edu.au', 'gov.au', 'id.au',
+    'co.nz', 'net.nz', 'org.nz', 'govt.nz',
+    'co.za', 'org.za', 'gov.za',
+    'co.in', 'net.in', 'org.in', 'firm.in', 'gen.in', 'ind.in',
+    'co.jp', 'ne.jp', 'or.jp', 'ac.jp', 'go.jp',
+    'co.kr', 'or.kr', 'ne.kr',
+    'com.br', 'net.br', 'org.br', 'gov.br',
+    'com.mx', 'org.mx', 'gob.mx',
+    'com.ar', 'com.co', 'com.pe', 'com.ve', 'com.ec', 'com.uy', 'cl.cl',
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn',
+    'com.hk', 'org.hk', 'com.tw', 'org.tw', 'com.sg', 'org.sg', 'com.my', 'com.ph', 'com.vn',
+    'co.id', 'or.id', 'co.th', 'in.th',
+    'com.tr', 'org.tr', 'co.il', 'org.il', 'com.sa', 'com.eg', 'com.pk', 'com.bd',
+    'com.ng', 'co.ke', 'co.tz', 'co.ug', 'com.gh',
+    'com.ua', 'com.pl', 'com.ru', 'com.es', 'com.pt', 'com.gr', 'com.cy', 'com.mt',
+    'co.at', 'or.at', 'co.hu',
+    'github.io', 'herokuapp.com', 'blogspot.com', 'wordpress.com', 'wixsite.com',
+    'myshopify.com', 'squarespace.com', 'netlify.app', 'vercel.app', 'onrender.com',
+}
+
+_suffix_index = None
+
+
+def _get_suffix_index():
+    """The suffix set, built once per process"""
+    global _suffix_index
+    if _suffix_index is None:
+        suffixes = set(MULTI_LABEL_SUFFIXES)
+        path = getattr(settings, 'SEO_PUBLIC_SUFFIX_FILE', None)
+        if path:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip().lower()
+                        # Wildcard and exception rules are rare enough to ignore here
+                        if line and not line.startswith(('//', '*', '!')) and '.' in line:
+                            suffixes.add(line)
+            except OSError as e:
+                print(f"Error loading public suffix list: {str(e)}")
+        _suffix_index = suffixes
+    return _suffix_index
+
+
+def canonical_host(value):
+    """
+    Reduce a URL or domain to its host: no scheme, port, path, trailing dot
+    or leading "www.". Returns '' for empty or unparsable input.
+    """
+    value = str(value or '').strip().lower()
+    if not value:
+        return ''
+    if '://' not in value:
+        value = '//' + value
+    try:
+        host = urlsplit(value).hostname or ''
+    except ValueError:
+        return ''
+    host = host.rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    return host
+
+
+def registrable_domain(value):
+    """
+    The registrable domain (public suffix plus one label): shop.example.co.uk
+    and https://www.example.co.uk/contact both give example.co.uk.
+    """
+    host = canonical_host(value)
+    if not host:
+        return ''
+    labels = host.split('.')
+    if len(labels) <= 2 or host.replace('.', '').isdigit():
+        return host
+
+    suffixes = _get_suffix_index()
+    # Longest matching suffix wins; the default suffix is the last label
+    for i in range(1, len(labels) - 1):
+        if '.'.join(labels[i:]) in suffixes:
+            return '.'.join(labels[i - 1:])
+    return '.'.join(labels[-2:])
+
+
+class DomainIndex:
+    """
+    Dict-backed lookup of items (maps listings, competitors, SERP results) by
+    registrable domain. The first item seen for a domain wins, so build it from
+    results in rank order.
+    """
+
+    def __init__(self, items, fields=('domain', 'url')):
+        self.items = {}
+        for item in items or []:
+            if not isinstance(item, dict):
+                continue
+            for field in fields:
+                domain = registrable_domain(item.get(field))
+                if domain:
+                    self.items.setdefault(domain, item)
+                    break
+
+    def __contains__(self, value):
+        return registrable_domain(value) in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, value, default=None):
+        return self.items.get(registrable_domain(value), default)
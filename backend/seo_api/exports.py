@@ -0,0 +1,110 @@
+# seo_api/exports.py
+import csv
+import io
+import json
+import re
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .domains import canonical_host
+from .models import SEORequestLog, SEOReport
+
+
+# Rows fetched per database round trip; also the rows per chunk of output
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# kind: (model, exported fields, domain field, time field)
+EXPORTS = {
+    'logs': (
+        SEORequestLog,
+        ('id', 'domain', 'request_time', 'response_status', 'seo_score'),
+        'domain',
+        'request_time',
+    ),
+    'reports': (
+        SEOReport,
+        ('id', 'report_key', 'business_name', 'website', 'location', 'language',
+         'seo_score', 'generated_at', 'last_modified', 'etag', 'data'),
+        'website',
+        'generated_at',
+    ),
+}
+
+
+def domain_pattern(domain):
+    """
+    Regex matching a stored URL or domain whose canonical host is exactly
+    `domain`'s, whatever its scheme, www. prefix, port or path. A substring
+    match would let ea.com pick up idea.com.
+    """
+    host = re.escape(canonical_host(domain) or str(domain).strip().lower())
+    return rf'^([a-z][a-z0-9+.-]*://)?(www\.)?{host}\.?(:[0-9]+)?([/?#].*)?$'
+
+
+def export_queryset(kind, domain=None, since=None, until=None):
+    """The rows of one export kind, as a values_list in primary key order"""
+    model, fields, domain_field, time_field = EXPORTS[kind]
+    queryset = model.objects.all()
+    if domain:
+        queryset = queryset.filter(**{f'{domain_field}__iregex': domain_pattern(domain)})
+    if since:
+        queryset = queryset.filter(**{f'{time_field}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{time_field}__lt': until})
+    return queryset.order_by('pk').values_list(*fields)
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':'))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def iter_export(kind, fmt, chunk_size=EXPORT_CHUNK_SIZE, **filters):
+    """
+    Yield the export as text chunks of up to `chunk_size` rows.
+
+    Rows are read with a chunked .iterator(), so neither the queryset nor the
+    output is ever held in memory as a whole.
+    """
+    _, fields, _, _ = EXPORTS[kind]
+    rows = export_queryset(kind, **filters).iterator(chunk_size=chunk_size)
+    buffer = io.StringIO()
+
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        write = lambda row: writer.writerow([_csv_value(value) for value in row])
+    else:
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+        write = lambda row: buffer.write(encoder.encode(dict(zip(fields, row))) + '\n')
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_stream(chunks):
+    """Gzip a stream of text chunks on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
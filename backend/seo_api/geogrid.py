@@ -0,0 +1,117 @@
+# seo_api/geogrid.py
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from .deadlines import DeadlineExceeded, current_deadline
+
+
+DEFAULT_GEOGRID = {
+    "SIZES": (3, 5, 7, 9, 11, 13),   # Allowed grid sizes (points per side, odd so the business is the centre)
+    "SPACING_KM": 1.0,               # Default distance between neighbouring points
+    "ZOOM": 15,                      # Map zoom sent with each point's coordinate
+    "DEPTH": 20,                     # Local finder results checked per point
+    "TASKS_PER_POST": 100,           # DataForSEO accepts up to 100 tasks per task_post
+    "MAX_WORKERS": 8,
+    "REQUESTS_PER_MINUTE": 1000,     # Shared by every grid scan in the process
+    "POLL_SECONDS": 5,
+    "TASK_TTL": 60 * 60,             # How long a point's task is reused by rescans of the same grid
+}
+
+KM_PER_DEGREE_LAT = 111.32
+
+
+def get_geogrid_config():
+    config = dict(DEFAULT_GEOGRID)
+    config.update(getattr(settings, "SEO_GEOGRID", {}))
+    return config
+
+
+def grid_task_cache_key(keyword, lat, lng, language_fields, config):
+    """A posted local_finder task for one grid point, whichever scan posted it"""
+    language = ",".join(f"{key}={value}" for key, value in sorted(language_fields.items()))
+    raw = f"{keyword.strip()}|{lat},{lng},{config['ZOOM']}|{config['DEPTH']}|{language}".lower()
+    return "seo:grid_task:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def build_grid(lat, lng, size, spacing_km):
+    """
+    A size x size grid of (row, col, lat, lng) centred on the business, row 0
+    being the northernmost row and col 0 the westernmost column.
+    """
+    half = size // 2
+    lat_step = spacing_km / KM_PER_DEGREE_LAT
+    lng_step = spacing_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return [
+        (row, col, round(lat + (half - row) * lat_step, 7), round(lng + (col - half) * lng_step, 7))
+        for row in range(size)
+        for col in range(size)
+    ]
+
+
+def grid_summary(matrix, depth, pending=()):
+    """
+    Aggregate scores over the scanned points (pending points are left out):
+
+    average_rank: mean position where the business was found
+    average_total_rank: mean position counting "not found" as depth + 1
+    top3_share / found_share: fraction of points ranking in the top 3 / at all
+    score: 0-100, 100 being first place at every point
+    """
+    pending = {tuple(point) for point in pending}
+    positions = [
+        position
+        for row, cells in enumerate(matrix)
+        for col, position in enumerate(cells)
+        if (row, col) not in pending
+    ]
+    if not positions:
+        return {"average_rank": None, "average_total_rank": None, "top3_share": 0, "found_share": 0, "score": 0}
+
+    found = [position for position in positions if position is not None]
+    totals = [position if position is not None else depth + 1 for position in positions]
+    return {
+        "average_rank": round(sum(found) / len(found), 2) if found else None,
+        "average_total_rank": round(sum(totals) / len(totals), 2),
+        "top3_share": round(sum(1 for position in found if position <= 3) / len(positions), 3),
+        "found_share": round(len(found) / len(positions), 3),
+        "score": round(sum((depth + 1 - total) / depth for total in totals) / len(totals) * 100),
+    }
+
+
+class RateLimiter:
+    """Thread-safe token bucket spacing upstream calls evenly within a per-minute rate"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait for the next slot; raises DeadlineExceeded if it falls after the current deadline"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            deadline = current_deadline()
+            if deadline is not None and slot > deadline.expires_at:
+                raise DeadlineExceeded("No upstream slot before the deadline")
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Process-wide limiter, so concurrent grid scans share the rate"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = RateLimiter(get_geogrid_config()["REQUESTS_PER_MINUTE"])
+    return _rate_limiter
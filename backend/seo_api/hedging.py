@@ -0,0 +1,172 @@
+# seo_api/hedging.py
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+
+from .deadlines import DeadlineExceeded, current_deadline, submit_in_context
+from .tracing import annotate
+
+
+DEFAULT_HEDGING = {
+    "ENABLED": False,
+    "PERCENTILE": 90,        # Hedge once a call is slower than this percentile of recent calls
+    "MIN_SAMPLES": 20,       # No hedging until an endpoint has this many samples
+    "WINDOW": 200,           # Recent calls kept per endpoint
+    "BUDGET_RATIO": 0.1,     # At most this fraction of an endpoint's calls get a duplicate
+    "BURST": 5,              # Unused hedges an endpoint can save up
+    "MAX_WORKERS": 32,
+}
+
+
+def get_hedging_config():
+    config = dict(DEFAULT_HEDGING)
+    config.update(getattr(settings, "SEO_HEDGING", {}))
+    return config
+
+
+class LatencyTracker:
+    """Latency of the most recent calls per endpoint, for online percentile estimates"""
+
+    def __init__(self, window):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            self._samples[endpoint].append(seconds)
+
+    def percentile(self, endpoint, percentile, min_samples=1):
+        with self._lock:
+            samples = sorted(self._samples[endpoint])
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+
+class HedgeBudget:
+    """
+    Per-endpoint token bucket: each call earns BUDGET_RATIO of a token and each
+    hedge spends one, so duplicates stay below that fraction of calls.
+    """
+
+    def __init__(self, ratio, burst):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def earn(self, endpoint):
+        with self._lock:
+            self._tokens[endpoint] = min(self.burst, self._tokens[endpoint] + self.ratio)
+
+    def spend(self, endpoint):
+        with self._lock:
+            if self._tokens[endpoint] >= 1:
+                self._tokens[endpoint] -= 1
+                return True
+            return False
+
+
+def _remaining():
+    """Seconds left on the current deadline, or None (wait indefinitely) outside one"""
+    deadline = current_deadline()
+    return deadline.remaining() if deadline else None
+
+
+class Hedger:
+    def __init__(self, config=None):
+        self.config = config or get_hedging_config()
+        self.tracker = LatencyTracker(self.config["WINDOW"])
+        self.budget = HedgeBudget(self.config["BUDGET_RATIO"], self.config["BURST"])
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config["MAX_WORKERS"], thread_name_prefix="seo-hedge"
+        )
+        self.hedges_sent = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _timed(self, endpoint, fn, slot=None, started=None):
+        """
+        One attempt. `slot` (a context manager factory) is entered before the
+        clock starts, so time queued for an upstream slot is not counted as
+        upstream latency; `started` is set once the call actually goes out.
+        """
+        with slot() if slot else nullcontext():
+            if started is not None:
+                started.set()
+            start = time.monotonic()
+            try:
+                result = fn()
+            except requests.exceptions.Timeout:
+                # A timeout took at least this long, so leaving it out would make a slow
+                # endpoint look fast; fast failures are left out so they don't pull it down
+                self.tracker.record(endpoint, time.monotonic() - start)
+                raise
+            self.tracker.record(endpoint, time.monotonic() - start)
+            return result
+
+    def call(self, endpoint, fn, slot=None):
+        """
+        Run fn(); if it has not answered by the endpoint's tracked percentile
+        and the hedge budget allows, run a duplicate and return whichever
+        finishes first successfully. Each attempt holds its own `slot`, and the
+        hedge delay counts from when the first attempt got one.
+        """
+        if not self.config["ENABLED"]:
+            with slot() if slot else nullcontext():
+                return fn()
+
+        self.budget.earn(endpoint)
+        delay = self.tracker.percentile(endpoint, self.config["PERCENTILE"], self.config["MIN_SAMPLES"])
+        if delay is None:
+            return self._timed(endpoint, fn, slot)
+
+        started = threading.Event()
+        primary = submit_in_context(self.executor, self._timed, endpoint, fn, slot, started)
+        # Also wakes up if the primary fails before getting a slot
+        primary.add_done_callback(lambda _: started.set())
+        # A saturated executor may not start the primary before the request's deadline
+        if not started.wait(_remaining()):
+            primary.cancel()
+            raise DeadlineExceeded("Deadline expired before the upstream call was sent")
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.budget.spend(endpoint):
+            done, _ = wait([primary], timeout=_remaining())
+            if not done:
+                raise DeadlineExceeded("Deadline expired waiting for the upstream call")
+            return primary.result()
+
+        with self._lock:
+            self.hedges_sent[endpoint] += 1
+        annotate(attempts=2, hedged=True)
+        hedge = submit_in_context(self.executor, self._timed, endpoint, fn, slot)
+        pending = {primary, hedge}
+        while True:
+            done, pending = wait(pending, timeout=_remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("Deadline expired waiting for the upstream call")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+            # Only raise once both attempts have failed
+            if not pending:
+                return done.pop().result()
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger():
+    """Process-wide hedger, so latency history is shared by every service instance"""
+    global _hedger
+    if _hedger is None:
+        with _hedger_lock:
+            if _hedger is None:
+                _hedger = Hedger()
+    return _hedger
@@ -0,0 +1,213 @@
+# seo_api/locations.py
+import bisect
+import difflib
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+
+
+# Bumped by the sync command so workers sharing the cache rebuild their index at once
+INDEX_VERSION_CACHE_KEY = "seo:locale_index_version"
+# Workers that do not share the cache (the default LocMemCache is per process) see a
+# sync through the database instead, checked at most this often
+INDEX_CHECK_SECONDS = 30
+FUZZY_CANDIDATES = 50
+
+
+def normalize_name(value):
+    """Lower-case, strip accents and collapse whitespace (also around commas)"""
+    value = unicodedata.normalize("NFKD", str(value or ""))
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    value = re.sub(r"\s*,\s*", ",", value.lower())
+    return re.sub(r"\s+", " ", value).strip()
+
+
+def _trigrams(value):
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    In-memory lookup over (code, name) entries.
+
+    Exact lookups are dict hits, prefix lookups bisect a sorted name list and
+    fuzzy lookups only score the entries sharing the most trigrams with the query.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.by_code = {str(entry["code"]).lower(): entry for entry in entries}
+        self.by_name = {}
+        for entry in entries:
+            self.by_name.setdefault(entry["normalized_name"], entry)
+
+        self.sorted_names = sorted(self.by_name)
+        self.trigrams = defaultdict(list)
+        for name in self.sorted_names:
+            for gram in _trigrams(name):
+                self.trigrams[gram].append(name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, value):
+        """Resolve an exact name or code"""
+        if value is None:
+            return None
+        return self.by_name.get(normalize_name(value)) or self.by_code.get(str(value).strip().lower())
+
+    def prefix(self, query, limit=10):
+        query = normalize_name(query)
+        if not query:
+            return []
+        start = bisect.bisect_left(self.sorted_names, query)
+        matches = []
+        for name in self.sorted_names[start:]:
+            if not name.startswith(query) or len(matches) >= limit:
+                break
+            matches.append(self.by_name[name])
+        return matches
+
+    def fuzzy(self, query, limit=10, cutoff=0.6):
+        query = normalize_name(query)
+        if not query:
+            return []
+        overlap = Counter()
+        for gram in _trigrams(query):
+            overlap.update(self.trigrams.get(gram, ()))
+        candidates = [name for name, _ in overlap.most_common(FUZZY_CANDIDATES)]
+        scored = []
+        for name in candidates:
+            # Compare against the leading component too, so "new yrok" finds
+            # "new york,new york,united states"
+            ratio = max(
+                difflib.SequenceMatcher(None, query, name).ratio(),
+                difflib.SequenceMatcher(None, query, name.split(",")[0]).ratio(),
+            )
+            if ratio >= cutoff:
+                scored.append((ratio, name))
+        scored.sort(key=lambda item: (-item[0], len(item[1])))
+        return [self.by_name[name] for _, name in scored[:limit]]
+
+    def search(self, query, limit=10):
+        """Prefix matches first, topped up with fuzzy matches"""
+        matches = self.prefix(query, limit)
+        if len(matches) < limit:
+            seen = {entry["code"] for entry in matches}
+            for entry in self.fuzzy(query, limit):
+                if entry["code"] not in seen and len(matches) < limit:
+                    matches.append(entry)
+        return matches
+
+
+class LocaleIndex:
+    def __init__(self, locations, languages):
+        self.locations = locations
+        self.languages = languages
+
+    @classmethod
+    def from_database(cls):
+        from .models import DataForSEOLocation, DataForSEOLanguage
+
+        locations = [
+            {
+                "code": row["location_code"],
+                "name": row["location_name"],
+                "normalized_name": row["normalized_name"],
+                "country_iso_code": row["country_iso_code"],
+                "type": row["location_type"],
+            }
+            for row in DataForSEOLocation.objects.values(
+                "location_code", "location_name", "normalized_name", "country_iso_code", "location_type"
+            ).iterator()
+        ]
+        languages = [
+            {
+                "code": row["language_code"],
+                "name": row["language_name"],
+                "normalized_name": row["normalized_name"],
+            }
+            for row in DataForSEOLanguage.objects.values(
+                "language_code", "language_name", "normalized_name"
+            ).iterator()
+        ]
+        return cls(NameIndex(locations), NameIndex(languages))
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+_index_checked_at = 0.0
+
+
+def _database_version():
+    """
+    Changes with every sync: the sync command replaces all rows, so the
+    highest primary keys move on (and are None before the first sync).
+    """
+    from django.db.models import Max
+    from .models import DataForSEOLocation, DataForSEOLanguage
+
+    return (
+        DataForSEOLocation.objects.aggregate(version=Max("pk"))["version"],
+        DataForSEOLanguage.objects.aggregate(version=Max("pk"))["version"],
+    )
+
+
+def get_locale_index():
+    """Return this process's locale index, rebuilding it after a sync"""
+    global _index, _index_version, _index_checked_at
+    cache_version = cache.get(INDEX_VERSION_CACHE_KEY, 0)
+    if (
+        _index is not None
+        and _index_version[0] == cache_version
+        and time.monotonic() - _index_checked_at < INDEX_CHECK_SECONDS
+    ):
+        return _index
+    with _index_lock:
+        version = (cache_version, _database_version())
+        if _index is None or version != _index_version:
+            _index = LocaleIndex.from_database()
+            _index_version = version
+        _index_checked_at = time.monotonic()
+    return _index
+
+
+def invalidate_locale_index():
+    global _index_checked_at
+    cache.set(INDEX_VERSION_CACHE_KEY, cache.get(INDEX_VERSION_CACHE_KEY, 0) + 1, timeout=None)
+    # This process re-checks the database on its next lookup whatever the cache holds
+    _index_checked_at = 0.0
+
+
+def resolve_locale(location, language):
+    """
+    Validate a location/language pair against the local index.
+
+    Returns (location_entry, language_entry, errors). An entry is None when that
+    list has not been synced yet, in which case the raw name is passed upstream.
+    """
+    index = get_locale_index()
+    errors = {}
+    location_entry = language_entry = None
+
+    if len(index.locations):
+        location_entry = index.locations.get(location)
+        if not location_entry:
+            errors["location"] = {
+                "error": f"Unknown location: {location}",
+                "suggestions": [entry["name"] for entry in index.locations.search(location, limit=5)],
+            }
+    if len(index.languages):
+        language_entry = index.languages.get(language)
+        if not language_entry:
+            errors["language"] = {
+                "error": f"Unknown language: {language}",
+                "suggestions": [entry["name"] for entry in index.languages.search(language, limit=5)],
+            }
+    return location_entry, language_entry, errors
@@ -0,0 +1,65 @@
+import argparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from seo_api.exports import EXPORTS, EXPORT_CHUNK_SIZE, EXPORT_FORMATS, gzip_stream, iter_export
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+
+class Command(BaseCommand):
+    help = "Stream request logs or stored reports as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--output", default="-", help="File to write, or - for stdout")
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output on the fly")
+        parser.add_argument("--domain", help="Only rows for this domain")
+        parser.add_argument("--since", help="ISO datetime; only rows at or after it")
+        parser.add_argument("--until", help="ISO datetime; only rows before it")
+        parser.add_argument("--chunk-size", type=positive_int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {"domain": options["domain"]}
+        for name in ("since", "until"):
+            if options[name]:
+                try:
+                    filters[name] = parse_datetime(options[name])
+                except ValueError:
+                    filters[name] = None
+                if filters[name] is None:
+                    raise CommandError(f"--{name} must be an ISO datetime")
+
+        chunks = iter_export(options["kind"], options["format"], chunk_size=options["chunk_size"], **filters)
+
+        if options["output"] == "-":
+            if options["gzip"]:
+                # Gzip is binary, so it needs the byte stream under stdout
+                out = getattr(self.stdout, "buffer", None)
+                if out is None:
+                    raise CommandError("--gzip needs --output when stdout is a text stream")
+                for chunk in gzip_stream(chunks):
+                    out.write(chunk)
+                out.flush()
+            else:
+                for chunk in chunks:
+                    self.stdout.write(chunk, ending="")
+                self.stdout.flush()
+            return
+
+        if options["gzip"]:
+            chunks = gzip_stream(chunks)
+        else:
+            chunks = (chunk.encode("utf-8") for chunk in chunks)
+
+        with open(options["output"], "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported {options['kind']} to {options['output']}"))
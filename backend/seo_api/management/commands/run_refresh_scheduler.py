@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from seo_api.scheduler import RefreshScheduler, get_scheduler_config
+
+
+class Command(BaseCommand):
+    help = "Pre-compute reports for tracked domains on their refresh cadence"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Refresh the currently due domains and exit")
+        parser.add_argument("--concurrency", type=int, help="Reports generated at once by this process (overrides SEO_SCHEDULER)")
+
+    def handle(self, *args, **options):
+        config = get_scheduler_config()
+        if options["concurrency"]:
+            config["CONCURRENCY"] = options["concurrency"]
+        scheduler = RefreshScheduler(config=config)
+
+        if options["once"]:
+            refreshed = scheduler.run_once()
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} tracked domains"))
+            return
+
+        self.stdout.write(f"Refresh scheduler running with concurrency {config['CONCURRENCY']}")
+        scheduler.run_forever()
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+import requests
+
+from seo_api.locations import normalize_name, invalidate_locale_index
+from seo_api.models import DataForSEOLocation, DataForSEOLanguage
+from seo_api.services import SEOAPIService
+
+
+class Command(BaseCommand):
+    help = "Download the DataForSEO locations and languages lists into the local locale index"
+
+    def handle(self, *args, **options):
+        service = SEOAPIService()
+        try:
+            locations = service.fetch_locations()
+            languages = service.fetch_languages()
+        except requests.exceptions.RequestException as e:
+            raise CommandError(f"Failed to download locales: {str(e)}")
+
+        if not locations or not languages:
+            raise CommandError("DataForSEO returned an empty locations or languages list")
+
+        with transaction.atomic():
+            DataForSEOLocation.objects.all().delete()
+            DataForSEOLocation.objects.bulk_create(
+                (
+                    DataForSEOLocation(
+                        location_code=item["location_code"],
+                        location_name=item["location_name"],
+                        normalized_name=normalize_name(item["location_name"]),
+                        location_code_parent=item.get("location_code_parent"),
+                        country_iso_code=item.get("country_iso_code") or "",
+                        location_type=item.get("location_type") or "",
+                    )
+                    for item in locations
+                ),
+                batch_size=1000,
+            )
+
+            DataForSEOLanguage.objects.all().delete()
+            DataForSEOLanguage.objects.bulk_create(
+                (
+                    DataForSEOLanguage(
+                        language_code=item["language_code"],
+                        language_name=item["language_name"],
+                        normalized_name=normalize_name(item["language_name"]),
+                    )
+                    for item in languages
+                ),
+                batch_size=1000,
+            )
+
+        invalidate_locale_index()
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {len(locations)} locations and {len(languages)} languages"
+        ))
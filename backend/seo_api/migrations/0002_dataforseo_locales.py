@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataForSEOLanguage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language_code', models.CharField(max_length=16, unique=True)),
+                ('language_name', models.CharField(max_length=128)),
+                ('normalized_name', models.CharField(db_index=True, max_length=128)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DataForSEOLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location_code', models.IntegerField(unique=True)),
+                ('location_name', models.CharField(max_length=255)),
+                ('normalized_name', models.CharField(db_index=True, max_length=255)),
+                ('location_code_parent', models.IntegerField(blank=True, null=True)),
+                ('country_iso_code', models.CharField(blank=True, max_length=8)),
+                ('location_type', models.CharField(blank=True, max_length=64)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-19 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo_api', '0002_dataforseo_locales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportSection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(max_length=32)),
+                ('scope_key', models.CharField(max_length=40)),
+                ('source', models.CharField(max_length=32)),
+                ('data', models.JSONField(default=dict)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('section', 'scope_key'), name='unique_report_section')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-19 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo_api', '0003_report_sections'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SEOReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_key', models.CharField(max_length=40, unique=True)),
+                ('business_name', models.CharField(max_length=500)),
+                ('website', models.CharField(db_index=True, max_length=255)),
+                ('location', models.CharField(max_length=255)),
+                ('language', models.CharField(max_length=128)),
+                ('data', models.JSONField(default=dict)),
+                ('seo_score', models.FloatField(blank=True, null=True)),
+                ('generated_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrackedDomain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('website', models.CharField(max_length=255)),
+                ('keywords', models.CharField(max_length=500)),
+                ('location', models.CharField(default='United States', max_length=255)),
+                ('language', models.CharField(default='English', max_length=128)),
+                ('cadence_hours', models.PositiveIntegerField(default=24)),
+                ('is_active', models.BooleanField(default=True)),
+                ('next_run_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_status', models.CharField(blank=True, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('website', 'keywords', 'location', 'language'), name='unique_tracked_domain')],
+            },
+        ),
+    ]
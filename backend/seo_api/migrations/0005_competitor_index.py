@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo_api', '0004_tracked_domains_and_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompetitorObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_domain', models.CharField(max_length=255)),
+                ('location', models.CharField(max_length=255)),
+                ('keyword', models.CharField(max_length=255)),
+                ('domain', models.CharField(max_length=255)),
+                ('source', models.CharField(max_length=32)),
+                ('position', models.FloatField(blank=True, null=True)),
+                ('visibility', models.FloatField(blank=True, null=True)),
+                ('rating', models.FloatField(blank=True, null=True)),
+                ('observed_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['location', 'keyword', 'position'], name='competitor_keyword_idx'), models.Index(fields=['location', 'domain'], name='competitor_domain_idx'), models.Index(fields=['location', 'subject_domain'], name='competitor_subject_idx')],
+                'constraints': [models.UniqueConstraint(fields=('subject_domain', 'location', 'keyword', 'domain', 'source'), name='unique_competitor_observation')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-19 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seo_api', '0005_competitor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seoreport',
+            name='etag',
+            field=models.CharField(blank=True, max_length=66),
+        ),
+        migrations.AddField(
+            model_name='seoreport',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='seoreport',
+            name='last_modified',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
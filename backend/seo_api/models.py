@@ -7,4 +7,116 @@ class SEORequestLog(models.Model):
     seo_score = models.FloatField(null=True, blank=True)
     
     def __str__(self):
-        return f"{self.domain} - {self.request_time.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"{self.domain} - {self.request_time.strftime('%Y-%m-%d %H:%M')}"
+
+
+class DataForSEOLocation(models.Model):
+    """Local copy of the DataForSEO locations list (synced by sync_dataforseo_locales)"""
+    location_code = models.IntegerField(unique=True)
+    location_name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, db_index=True)
+    location_code_parent = models.IntegerField(null=True, blank=True)
+    country_iso_code = models.CharField(max_length=8, blank=True)
+    location_type = models.CharField(max_length=64, blank=True)
+
+    def __str__(self):
+        return f"{self.location_name} ({self.location_code})"
+
+
+class DataForSEOLanguage(models.Model):
+    """Local copy of the DataForSEO languages list (synced by sync_dataforseo_locales)"""
+    language_code = models.CharField(max_length=16, unique=True)
+    language_name = models.CharField(max_length=128)
+    normalized_name = models.CharField(max_length=128, db_index=True)
+
+    def __str__(self):
+        return f"{self.language_name} ({self.language_code})"
+
+
+class ReportSection(models.Model):
+    """Raw upstream result of one report section, reused until its freshness policy expires"""
+    section = models.CharField(max_length=32)
+    scope_key = models.CharField(max_length=40)
+    source = models.CharField(max_length=32)
+    data = models.JSONField(default=dict)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['section', 'scope_key'], name='unique_report_section'),
+        ]
+
+    def __str__(self):
+        return f"{self.section} {self.scope_key[:8]} - {self.fetched_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class SEOReport(models.Model):
+    """Latest assembled report for one (keywords, website, location, language) request"""
+    report_key = models.CharField(max_length=40, unique=True)
+    business_name = models.CharField(max_length=500)
+    website = models.CharField(max_length=255, db_index=True)
+    location = models.CharField(max_length=255)
+    language = models.CharField(max_length=128)
+    data = models.JSONField(default=dict)
+    seo_score = models.FloatField(null=True, blank=True)
+    generated_at = models.DateTimeField(db_index=True)
+    # Content hash, when the content last changed and when its first section goes stale
+    etag = models.CharField(max_length=66, blank=True)
+    last_modified = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.website} - {self.generated_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class TrackedDomain(models.Model):
+    """A report the refresh scheduler keeps warm"""
+    website = models.CharField(max_length=255)
+    keywords = models.CharField(max_length=500)
+    location = models.CharField(max_length=255, default='United States')
+    language = models.CharField(max_length=128, default='English')
+    cadence_hours = models.PositiveIntegerField(default=24)
+    is_active = models.BooleanField(default=True)
+    next_run_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_status = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['website', 'keywords', 'location', 'language'], name='unique_tracked_domain'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.website} ({self.keywords}) every {self.cadence_hours}h"
+
+
+class CompetitorObservation(models.Model):
+    """A domain seen ranking for a keyword in a location, recorded from every report"""
+    subject_domain = models.CharField(max_length=255)
+    location = models.CharField(max_length=255)
+    keyword = models.CharField(max_length=255)
+    domain = models.CharField(max_length=255)
+    source = models.CharField(max_length=32)
+    position = models.FloatField(null=True, blank=True)
+    visibility = models.FloatField(null=True, blank=True)
+    rating = models.FloatField(null=True, blank=True)
+    observed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subject_domain', 'location', 'keyword', 'domain', 'source'],
+                name='unique_competitor_observation',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['location', 'keyword', 'position'], name='competitor_keyword_idx'),
+            models.Index(fields=['location', 'domain'], name='competitor_domain_idx'),
+            models.Index(fields=['location', 'subject_domain'], name='competitor_subject_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.domain} on '{self.keyword}' ({self.location})"
@@ -0,0 +1,176 @@
+# seo_api/planner.py
+from collections import namedtuple
+
+from django.conf import settings
+
+from .domains import registrable_domain
+
+
+# Raw sections collected for a report, in the order _format_local_seo_data takes them
+SECTIONS = (
+    'gmb',
+    'local_rankings',
+    'business_details',
+    'onpage',
+    'backlinks',
+    'keywords',
+    'pagespeed',
+    'competitors',
+)
+
+# Inputs each section's upstream result depends on: keyword sections are shared by
+# every domain checked against the same keywords and location, domain sections by
+# every report on the same website
+SECTION_SCOPES = {
+    'gmb': 'keyword',
+    'local_rankings': 'keyword',
+    'business_details': 'keyword',
+    'onpage': 'domain',
+    'backlinks': 'domain',
+    'keywords': 'keyword',
+    'pagespeed': 'domain',
+    'competitors': 'keyword',
+}
+
+# A derivation reuses the upstream result of `source` to build another section.
+# Fidelity (0-1) is how closely the derived data matches the section's own endpoint.
+Derivation = namedtuple('Derivation', ['source', 'fidelity', 'derive'])
+
+Plan = namedtuple('Plan', ['fetch', 'derived'])
+
+
+def _items(result):
+    return (result or {}).get('items') or []
+
+
+def local_rankings_from_maps(result):
+    """Maps items carry the same rank_absolute/domain/rating fields as the local finder"""
+    return {
+        'keyword': (result or {}).get('keyword'),
+        'items': _items(result),
+    }
+
+
+def gmb_from_maps(result):
+    """The top maps listing stands in for the business profile (no description field)"""
+    items = [
+        {
+            'title': item.get('title'),
+            'domain': item.get('domain'),
+            'url': item.get('url'),
+            'phone': item.get('phone'),
+            'description': item.get('snippet'),
+            'category': item.get('category'),
+            'address': item.get('address'),
+            'rating': item.get('rating'),
+            'is_claimed': item.get('is_claimed'),
+        }
+        for item in _items(result)[:1]
+    ]
+    return {
+        'keyword': (result or {}).get('keyword'),
+        'items': items,
+    }
+
+
+def business_details_from_local_finder(result):
+    """Local finder items have domain/url/rating but not is_claimed"""
+    return {
+        'keyword': (result or {}).get('keyword'),
+        'items': _items(result),
+    }
+
+
+def competitors_from_maps(result):
+    """Approximate serp_competitors metrics from the domains ranking in one maps SERP"""
+    items = [item for item in _items(result) if registrable_domain(item.get('domain'))]
+    total = len(items)
+    by_domain = {}
+    for item in items:
+        rank = item.get('rank_absolute') or total
+        rating = (item.get('rating') or {}).get('value') or 0
+        entry = by_domain.setdefault(registrable_domain(item['domain']), {'positions': [], 'ratings': []})
+        entry['positions'].append(rank)
+        entry['ratings'].append(rating)
+
+    competitors = []
+    for domain, entry in by_domain.items():
+        positions = entry['positions']
+        competitors.append({
+            'domain': domain,
+            'avg_position': sum(positions) / len(positions),
+            'visibility': sum((total - p + 1) / total for p in positions) / len(positions) if total else 0,
+            # serp_competitors ratings are on a 0-100 scale, maps ratings on 0-5
+            'rating': max(entry['ratings']) * 20,
+            'keywords_count': 1,
+        })
+    competitors.sort(key=lambda c: c['avg_position'])
+    return {'items': competitors}
+
+
+DERIVATIONS = {
+    'local_rankings': [Derivation('business_details', 0.8, local_rankings_from_maps)],
+    'gmb': [Derivation('business_details', 0.6, gmb_from_maps)],
+    'business_details': [Derivation('local_rankings', 0.7, business_details_from_local_finder)],
+    'competitors': [Derivation('business_details', 0.4, competitors_from_maps)],
+}
+
+
+def get_planner_config():
+    config = {'MIN_FIDELITY': 1.0, 'SECTIONS': {}}
+    config.update(getattr(settings, 'SEO_SECTION_PLANNER', {}))
+    return config
+
+
+def plan_sections(sections=SECTIONS, config=None):
+    """
+    Decide which sections are fetched from their own endpoint and which are
+    derived from another section's upstream result.
+
+    Sources are chosen greedily: the upstream result that can satisfy the most
+    still-unplanned sections (within each section's minimum fidelity) is
+    fetched first. With the default MIN_FIDELITY of 1.0 nothing is derived.
+    """
+    config = config or get_planner_config()
+    min_fidelity = config['MIN_FIDELITY']
+    section_fidelity = config['SECTIONS']
+
+    def allowed(section, derivation):
+        return derivation.fidelity >= section_fidelity.get(section, min_fidelity)
+
+    # source -> {section: derivation} for every section it could stand in for
+    coverage = {}
+    for section in sections:
+        for derivation in DERIVATIONS.get(section, []):
+            if allowed(section, derivation):
+                coverage.setdefault(derivation.source, {})[section] = derivation
+
+    fetch = []
+    derived = {}
+    remaining = list(sections)
+    while coverage:
+        def gain(source):
+            if source in derived:
+                return 0
+            covered = [s for s in coverage[source] if s in remaining]
+            return len(covered) + (1 if source in remaining else 0)
+
+        def fidelity(source):
+            return sum(d.fidelity for s, d in coverage[source].items() if s in remaining)
+
+        # Most sections covered first, then the most faithful derivations
+        source = max(coverage, key=lambda s: (gain(s), fidelity(s), -SECTIONS.index(s)))
+        # Only worth it when the source saves at least one other call
+        if gain(source) < 2:
+            break
+        if source not in fetch:
+            fetch.append(source)
+        if source in remaining:
+            remaining.remove(source)
+        for section, derivation in coverage.pop(source).items():
+            if section in remaining:
+                remaining.remove(section)
+                derived[section] = derivation
+
+    fetch.extend(remaining)
+    return Plan(fetch=sorted(fetch, key=SECTIONS.index), derived=derived)
@@ -0,0 +1,198 @@
+# seo_api/profiling.py
+import cProfile
+import json
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+
+DEFAULT_PROFILING = {
+    "SAMPLE_RATE": 0.0,          # Fraction of matching requests profiled automatically
+    "TOKEN": "",                 # Shared secret for on-demand profiling (?profile=1)
+    "DIR": "profiles",           # Capture directory (relative to BASE_DIR)
+    "MAX_CAPTURES": 50,          # Oldest captures are rotated out beyond this
+    "PATH_PREFIXES": ["/api/seo-report/"],
+    "TOP_ALLOCATIONS": 15,       # Allocation sites kept in the capture metadata
+}
+
+
+def get_profiling_config():
+    """Return the profiling settings merged over the defaults"""
+    config = dict(DEFAULT_PROFILING)
+    config.update(getattr(settings, "SEO_PROFILING", {}))
+    return config
+
+
+def get_capture_dir():
+    capture_dir = Path(get_profiling_config()["DIR"])
+    if not capture_dir.is_absolute():
+        capture_dir = Path(settings.BASE_DIR) / capture_dir
+    return capture_dir
+
+
+def is_privileged(request):
+    """A request may ask for profiling (or read captures) with the token or a staff session"""
+    token = get_profiling_config()["TOKEN"]
+    if token and request.headers.get("X-Profile-Token") == token:
+        return True
+    user = getattr(request, "user", None)
+    return bool(user and user.is_authenticated and user.is_staff)
+
+
+def list_captures(limit=None):
+    """
+    List captured requests, slowest first.
+
+    Only the small JSON metadata files are read; profiles and snapshots stay on disk.
+    """
+    captures = []
+    capture_dir = get_capture_dir()
+    if not capture_dir.exists():
+        return captures
+
+    for meta_path in capture_dir.glob("*.json"):
+        try:
+            captures.append(json.loads(meta_path.read_text()))
+        except (OSError, ValueError):
+            continue
+
+    captures.sort(key=lambda c: c.get("duration_ms", 0), reverse=True)
+    return captures[:limit] if limit else captures
+
+
+def get_capture_file(capture_id, kind):
+    """Resolve the on-disk profile ('prof') or allocation snapshot ('tracemalloc') of a capture"""
+    if kind not in ("prof", "tracemalloc"):
+        return None
+    # Capture ids are generated hex strings; reject anything that could escape the directory
+    if not capture_id.isalnum():
+        return None
+    path = get_capture_dir() / f"{capture_id}.{kind}"
+    return path if path.exists() else None
+
+
+# tracemalloc is process-wide, so concurrent captures share one tracing session:
+# the first capture starts it and the last one to finish stops it
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0:
+            # Tracing someone else started (e.g. PYTHONTRACEMALLOC) is left running
+            _tracing_owned = not tracemalloc.is_tracing()
+            if _tracing_owned:
+                tracemalloc.start()
+        _tracing_users += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+
+
+class RequestProfilingMiddleware:
+    """
+    Profile a sample of requests, or any privileged request sent with ?profile=1.
+
+    Each capture writes a cProfile dump, a tracemalloc snapshot and a JSON metadata
+    file into the capture directory. Only the most recent MAX_CAPTURES are kept.
+
+    cProfile only sees the request thread and tracemalloc traces the whole process,
+    so allocations from concurrent requests can show up in a snapshot.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = self._capture_reason(request)
+        if not reason:
+            return self.get_response(request)
+
+        capture_id = uuid.uuid4().hex
+        _start_tracing()
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+            snapshot = tracemalloc.take_snapshot()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            _stop_tracing()
+
+        try:
+            self._write_capture(
+                capture_id, request, response, reason, duration_ms, peak_bytes, profiler, snapshot
+            )
+            response["X-Profile-Id"] = capture_id
+        except OSError as e:
+            print(f"Error writing request profile: {str(e)}")
+        return response
+
+    def _capture_reason(self, request):
+        config = get_profiling_config()
+        if not any(request.path.startswith(prefix) for prefix in config["PATH_PREFIXES"]):
+            return None
+        if request.GET.get("profile") == "1" and is_privileged(request):
+            return "requested"
+        if config["SAMPLE_RATE"] > 0 and random.random() < config["SAMPLE_RATE"]:
+            return "sampled"
+        return None
+
+    def _write_capture(self, capture_id, request, response, reason, duration_ms, peak_bytes, profiler, snapshot):
+        config = get_profiling_config()
+        capture_dir = get_capture_dir()
+        capture_dir.mkdir(parents=True, exist_ok=True)
+
+        profiler.dump_stats(str(capture_dir / f"{capture_id}.prof"))
+        snapshot.dump(str(capture_dir / f"{capture_id}.tracemalloc"))
+
+        top_allocations = [
+            {
+                "location": str(stat.traceback[0]),
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:config["TOP_ALLOCATIONS"]]
+        ]
+
+        metadata = {
+            "id": capture_id,
+            "reason": reason,
+            "method": request.method,
+            "path": request.path,
+            "query": request.GET.urlencode(),
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 2),
+            "peak_memory_bytes": peak_bytes,
+            "captured_at": datetime.now(timezone.utc).isoformat(),
+            "top_allocations": top_allocations,
+        }
+        # Metadata is written last so a listed capture always has its data files
+        (capture_dir / f"{capture_id}.json").write_text(json.dumps(metadata))
+
+        self._rotate(capture_dir, config["MAX_CAPTURES"])
+
+    def _rotate(self, capture_dir, max_captures):
+        meta_files = sorted(capture_dir.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for meta_path in meta_files[max_captures:]:
+            for suffix in (".prof", ".tracemalloc", ".json"):
+                meta_path.with_suffix(suffix).unlink(missing_ok=True)
@@ -0,0 +1,70 @@
+# seo_api/ranks.py
+import hashlib
+
+from django.conf import settings
+
+from .domains import DomainIndex, registrable_domain
+
+
+DEFAULT_RANK_TRACKING = {
+    "DEPTH": 100,                    # Organic results checked per keyword
+    "MAX_KEYWORDS": 1000,            # Keywords one tracking request may ask for
+    "TASKS_PER_POST": 100,           # DataForSEO accepts up to 100 tasks per task_post
+    "MAX_WORKERS": 4,
+    "POLL_SECONDS": 5,
+    "SERP_CACHE_TTL": 24 * 60 * 60,  # A keyword's SERP index is shared by every domain this long
+    "TASK_TTL": 60 * 60,             # How long a posted SERP task is remembered for collection
+}
+
+
+def get_rank_tracking_config():
+    config = dict(DEFAULT_RANK_TRACKING)
+    config.update(getattr(settings, "SEO_RANK_TRACKING", {}))
+    return config
+
+
+def serp_cache_key(keyword, location, language_name, depth):
+    """One organic SERP, whichever domain asked for it"""
+    raw = f"{keyword.strip()}|{location}|{language_name}|{depth}".lower()
+    return "seo:serp_index:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def serp_task_cache_key(serp_key):
+    return serp_key.replace("seo:serp_index:", "seo:serp_task:", 1)
+
+
+def serp_position_index(items):
+    """
+    {registrable domain: {"position", "rank_absolute", "url"}} for the organic
+    results of one SERP, each domain at its best position. Built once per SERP
+    and cached, so looking up any number of tracked domains is a dict lookup.
+    """
+    organic = sorted(
+        (item for item in items or [] if isinstance(item, dict) and item.get("type", "organic") == "organic"),
+        key=lambda item: item.get("rank_absolute") or 0,
+    )
+    return {
+        domain: {
+            "position": item.get("rank_group"),
+            "rank_absolute": item.get("rank_absolute"),
+            "url": item.get("url"),
+        }
+        for domain, item in DomainIndex(organic).items.items()
+    }
+
+
+def position_in(index, website):
+    """The website's entry in a SERP position index, or None if it does not rank"""
+    return index.get(registrable_domain(website))
+
+
+def rank_summary(positions):
+    """Aggregate a domain's {keyword: entry or None} positions"""
+    found = [entry["position"] for entry in positions.values() if entry and entry.get("position")]
+    return {
+        "tracked": len(positions),
+        "ranked": len(found),
+        "top3": sum(1 for position in found if position <= 3),
+        "top10": sum(1 for position in found if position <= 10),
+        "average_position": round(sum(found) / len(found), 2) if found else None,
+    }
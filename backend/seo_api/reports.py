@@ -0,0 +1,354 @@
+# seo_api/reports.py
+import gzip
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import brotli
+except ImportError:  # Optional; reports are still served gzipped
+    brotli = None
+
+from .domains import canonical_host
+from .models import ReportSection, SEOReport
+from .planner import SECTION_SCOPES
+
+
+# Encoded report bodies are kept this long (seconds); freshness is always checked against the database
+DEFAULT_REPORT_BODY_CACHE_TTL = 24 * 60 * 60
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+# Section hashes and section contents of past snapshots are kept this long (seconds) for deltas
+DEFAULT_REPORT_SNAPSHOT_TTL = 7 * 24 * 60 * 60
+
+# Top-level report keys that describe how the report was built rather than what it says
+REPORT_METADATA_KEYS = ('sections', 'followup')
+
+# How long each raw section stays fresh, in seconds
+DEFAULT_SECTION_FRESHNESS = {
+    'gmb': 7 * 24 * 60 * 60,
+    'local_rankings': 24 * 60 * 60,
+    'business_details': 24 * 60 * 60,
+    'onpage': 24 * 60 * 60,
+    'backlinks': 7 * 24 * 60 * 60,
+    'keywords': 30 * 24 * 60 * 60,
+    'pagespeed': 24 * 60 * 60,
+    'competitors': 7 * 24 * 60 * 60,
+}
+
+
+def get_section_freshness(section):
+    freshness = dict(DEFAULT_SECTION_FRESHNESS)
+    freshness.update(getattr(settings, 'SEO_SECTION_FRESHNESS', {}))
+    return timedelta(seconds=freshness[section])
+
+
+def section_scope_key(section, business_name, website, location, language_name):
+    """Identify a section's upstream inputs, so reports sharing them share the stored result"""
+    if SECTION_SCOPES[section] == 'domain':
+        parts = [canonical_host(website)]
+    else:
+        parts = [business_name, location, language_name]
+    raw = '|'.join(str(part or '').strip().lower() for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def is_fresh(row, now=None):
+    now = now or timezone.now()
+    return row is not None and row.fetched_at + get_section_freshness(row.section) > now
+
+
+def load_sections(sections, business_name, website, location, language_name):
+    """Stored sections for a report, keyed by section name (missing ones are absent)"""
+    keys = {
+        section: section_scope_key(section, business_name, website, location, language_name)
+        for section in sections
+    }
+    rows = ReportSection.objects.filter(section__in=list(keys), scope_key__in=set(keys.values()))
+    return {row.section: row for row in rows if keys[row.section] == row.scope_key}
+
+
+def save_sections(results, sources, business_name, website, location, language_name, fetched_at=None):
+    """Upsert freshly fetched sections; returns the saved rows keyed by section name"""
+    fetched_at = fetched_at or timezone.now()
+    rows = [
+        ReportSection(
+            section=section,
+            scope_key=section_scope_key(section, business_name, website, location, language_name),
+            source=sources.get(section, section),
+            data=data if data is not None else {},
+            fetched_at=fetched_at,
+        )
+        for section, data in results.items()
+    ]
+    ReportSection.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['section', 'scope_key'],
+        update_fields=['source', 'data', 'fetched_at'],
+    )
+    return {row.section: row for row in rows}
+
+
+def report_key(business_name, website, location, language_name):
+    """Identify a full report request"""
+    parts = (business_name, canonical_host(website), location, language_name)
+    raw = '|'.join(str(part or '').strip().lower() for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _content_hash(value):
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def report_etag(report):
+    """
+    Weak ETag of a report. Per-section metadata (fetched_at, cached) and the
+    follow-up token are left out so an unchanged report keeps its ETag across
+    refreshes; the served bytes may differ in those fields, so the ETag only
+    claims semantic equivalence.
+    """
+    content = {key: value for key, value in report.items() if key not in REPORT_METADATA_KEYS}
+    return 'W/"' + _content_hash(content)[:32] + '"'
+
+
+def snapshot_id(etag):
+    """The id a client quotes to get a delta: the report's ETag without W/ and quotes"""
+    return etag.removeprefix('W/').strip('"')
+
+
+def report_section_hashes(report):
+    """Content hash of each top-level section of a report (gmb_profile, seo_score, ...)"""
+    return {
+        key: _content_hash(value)[:16]
+        for key, value in report.items()
+        if key not in REPORT_METADATA_KEYS
+    }
+
+
+def report_expires_at(report, now=None):
+    """When the report's first section goes stale; sections that did not load expire immediately"""
+    now = now or timezone.now()
+    expiries = []
+    for section, meta in (report.get('sections') or {}).items():
+        if meta.get('status', 'ok') != 'ok' or not meta.get('fetched_at'):
+            expiries.append(now)
+        else:
+            fetched_at = datetime.fromisoformat(meta['fetched_at'])
+            expiries.append(fetched_at + get_section_freshness(section))
+    return min(expiries) if expiries else now
+
+
+def store_report(report, business_name, website, location, language_name):
+    """Keep the latest assembled report so it can be served and exported without re-assembly"""
+    key = report_key(business_name, website, location, language_name)
+    now = timezone.now()
+    etag = report_etag(report)
+    previous = SEOReport.objects.filter(report_key=key).values('etag', 'last_modified').first()
+    unchanged = previous and previous['etag'] == etag and previous['last_modified']
+
+    stored, _ = SEOReport.objects.update_or_create(
+        report_key=key,
+        defaults={
+            'business_name': business_name or '',
+            'website': website or '',
+            'location': location or '',
+            'language': language_name or '',
+            'data': report,
+            'seo_score': report.get('seo_score'),
+            'generated_at': now,
+            'etag': etag,
+            'last_modified': previous['last_modified'] if unchanged else now,
+            'expires_at': report_expires_at(report, now),
+        },
+    )
+    cache_report_body(stored, report)
+    remember_snapshot(etag, report)
+    return stored
+
+
+def get_report_meta(business_name, website, location, language_name):
+    """The stored report's validators (etag, last_modified, expires_at) without loading its body"""
+    return (
+        SEOReport.objects
+        .filter(report_key=report_key(business_name, website, location, language_name))
+        .defer('data')
+        .first()
+    )
+
+
+def report_encodings():
+    """Content codings a report body is stored in, best first"""
+    return (('br',) if brotli else ()) + ('gzip', 'identity')
+
+
+def preferred_encoding(accept_encoding):
+    """The best stored coding the client accepts (Accept-Encoding, honouring q=0)"""
+    accepted = set()
+    for part in (accept_encoding or '').lower().split(','):
+        coding, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            q = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            q = 0
+        if coding.strip() and q > 0:
+            accepted.add(coding.strip())
+    for coding in report_encodings():
+        if coding in accepted or '*' in accepted or coding == 'identity':
+            return coding
+    return 'identity'
+
+
+def encode_report(data):
+    """The report rendered once as the API would and compressed in every stored coding"""
+    body = JSONRenderer().render(data)
+    bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli:
+        bodies['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return bodies
+
+
+def coding_etag(etag, coding):
+    """
+    The ETag of one content coding of a report. Each coding is a different
+    representation, so gzip and br bodies get the report's ETag with a suffix.
+    """
+    return etag if coding == 'identity' else f'{etag[:-1]}-{coding}"'
+
+
+def report_etags(etag):
+    """The ETags of every stored coding of a report"""
+    return [coding_etag(etag, coding) for coding in report_encodings()]
+
+
+def _report_body_cache_key(key, coding):
+    return f'seo:report:{key}:{coding}'
+
+
+def cache_report_body(stored, data=None):
+    """
+    Cache a stored report's pre-encoded bodies. Each body is cached with the
+    ETag it was encoded from and only served while the database row still has
+    that ETag. Returns the encoded bodies.
+    """
+    if data is None:
+        data = SEOReport.objects.values_list('data', flat=True).get(pk=stored.pk)
+    bodies = encode_report(data)
+    ttl = getattr(settings, 'SEO_REPORT_BODY_CACHE_TTL', DEFAULT_REPORT_BODY_CACHE_TTL)
+    cache.set_many(
+        {_report_body_cache_key(stored.report_key, coding): (stored.etag, body) for coding, body in bodies.items()},
+        ttl,
+    )
+    return bodies
+
+
+def get_cached_body(meta, coding):
+    """
+    The cached body of a stored report (from get_report_meta) in one coding,
+    or None if it is missing or was encoded from other content. Checking the
+    ETag against the row means writes that bypass store_report, or happen in
+    another worker, are never hidden by a stale cached body.
+    """
+    etag, body = cache.get(_report_body_cache_key(meta.report_key, coding)) or (None, None)
+    return body if etag == meta.etag else None
+
+
+def _snapshot_cache_key(snapshot):
+    return f'seo:snapshot:{snapshot}'
+
+
+def _section_cache_key(digest):
+    return f'seo:snapshot-section:{digest}'
+
+
+def remember_snapshot(etag, report):
+    """
+    Cache a report's section hashes under its snapshot id, and each section's
+    content under its hash, so later versions can be sent as a patch against it.
+    """
+    hashes = report_section_hashes(report)
+    ttl = getattr(settings, 'SEO_REPORT_SNAPSHOT_TTL', DEFAULT_REPORT_SNAPSHOT_TTL)
+    cache.set_many(
+        {
+            _snapshot_cache_key(snapshot_id(etag)): hashes,
+            **{_section_cache_key(digest): report[key] for key, digest in hashes.items()},
+        },
+        ttl,
+    )
+    return hashes
+
+
+def snapshot_hashes(snapshot):
+    """The section hashes of an earlier snapshot, or None if it is unknown or has expired"""
+    if not snapshot or not snapshot.isalnum():
+        return None
+    return cache.get(_snapshot_cache_key(snapshot))
+
+
+def _pointer(*tokens):
+    """JSON Pointer (RFC 6901) to a member"""
+    return ''.join('/' + str(token).replace('~', '~0').replace('/', '~1') for token in tokens)
+
+
+def json_patch(old, new, path=''):
+    """
+    The JSON Patch (RFC 6902) operations that turn old into new. Objects are
+    patched key by key; anything else (lists included) is replaced whole.
+    Unlike a merge patch, a null value is sent as a value, not a removal.
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return [] if old == new else [{'op': 'replace', 'path': path, 'value': new}]
+    ops = [{'op': 'remove', 'path': path + _pointer(key)} for key in old if key not in new]
+    for key, value in new.items():
+        if key not in old:
+            ops.append({'op': 'add', 'path': path + _pointer(key), 'value': value})
+        else:
+            ops.extend(json_patch(old[key], value, path + _pointer(key)))
+    return ops
+
+
+def report_metadata_patch(report):
+    """
+    Operations setting the report's section statuses and follow-up token.
+    They are left out of the section hashes, so every delta carries them;
+    "add" replaces an existing member, and a report without a follow-up
+    token sets it to null.
+    """
+    return [{'op': 'add', 'path': _pointer(key), 'value': report.get(key)} for key in REPORT_METADATA_KEYS]
+
+
+def report_delta(report, known_hashes):
+    """
+    JSON Patch operations taking a client that holds sections with
+    known_hashes to report, touching only the sections whose hash changed,
+    followed by report_metadata_patch(). Returns None if a changed section's
+    previous content is no longer cached, in which case the client needs the
+    whole report.
+    """
+    hashes = report_section_hashes(report)
+    changed = [key for key, digest in hashes.items() if known_hashes.get(key) != digest]
+    patch = [{'op': 'remove', 'path': _pointer(key)} for key in known_hashes if key not in hashes]
+
+    # Objects are patched against the content the client holds; anything else is just replaced
+    needed = {
+        key: _section_cache_key(known_hashes[key])
+        for key in changed
+        if key in known_hashes and isinstance(report[key], dict)
+    }
+    previous = cache.get_many(list(needed.values()))
+    for key in changed:
+        if key not in needed:
+            patch.append({'op': 'add', 'path': _pointer(key), 'value': report[key]})
+        elif needed[key] in previous:
+            patch.extend(json_patch(previous[needed[key]], report[key], _pointer(key)))
+        else:
+            return None
+    return patch + report_metadata_patch(report)
@@ -0,0 +1,154 @@
+# seo_api/scheduler.py
+import hashlib
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TrackedDomain
+from .services import SEOAPIService
+from .slots import BULK, work_context
+
+
+DEFAULT_SCHEDULER = {
+    "CONCURRENCY": 4,            # Reports generated at once by one scheduler process (not fleet-wide)
+    "WINDOW_START_HOUR": 1,      # Off-peak window (local time) for daily or slower cadences
+    "WINDOW_HOURS": 5,
+    "JITTER_SECONDS": 15 * 60,
+    "POLL_SECONDS": 30,
+    "BATCH_SIZE": 100,           # Due domains claimed per poll
+}
+
+
+def get_scheduler_config():
+    config = dict(DEFAULT_SCHEDULER)
+    config.update(getattr(settings, "SEO_SCHEDULER", {}))
+    return config
+
+
+def _stable_fraction(value):
+    """A per-domain number in [0, 1) that stays the same between runs"""
+    digest = hashlib.sha1(str(value).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) / 0x100000000
+
+
+def next_run_time(tracked, after, config=None):
+    """
+    When a tracked domain should be refreshed next.
+
+    Sub-daily cadences simply repeat with jitter. Daily or slower cadences land in
+    the off-peak window, each domain at its own stable offset inside it, so the
+    fleet is spread evenly across the window instead of firing at once.
+    """
+    config = config or get_scheduler_config()
+    cadence = timedelta(hours=tracked.cadence_hours)
+    jitter = timedelta(seconds=random.uniform(-config["JITTER_SECONDS"], config["JITTER_SECONDS"]))
+
+    if cadence < timedelta(days=1) or not config["WINDOW_HOURS"]:
+        return after + cadence + jitter
+
+    window = timedelta(hours=config["WINDOW_HOURS"])
+    day = timezone.localtime(after + cadence)
+    window_start = day.replace(hour=config["WINDOW_START_HOUR"], minute=0, second=0, microsecond=0)
+    run_at = window_start + window * _stable_fraction(tracked.pk or tracked.website) + jitter
+    # Keep jitter from pushing the run out of the window
+    return min(max(run_at, window_start), window_start + window)
+
+
+def first_run_time(tracked, now, config=None):
+    """
+    When a newly tracked domain should be refreshed first: at a random point
+    of its first interval, so domains added together (a bulk import, a fresh
+    deployment) are spread over the interval instead of all being due now.
+    Daily or slower cadences keep their off-peak slot, on a random day of
+    the first interval.
+    """
+    config = config or get_scheduler_config()
+    cadence = timedelta(hours=tracked.cadence_hours)
+    if cadence < timedelta(days=1) or not config["WINDOW_HOURS"]:
+        return now + cadence * random.random()
+
+    # The domain's slot today, or tomorrow once today's has passed
+    run_at = next_run_time(tracked, now - cadence, config)
+    while run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at + timedelta(days=random.randrange(max(1, cadence.days)))
+
+
+class RefreshScheduler:
+    """
+    Pre-compute reports for tracked domains so interactive requests find warm data.
+
+    Domains are claimed with a conditional update on next_run_at, so several
+    scheduler processes never refresh the same domain twice. The concurrency
+    budget is per process: N scheduler processes generate up to N * CONCURRENCY
+    reports at once, so size CONCURRENCY for the number of processes deployed.
+    """
+
+    def __init__(self, config=None, service_factory=SEOAPIService):
+        self.config = config or get_scheduler_config()
+        self.service_factory = service_factory
+
+    def claim_due(self, now=None):
+        now = now or timezone.now()
+        due = (
+            TrackedDomain.objects
+            .filter(is_active=True)
+            .filter(Q(next_run_at__isnull=True) | Q(next_run_at__lte=now))
+            .order_by("next_run_at")[:self.config["BATCH_SIZE"]]
+        )
+
+        claimed = []
+        for tracked in due:
+            if tracked.next_run_at is None and tracked.last_run_at is None:
+                # Newly tracked: slot it into the schedule instead of running everything at once
+                first_run = first_run_time(tracked, now, self.config)
+                TrackedDomain.objects.filter(pk=tracked.pk, next_run_at__isnull=True).update(next_run_at=first_run)
+                continue
+
+            new_next = next_run_time(tracked, now, self.config)
+            updated = TrackedDomain.objects.filter(pk=tracked.pk, next_run_at=tracked.next_run_at).update(
+                next_run_at=new_next
+            )
+            if updated:
+                tracked.next_run_at = new_next
+                claimed.append(tracked)
+        return claimed
+
+    def refresh(self, tracked):
+        close_old_connections()
+        status = "failed"
+        try:
+            service = self.service_factory()
+            # Background refreshes only get upstream slots interactive reports leave free
+            with work_context(priority=BULK, tenant="scheduler"):
+                report = service.fetch_local_seo_data(
+                    tracked.keywords, tracked.website, tracked.location, tracked.language
+                )
+            status = "ok" if report else "failed"
+        except Exception as e:
+            print(f"Error refreshing {tracked.website}: {str(e)}")
+        finally:
+            TrackedDomain.objects.filter(pk=tracked.pk).update(last_run_at=timezone.now(), last_status=status)
+            close_old_connections()
+        return status
+
+    def run_once(self, now=None):
+        """Refresh every due domain within the concurrency budget; returns the number refreshed"""
+        claimed = self.claim_due(now)
+        if not claimed:
+            return 0
+        with ThreadPoolExecutor(max_workers=self.config["CONCURRENCY"]) as executor:
+            list(executor.map(self.refresh, claimed))
+        return len(claimed)
+
+    def run_forever(self):
+        while True:
+            refreshed = self.run_once()
+            if not refreshed:
+                time.sleep(self.config["POLL_SECONDS"])
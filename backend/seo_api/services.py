@@ -1,11 +1,92 @@
 # seo_api/services.py
 import requests
 import os
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from dotenv import load_dotenv
-import time
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from .locations import get_locale_index
+from .planner import SECTIONS, SECTION_SCOPES, plan_sections
+from .reports import load_sections, save_sections, is_fresh, store_report
+from .competitors import record_competitors
+from .domains import DomainIndex, canonical_host, registrable_domain
+from .hedging import get_hedger
+from .timeseries import TimeSeriesStore
+from .tracing import annotate, span, traced
+from .slots import upstream_slot
+from .crawls import CrawlPageWriter, SiteAudit, get_site_crawl_config, load_site_audit
+from .ranks import (
+    get_rank_tracking_config, position_in, rank_summary, serp_cache_key, serp_position_index, serp_task_cache_key,
+)
+from .geogrid import build_grid, grid_summary, grid_task_cache_key, get_geogrid_config, get_rate_limiter
+from .deadlines import (
+    Deadline, DeadlineExceeded, current_deadline, deadline_scope, upstream_timeout, sleep_within_deadline, submit_in_context,
+    get_report_budget_ms, get_section_budget_share,
+)
 
 load_dotenv()
 
+# DataForSEO accepts at most 1000 keywords per search_volume task
+KEYWORD_VOLUME_CHUNK_SIZE = 1000
+KEYWORD_VOLUME_MAX_WORKERS = 4
+# Search volumes are refreshed monthly upstream
+KEYWORD_VOLUME_CACHE_TTL = 30 * 24 * 60 * 60
+
+# Lighthouse metrics and their weights in the PageSpeed score (based on Lighthouse v8)
+PAGESPEED_METRICS = {
+    "first-contentful-paint": {"weight": 0.10, "name": "First Contentful Paint"},
+    "largest-contentful-paint": {"weight": 0.25, "name": "Largest Contentful Paint"},
+    "speed-index": {"weight": 0.15, "name": "Speed Index"},
+    "total-blocking-time": {"weight": 0.30, "name": "Total Blocking Time"},
+    "interactive": {"weight": 0.10, "name": "Time to Interactive"},
+    "cumulative-layout-shift": {"weight": 0.10, "name": "Cumulative Layout Shift"}
+}
+
+# DataForSEO task_get codes for tasks still being worked on (Task Handed, Task In Queue);
+# any other non-20000 code means the task failed
+TASK_QUEUED_CODES = (40601, 40602)
+
+# Seconds between on_page/summary polls while a crawl is in progress
+ONPAGE_POLL_SECONDS = 2
+# How long a submitted crawl is remembered for collection by a follow-up report
+ONPAGE_TASK_TTL = 60 * 60
+
+
+class OnPageSubmitError(Exception):
+    """on_page/task_post answered without a task"""
+
+
+class UpstreamTaskError(Exception):
+    """A live endpoint answered with a task that failed (status code other than 20000)"""
+
+
+class OnPageCrawlPending(Exception):
+    """The crawl was submitted but had not finished by the deadline"""
+
+    def __init__(self, task_id):
+        super().__init__(f"On-page crawl {task_id} is still in progress")
+        self.task_id = task_id
+
+
+def onpage_task_cache_key(website, max_pages=None):
+    """The report's crawl by default; site crawls with a page budget are remembered separately"""
+    key = f"seo:onpage_task:{canonical_host(website)}"
+    return f"{key}:{max_pages}" if max_pages else key
+
+
+def followup_token(website, tasks):
+    """Signed token a client sends back (?followup=) to collect sections still in progress"""
+    return signing.dumps({"website": canonical_host(website), "tasks": tasks}, salt="seo-followup")
+
+
+def read_followup_token(token):
+    """The token's {"website", "tasks"}; raises signing.BadSignature if invalid or expired"""
+    return signing.loads(token, salt="seo-followup", max_age=ONPAGE_TASK_TTL)
+
+
 class SEOAPIService:
     def __init__(self):
         self.api_key = os.getenv('DATAFORSEO_API_KEY')
@@ -14,74 +95,737 @@ class SEOAPIService:
         # Basic auth for DataForSEO
         self.auth = (self.api_key, self.api_secret)
     
-    def fetch_local_seo_data(self, business_name, website, location, language_name="English"):
+    @traced(root=True)
+    def fetch_local_seo_data(self, business_name, website, location, language_name="English", refresh=(), budget_ms=None):
         """
         Fetch comprehensive local SEO data for a business
+
+        Sections stored from earlier reports are reused until their freshness
+        policy expires; only stale sections (and any named in `refresh`) are
+        fetched again, and the scores are recomputed over the mix.
+
+        Stale sections are fetched concurrently within `budget_ms`. Sections that
+        miss the deadline or fail are marked with their status and the report is
+        scored from the sections that did finish (or their last stored copy).
         """
+        deadline = Deadline(budget_ms or get_report_budget_ms())
         try:
-            # 1. Google My Business data
-            gmb_data = self._fetch_gmb_data(business_name, location, language_name)
-            
-            # 2. Local search rankings
-            local_rankings = self._fetch_local_rankings(business_name, location)
-            
-            
-            # # 3. Backlinks profile
-            backlinks_data = self._fetch_backlinks_data(website) if website else {}
-            
-            # # 4. Business listing data
-            business_details = self._fetch_business_details(business_name, location, website)
-            
-            # # 5. On-page SEO analysis
-           
-            onpage_data = self._fetch_onpage_data(website) if website else {}
-            
-            
-            # # 6. Keyword data
-            keyword_data = self._fetch_keyword_data(business_name, location)
-            
-            # # 7. Rank tracking data (simplified for now)
-            # rank_data = self._fetch_rank_data(website, keyword_data.get('top_keywords', []))
-            
-            # # 8. PageSpeed data
-            pagespeed_data = self._fetch_pagespeed_data(website) if website else {}
-            
-            # # 9. Content analysis
-            content_data = self._fetch_content_analysis(business_name) if business_name else {}
-            
-            # # 10. Competitor analysis
-            competitor_data = self._fetch_competitor_data(business_name, location, language_name)
-            
-            # Combine all data
-            return self._format_local_seo_data(
-                business_name, 
-                location,
-                website,
-                gmb_data,
-                local_rankings,
-                business_details,
-                onpage_data,
-                backlinks_data,
-                keyword_data,
-
-                pagespeed_data,
-                
-                competitor_data
+            collected = self._collect_sections(
+                SECTIONS, business_name, [website], location, language_name, deadline, refresh
             )
+            rows, statuses, completed = collected[website]
+            report = self._assemble_report(business_name, website, location, rows, statuses, completed)
+            store_report(report, business_name, website, location, language_name)
+            if completed:
+                self._record_history(report, website, rows, completed)
+            return report
         
         except requests.exceptions.RequestException as e:
             print(f"API request error: {str(e)}")
             return None
+
+    @traced(root=True)
+    def fetch_comparison(self, business_name, websites, location, language_name="English", budget_ms=None):
+        """
+        Compare several domains on the same keywords and location.
+
+        Keyword-scoped sections (maps, local finder, business info, search volume,
+        competitors) depend only on the keywords and location, so they are fetched
+        once; only pagespeed, on-page and backlinks are fetched per domain. The
+        shared sections and every domain's sections are all fetched in parallel,
+        then each domain is scored with the usual calculate_* functions against
+        the shared sections.
+        """
+        deadline = Deadline(budget_ms or get_report_budget_ms())
+        keyword_sections = [name for name in SECTIONS if SECTION_SCOPES[name] == 'keyword']
+        domain_sections = [name for name in SECTIONS if SECTION_SCOPES[name] == 'domain']
+
+        # Both stages run concurrently under the one deadline; the first domain
+        # is the subject the shared results are indexed under
+        shared, per_domain = self._collect_stages(
+            [(keyword_sections, websites[:1]), (domain_sections, websites)],
+            business_name, location, language_name, deadline
+        )
+        shared = shared[websites[0]]
+
+        shared_rows, shared_statuses, shared_completed = shared
+        domains = []
+        for website in websites:
+            rows, statuses, completed = per_domain[website]
+            report = self._assemble_report(
+                business_name, website, location,
+                {**shared_rows, **rows}, {**shared_statuses, **statuses}, {**shared_completed, **completed}
+            )
+            pagespeed = rows['pagespeed'].data if 'pagespeed' in rows else {}
+            domains.append({
+                "domain": website,
+                "seo_score": report["seo_score"],
+                "scores": {
+                    "gmb": report["gmb_profile"]["ranking_score"],
+                    "local_rankings": report["local_rankings"]["ranking_score"],
+                    "business_details": report["business_details"]["ranking_score"],
+                    "pagespeed": self.calculate_pagespeed_score(pagespeed) if pagespeed else 0,
+                    "onpage": report["website_analysis"]["onpage_score"],
+                    "competitor_benchmark": report["competitors"]["benchmark_score"],
+                    "competitor_rank": report["competitors"]["rank"],
+                    "authority": report["authority"],
+                },
+                "sections": {name: report["sections"][name] for name in domain_sections},
+                "partial": report["partial"],
+            })
+
+        return {
+            "business_name": business_name,
+            "location": location,
+            "shared_sections": {name: report["sections"][name] for name in keyword_sections},
+            "domains": domains,
+        }
+
+    @traced(root=True)
+    def fetch_local_rank_grid(self, business_name, website, location, language_name="English",
+                              size=7, spacing_km=None, center=None, budget_ms=None):
+        """
+        Local finder rank of `website` at every point of a size x size grid
+        around the business.
+
+        The points are packed into multi-task local_finder task_post payloads
+        and their results collected with task_get calls in parallel, all under
+        the process-wide rate limit and the scan's deadline. Points still queued
+        at the deadline are reported as pending. Every point's task is
+        remembered for TASK_TTL, so a rescan of the same grid collects the
+        tasks already posted instead of posting them again. Points whose task
+        failed are reported in "errors". `center` is (lat, lng); by default the
+        business is looked up in the maps results by its domain.
+
+        Returns None when the business cannot be located.
+        """
+        config = get_geogrid_config()
+        spacing_km = spacing_km or config["SPACING_KM"]
+        deadline = Deadline(budget_ms or get_report_budget_ms())
+        with deadline_scope(deadline):
+            center = center or self._business_coordinates(business_name, website, location, language_name)
+            if not center:
+                return None
+
+            language_fields = {
+                key: value for key, value in self._locale_fields(location, language_name).items()
+                if key.startswith('language')
+            }
+            points = build_grid(center[0], center[1], size, spacing_km)
+            task_keys = {
+                (row, col): grid_task_cache_key(business_name, lat, lng, language_fields, config)
+                for row, col, lat, lng in points
+            }
+            known = cache.get_many(list(task_keys.values()))
+            tasks = {known[key]: point for point, key in task_keys.items() if key in known}
+            to_post = [point for point in points if task_keys[point[:2]] not in known]
+            errors = {}
+            if to_post:
+                posted, errors = self._post_grid_tasks(business_name, to_post, language_fields, task_keys, config)
+                tasks.update(posted)
+            positions, failed = self._collect_grid_tasks(tasks, website, deadline, config)
+            # Failed points are forgotten, so a rescan posts them again
+            cache.delete_many([task_keys[point] for point in failed])
+            errors.update(failed)
+
+        matrix = [[None] * size for _ in range(size)]
+        for (row, col), position in positions.items():
+            matrix[row][col] = position
+        # Points not ready by the deadline
+        pending = [(row, col) for row, col, _, _ in points if (row, col) not in positions and (row, col) not in errors]
+        return {
+            "keyword": business_name,
+            "website": website,
+            "center": {"lat": center[0], "lng": center[1]},
+            "size": size,
+            "spacing_km": spacing_km,
+            "bounds": {
+                "north": points[0][2], "south": points[-1][2],
+                "west": points[0][3], "east": points[-1][3],
+            },
+            "matrix": matrix,
+            "pending": [list(point) for point in pending],
+            "errors": [{"point": list(point), "error": error} for point, error in sorted(errors.items())],
+            "summary": grid_summary(matrix, config["DEPTH"], [*pending, *errors]),
+        }
+
+    @traced(root=True)
+    def fetch_site_crawl(self, website, max_pages, budget_ms=None):
+        """
+        Crawl up to `max_pages` pages of a site and audit them all: issue
+        counts, status codes, slowest pages and duplicate titles.
+
+        Large crawls take minutes, so this submits the crawl (once per domain
+        and page budget) and collects it within `budget_ms`; until it has
+        finished the result has status "pending" and calling again with the
+        same domain and budget picks up the same crawl.
+        """
+        website = canonical_host(website)
+        deadline = Deadline(budget_ms or get_report_budget_ms())
+        result = {"domain": website, "max_pages": max_pages, "status": "pending"}
+        with deadline_scope(deadline):
+            task_id = cache.get(onpage_task_cache_key(website, max_pages))
+            if not task_id:
+                try:
+                    task_id = self._submit_onpage_task(website, max_pages)
+                except OnPageSubmitError as e:
+                    print(f"Error submitting site crawl: {str(e)}")
+                    return None
+            result["task_id"] = task_id
+            try:
+                summary = self._collect_onpage_data(website, task_id, max_pages)
+            except (OnPageCrawlPending, DeadlineExceeded, requests.exceptions.Timeout):
+                return result
+            except UpstreamTaskError as e:
+                return dict(result, status="failed", error=str(e))
+
+        result.update(
+            status="finished",
+            pages_crawled=(summary.get('crawl_status') or {}).get('pages_crawled'),
+            onpage_score=summary.get('onpage_score'),
+            domain_info=summary.get('domain_info', {}),
+            site_audit=summary.get('site_audit', {}),
+        )
+        return result
+
+    @traced(root=True)
+    def fetch_rank_tracking(self, websites, keywords, location, language_name="English", budget_ms=None):
+        """
+        Organic Google position of every website for every keyword.
+
+        Each keyword's SERP is fetched once, whichever and however many domains
+        are tracked on it: SERPs are posted as multi-task task_post batches,
+        collected with task_get as tasks_ready reports them finished, and cached
+        as a domain -> position index that later requests (for any domain)
+        reuse. Keywords still queued at the deadline are reported as pending;
+        their tasks are remembered so the next request collects them instead of
+        posting them again. Keywords whose task failed are reported in "errors".
+        """
+        config = get_rank_tracking_config()
+        websites = [canonical_host(website) for website in websites]
+        deadline = Deadline(budget_ms or get_report_budget_ms())
+        with deadline_scope(deadline):
+            indexes, errors = self._fetch_serp_indexes(keywords, location, language_name, deadline, config)
+
+        positions = {
+            website: {keyword: position_in(indexes[keyword], website) for keyword in keywords if keyword in indexes}
+            for website in websites
+        }
+        return {
+            "location": location,
+            "language": language_name,
+            "keywords": keywords,
+            "positions": positions,
+            "summary": {website: rank_summary(positions[website]) for website in websites},
+            "pending": [keyword for keyword in keywords if keyword not in indexes and keyword not in errors],
+            "errors": errors,
+        }
+
+    @traced()
+    def _fetch_serp_indexes(self, keywords, location, language_name, deadline, config):
+        """
+        ({keyword: SERP position index}, {keyword: error}) from the cache, from
+        tasks already posted, or from new tasks.
+        """
+        serp_keys = {
+            keyword: serp_cache_key(keyword, location, language_name, config["DEPTH"])
+            for keyword in keywords
+        }
+        cached = cache.get_many(list(serp_keys.values()))
+        indexes = {keyword: cached[serp_keys[keyword]] for keyword in keywords if serp_keys[keyword] in cached}
+        missing = [keyword for keyword in keywords if keyword not in indexes]
+        annotate(keywords=len(keywords), cached=len(indexes))
+        if not missing:
+            return indexes, {}
+
+        task_keys = {keyword: serp_task_cache_key(serp_keys[keyword]) for keyword in missing}
+        known = cache.get_many(list(task_keys.values()))
+        tasks = {known[task_keys[keyword]]: keyword for keyword in missing if task_keys[keyword] in known}
+        to_post = [keyword for keyword in missing if task_keys[keyword] not in known]
+        errors = {}
+        if to_post:
+            posted, errors = self._post_serp_tasks(
+                to_post, self._locale_fields(location, language_name), task_keys, config
+            )
+            tasks.update(posted)
+
+        collected, failed = self._collect_serp_tasks(tasks, deadline, config)
+        cache.set_many({serp_keys[keyword]: index for keyword, index in collected.items()}, config["SERP_CACHE_TTL"])
+        # Failed tasks are forgotten too, so the next request posts them again
+        cache.delete_many([task_keys[keyword] for keyword in [*collected, *failed]])
+        indexes.update(collected)
+        errors.update(failed)
+        return indexes, errors
+
+    @traced()
+    def _post_serp_tasks(self, keywords, locale_fields, task_keys, config):
+        """
+        Submit one organic SERP task per keyword, TASKS_PER_POST per request.
+        Each batch's task ids are cached (under task_keys) as soon as it is
+        accepted, so a failed batch never costs the others their tasks.
+        Returns ({task_id: keyword}, {keyword: error}).
+        """
+        endpoint = f"{self.base_url}/serp/google/organic/task_post"
+        batches = [keywords[i:i + config["TASKS_PER_POST"]] for i in range(0, len(keywords), config["TASKS_PER_POST"])]
+
+        def post(batch):
+            payload = [
+                {
+                    "keyword": keyword,
+                    "depth": config["DEPTH"],
+                    "priority": 1,
+                    "tag": str(i),
+                    **locale_fields,
+                }
+                for i, keyword in enumerate(batch)
+            ]
+            get_rate_limiter().acquire()
+            with upstream_slot():
+                response = requests.post(endpoint, auth=self.auth, json=payload, timeout=upstream_timeout())
+            response.raise_for_status()
+            return response.json().get('tasks') or []
+
+        tasks = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=min(config["MAX_WORKERS"], len(batches))) as executor:
+            futures = {submit_in_context(executor, post, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    posted = future.result()
+                except (DeadlineExceeded, requests.exceptions.RequestException) as e:
+                    print(f"Error posting SERP tasks: {str(e)}")
+                    errors.update({keyword: str(e) for keyword in batch})
+                    continue
+                accepted = {}
+                for task in posted:
+                    tag = (task.get('data') or {}).get('tag') or ''
+                    if not (tag.isdigit() and int(tag) < len(batch)):
+                        continue
+                    keyword = batch[int(tag)]
+                    if task.get('id') and task.get('status_code') in (None, 20100):
+                        accepted[task['id']] = keyword
+                    else:
+                        errors[keyword] = f"{task.get('status_code')} {task.get('status_message', '')}".strip()
+                cache.set_many({task_keys[keyword]: task_id for task_id, keyword in accepted.items()}, config["TASK_TTL"])
+                tasks.update(accepted)
+        return tasks, errors
+
+    @traced()
+    def _collect_serp_tasks(self, tasks, deadline, config):
+        """
+        Until every posted SERP is collected or the deadline passes: ask
+        tasks_ready which tasks have finished and task_get only those. When
+        tasks_ready lists only other tasks, the pending ones are fetched
+        directly, since the list is capped and may be full of them.
+        Returns ({keyword: SERP position index}, {keyword: error}); tasks that
+        failed upstream are dropped rather than polled until the deadline.
+        """
+        indexes = {}
+        errors = {}
+        pending = dict(tasks)
+
+        def ready():
+            get_rate_limiter().acquire()
+            endpoint = f"{self.base_url}/serp/google/organic/tasks_ready"
+            with upstream_slot():
+                response = requests.get(endpoint, auth=self.auth, timeout=upstream_timeout())
+            response.raise_for_status()
+            return [
+                item.get('id')
+                for task in response.json().get('tasks') or []
+                for item in task.get('result') or []
+            ]
+
+        def get(task_id):
+            get_rate_limiter().acquire()
+            endpoint = f"{self.base_url}/serp/google/organic/task_get/regular/{task_id}"
+            with upstream_slot():
+                response = requests.get(endpoint, auth=self.auth, timeout=upstream_timeout())
+            response.raise_for_status()
+            task = (response.json().get('tasks') or [{}])[0]
+            if task.get('status_code') != 20000:
+                return task_id, task.get('status_code'), task.get('status_message', '')
+            result = (task.get('result') or [{}])[0] or {}
+            return task_id, 20000, serp_position_index(result.get('items'))
+
+        executor = ThreadPoolExecutor(max_workers=config["MAX_WORKERS"])
+        try:
+            while pending and not deadline.expired():
+                try:
+                    listed = ready()
+                except (DeadlineExceeded, requests.exceptions.RequestException) as e:
+                    print(f"Error listing ready SERP tasks: {str(e)}")
+                    listed = []
+                ready_ids = [task_id for task_id in listed if task_id in pending]
+                if listed and not ready_ids:
+                    # tasks_ready is account-wide and capped, so tasks nobody collected (e.g. from
+                    # requests that timed out) can fill it and hide ours: ask for ours directly
+                    ready_ids = list(pending)
+                waiting = len(pending)
+
+                futures = [submit_in_context(executor, get, task_id) for task_id in ready_ids]
+                done, _ = wait(futures, timeout=deadline.remaining())
+                for future in done:
+                    try:
+                        task_id, status_code, result = future.result()
+                    except (DeadlineExceeded, requests.exceptions.RequestException) as e:
+                        print(f"Error collecting SERP task: {str(e)}")
+                        continue
+                    if status_code == 20000:
+                        indexes[pending.pop(task_id)] = result
+                    elif status_code not in TASK_QUEUED_CODES:
+                        errors[pending.pop(task_id)] = f"{status_code} {result}".strip()
+
+                # Ask again at once while tasks keep coming in; otherwise wait for the next poll
+                if pending and len(pending) == waiting and deadline.remaining() > config["POLL_SECONDS"]:
+                    sleep_within_deadline(config["POLL_SECONDS"])
+                elif pending and len(pending) == waiting:
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return indexes, errors
+
+    def _business_coordinates(self, business_name, website, location, language_name):
+        """(lat, lng) of the business's maps listing, from the stored maps section or a fresh call"""
+        stored = load_sections(['business_details'], business_name, website, location, language_name)
+        if 'business_details' in stored:
+            maps_data = stored['business_details'].data
+        else:
+            maps_data = self._fetch_business_details(business_name, location, website, language_name)
+        listing = DomainIndex((maps_data or {}).get('items') or []).get(website)
+        if listing and listing.get('latitude') is not None and listing.get('longitude') is not None:
+            return listing['latitude'], listing['longitude']
+        return None
+
+    @traced()
+    def _post_grid_tasks(self, keyword, points, language_fields, task_keys, config):
+        """
+        Submit one local_finder task per grid point, TASKS_PER_POST per request.
+        Each batch's task ids are cached (under task_keys) as soon as it is
+        accepted, so a failed batch never costs the others their tasks.
+        Returns ({task_id: (row, col)}, {(row, col): error}).
+        """
+        endpoint = f"{self.base_url}/serp/google/local_finder/task_post"
+        batches = [points[i:i + config["TASKS_PER_POST"]] for i in range(0, len(points), config["TASKS_PER_POST"])]
+
+        def post(batch):
+            payload = [
+                {
+                    "keyword": keyword,
+                    "location_coordinate": f"{lat},{lng},{config['ZOOM']}z",
+                    "depth": config["DEPTH"],
+                    "priority": 2,
+                    "tag": f"{row},{col}",
+                    **language_fields,
+                }
+                for row, col, lat, lng in batch
+            ]
+            get_rate_limiter().acquire()
+            with upstream_slot():
+                response = requests.post(endpoint, auth=self.auth, json=payload, timeout=upstream_timeout())
+            response.raise_for_status()
+            return response.json().get('tasks') or []
+
+        tasks = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=min(config["MAX_WORKERS"], len(batches))) as executor:
+            futures = {submit_in_context(executor, post, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    posted = future.result()
+                except (DeadlineExceeded, requests.exceptions.RequestException) as e:
+                    print(f"Error posting grid points: {str(e)}")
+                    errors.update({(row, col): str(e) for row, col, _, _ in futures[future]})
+                    continue
+                accepted = {}
+                for task in posted:
+                    tag = (task.get('data') or {}).get('tag') or ''
+                    if ',' not in tag:
+                        continue
+                    row, col = tag.split(',')
+                    point = (int(row), int(col))
+                    if task.get('id') and task.get('status_code') in (None, 20100):
+                        accepted[task['id']] = point
+                    else:
+                        errors[point] = f"{task.get('status_code')} {task.get('status_message', '')}".strip()
+                cache.set_many({task_keys[point]: task_id for task_id, point in accepted.items()}, config["TASK_TTL"])
+                tasks.update(accepted)
+        return tasks, errors
+
+    @traced()
+    def _collect_grid_tasks(self, tasks, website, deadline, config):
+        """
+        Poll task_get for every submitted point until all are ready or the
+        deadline passes. Returns ({(row, col): position or None} for the ready
+        points, {(row, col): error} for the points whose task failed upstream).
+        """
+        positions = {}
+        errors = {}
+        pending = dict(tasks)
+
+        def get(task_id):
+            get_rate_limiter().acquire()
+            endpoint = f"{self.base_url}/serp/google/local_finder/task_get/advanced/{task_id}"
+            with upstream_slot():
+                response = requests.get(endpoint, auth=self.auth, timeout=upstream_timeout())
+            response.raise_for_status()
+            task = (response.json().get('tasks') or [{}])[0]
+            if task.get('status_code') != 20000:
+                return task_id, task.get('status_code'), task.get('status_message', '')
+            result = (task.get('result') or [{}])[0] or {}
+            listing = DomainIndex(result.get('items') or []).get(website)
+            return task_id, 20000, listing.get('rank_group') if listing else None
+
+        executor = ThreadPoolExecutor(max_workers=config["MAX_WORKERS"])
+        try:
+            while pending and not deadline.expired():
+                futures = [submit_in_context(executor, get, task_id) for task_id in pending]
+                done, _ = wait(futures, timeout=deadline.remaining())
+                for future in done:
+                    try:
+                        task_id, status_code, result = future.result()
+                    except (DeadlineExceeded, requests.exceptions.RequestException) as e:
+                        print(f"Error collecting grid point: {str(e)}")
+                        continue
+                    if status_code == 20000:
+                        positions[pending.pop(task_id)] = result
+                    elif status_code not in TASK_QUEUED_CODES:
+                        errors[pending.pop(task_id)] = f"{status_code} {result}".strip()
+                if pending and deadline.remaining() > config["POLL_SECONDS"]:
+                    sleep_within_deadline(config["POLL_SECONDS"])
+                elif pending:
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return positions, errors
+
+    @traced()
+    def _collect_sections(self, sections, business_name, websites, location, language_name, deadline, refresh=()):
+        """
+        Load `sections` for each website from the section store, fetch the stale
+        ones (every website concurrently) and store what came back.
+
+        Returns {website: (rows, statuses, completed)}: the stored rows to build
+        the report from, each section's status and the freshly fetched data.
+        """
+        return self._collect_stages(
+            [(sections, websites)], business_name, location, language_name, deadline, refresh
+        )[0]
+
+    def _collect_stages(self, stages, business_name, location, language_name, deadline, refresh=()):
+        """
+        _collect_sections for several (sections, websites) stages at once: the
+        stale sections of every stage and website are fetched concurrently under
+        the one deadline. Returns one {website: (rows, statuses, completed)} per stage.
+        """
+        stored = {}
+        plans = {}
+        for stage, (sections, websites) in enumerate(stages):
+            for website in websites:
+                stored[stage, website] = load_sections(sections, business_name, website, location, language_name)
+                stale = [
+                    name for name in sections
+                    if name in refresh or 'all' in refresh or not is_fresh(stored[stage, website].get(name))
+                ]
+                if stale:
+                    plans[stage, website] = plan_sections(stale)
+
+        fetched = {}
+        if len(plans) == 1:
+            (stage, website), plan = next(iter(plans.items()))
+            fetched[stage, website] = self._fetch_sections(plan, business_name, website, location, language_name, deadline)
+        elif plans:
+            # Each plan's sections are bounded by the deadline, so these all return in time
+            with ThreadPoolExecutor(max_workers=len(plans)) as executor:
+                futures = {
+                    job: submit_in_context(
+                        executor, self._fetch_sections, plan, business_name, job[1], location, language_name, deadline
+                    )
+                    for job, plan in plans.items()
+                }
+                fetched = {job: future.result() for job, future in futures.items()}
+
+        # The database is only touched here, on the calling thread
+        collected = []
+        for stage, (sections, websites) in enumerate(stages):
+            results_by_website = {}
+            for website in websites:
+                job = (stage, website)
+                rows = stored[job]
+                statuses = {name: "ok" for name in sections}
+                completed = {}
+                if job in fetched:
+                    results, fetch_statuses = fetched[job]
+                    statuses.update({name: fetch_statuses[name] for name in sections if name in fetch_statuses})
+                    completed = {name: data for name, data in results.items() if fetch_statuses.get(name) == "ok"}
+                    sources = {name: derivation.source for name, derivation in plans[job].derived.items()}
+                    if completed:
+                        rows.update(save_sections(completed, sources, business_name, website, location, language_name))
+                    if 'competitors' in completed or 'business_details' in completed:
+                        self._record_competitors(business_name, website, location, completed)
+                results_by_website[website] = (rows, statuses, completed)
+            collected.append(results_by_website)
+        return collected
+
+    def _assemble_report(self, business_name, website, location, rows, statuses, completed):
+        """Format stored/fetched section rows into a report with per-section metadata"""
+        sections = {name: rows[name].data if name in rows else {} for name in SECTIONS}
+
+        # Combine all data
+        report = self._format_local_seo_data(
+            business_name, 
+            location,
+            website,
+            sections['gmb'],
+            sections['local_rankings'],
+            sections['business_details'],
+            sections['onpage'],
+            sections['backlinks'],
+            sections['keywords'],
+            sections['pagespeed'],
+            sections['competitors']
+        )
+        report["sections"] = {
+            name: {
+                "status": statuses.get(name, "ok"),
+                "source": rows[name].source if name in rows else None,
+                "fetched_at": rows[name].fetched_at.isoformat() if name in rows else None,
+                "cached": name not in completed,
+            }
+            for name in SECTIONS
+        }
+        report["partial"] = any(status != "ok" for status in statuses.values())
+        if statuses.get('onpage') == "pending":
+            task_id = cache.get(onpage_task_cache_key(website))
+            if task_id:
+                report["followup"] = followup_token(website, {"onpage": task_id})
+        return report
+
+    def _record_competitors(self, business_name, website, location, fetched):
+        """Feed freshly fetched competitor and maps results into the competitor index"""
+        try:
+            record_competitors(
+                website,
+                location,
+                self._split_keywords(business_name),
+                competitor_data=fetched.get('competitors'),
+                maps_data=fetched.get('business_details'),
+            )
+        except Exception as e:
+            print(f"Error updating competitor index: {str(e)}")
+
+    def _record_history(self, report, website, rows, completed):
+        """
+        Append the report's headline metrics to the domain's metric history.
+
+        Section metrics are only recorded when their section was fetched for this
+        report, so a cached row is not recorded again as a new observation.
+        """
+        try:
+            pagespeed = rows['pagespeed'].data if 'pagespeed' in completed else {}
+            local_rankings = rows['local_rankings'].data if 'local_rankings' in completed else {}
+            metrics = {
+                "seo_score": report["seo_score"],
+                "benchmark_score": report["competitors"]["benchmark_score"],
+                "authority": report["authority"],
+            }
+            if pagespeed:
+                metrics["pagespeed"] = self.calculate_pagespeed_score(pagespeed)
+                for metric_id, score in self.pagespeed_metric_scores(pagespeed).items():
+                    metrics[f"lighthouse.{metric_id}"] = score * 100
+            listing = DomainIndex(local_rankings.get('items') or []).get(website)
+            if listing and listing.get('rank_absolute') is not None:
+                metrics["local_rank"] = listing['rank_absolute']
+            TimeSeriesStore().append(website, metrics)
+        except Exception as e:
+            print(f"Error recording metric history: {str(e)}")
+
+    @traced()
+    def _fetch_sections(self, plan, business_name, website, location, language_name, deadline):
+        """
+        Run a section plan: fetch the planned sections concurrently from their own
+        endpoints, then derive the remaining ones from those results.
+
+        Returns (results, statuses); statuses are "ok", "timeout" or "error".
+        Workers still running at the deadline are abandoned, and their upstream
+        calls time out on their own since every call is capped by the deadline.
+        """
+        results = {}
+        statuses = {}
+        if plan.fetch:
+            # Build the locale index here so the workers never need the database
+            get_locale_index()
+            executor = ThreadPoolExecutor(max_workers=len(plan.fetch))
+            futures = {
+                submit_in_context(
+                    executor, self._fetch_section_within, deadline.child(get_section_budget_share(name)),
+                    name, business_name, website, location, language_name
+                ): name
+                # The on-page crawl runs on DataForSEO's side, so submit it before anything else
+                for name in sorted(plan.fetch, key=lambda name: name != 'onpage')
+            }
+            done, not_done = wait(futures, timeout=deadline.remaining())
+            executor.shutdown(wait=False, cancel_futures=True)
+
+            for future in not_done:
+                statuses[futures[future]] = "timeout"
+            for future in done:
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                    statuses[name] = "ok"
+                except OnPageCrawlPending:
+                    statuses[name] = "pending"
+                except (DeadlineExceeded, requests.exceptions.Timeout):
+                    statuses[name] = "timeout"
+                except Exception as e:
+                    print(f"Error fetching {name} section: {str(e)}")
+                    statuses[name] = "error"
+            # A crawl that was submitted but abandoned at the deadline can still be collected later
+            if statuses.get('onpage') == "timeout" and cache.get(onpage_task_cache_key(website)):
+                statuses['onpage'] = "pending"
+
+        for name, derivation in plan.derived.items():
+            statuses[name] = statuses.get(derivation.source, "error")
+            if statuses[name] == "ok":
+                results[name] = derivation.derive(results.get(derivation.source) or {})
+
+        return results, statuses
+
+    def _fetch_section_within(self, deadline, name, *args):
+        with deadline_scope(deadline), span(f"section:{name}", section=name, budget_ms=deadline.budget_ms):
+            return self._fetch_section(name, *args)
+
+    def _fetch_section(self, name, business_name, website, location, language_name):
+        """Fetch one raw report section from its own upstream endpoint"""
+        if name == 'gmb':
+            return self._fetch_gmb_data(business_name, location, language_name)
+        if name == 'local_rankings':
+            return self._fetch_local_rankings(business_name, location, language_name)
+        if name == 'business_details':
+            return self._fetch_business_details(business_name, location, website, language_name)
+        if name == 'onpage':
+            return self._fetch_onpage_data(website) if website else {}
+        if name == 'backlinks':
+            return self._fetch_backlinks_data(website) if website else {}
+        if name == 'keywords':
+            return self._fetch_keyword_data(business_name, location, language_name)
+        if name == 'pagespeed':
+            return self._fetch_pagespeed_data(website) if website else {}
+        if name == 'competitors':
+            return self._fetch_competitor_data(business_name, location, language_name)
+        raise ValueError(f"Unknown report section: {name}")
     
+    @traced()
     def _fetch_gmb_data(self, business_name, location, language_name="English"):
         """Google My Business API integration"""
         endpoint = f"{self.base_url}/business_data/google/my_business_info/live"
         payload = [{
             "keyword": business_name,
-            "location_name": location,
-            "language_name": language_name
+            **self._locale_fields(location, language_name)
         }]
-        response = requests.post(endpoint, auth=self.auth, json=payload)
+        response = self._post(endpoint, payload)
         
         response.raise_for_status()
         tasks = response.json().get('tasks', [])
@@ -89,87 +833,151 @@ class SEOAPIService:
         
         return tasks[0].get('result', [{}])[0] if tasks else {}
     
-    def _fetch_local_rankings(self, business_name, location):
+    @traced()
+    def _fetch_local_rankings(self, business_name, location, language_name="English"):
         """Google Local Finder API integration"""
         endpoint = f"{self.base_url}/serp/google/local_finder/live/advanced"
         payload = [{
             "keyword": business_name,
-            "location_name": location,
-            "language_code": "en"
+            **self._locale_fields(location, language_name)
         }]
-        response = requests.post(endpoint, auth=self.auth, json=payload)
+        response = self._post(endpoint, payload)
         response.raise_for_status()
         tasks = response.json().get('tasks', [])
         
         return tasks[0].get('result', [{}])[0] if tasks else {}
     
-    def _fetch_business_details(self, business_name, location, website):
+    @traced()
+    def _fetch_business_details(self, business_name, location, website, language_name="English"):
         """Google Maps API integration"""
         endpoint = f"{self.base_url}/serp/google/maps/live/advanced"
         payload = [{
             "keyword": business_name,
-            "location_name": location,
-            "language_code": "en"
+            **self._locale_fields(location, language_name)
         }]
-        response = requests.post(endpoint, auth=self.auth, json=payload)
+        response = self._post(endpoint, payload)
         response.raise_for_status()
         tasks = response.json().get('tasks', [])
         response = tasks[0].get('result', [{}])[0] if tasks else {}       
         
         return response
     
+    @traced()
     def _fetch_onpage_data(self, website):
-        """On-Page API integration - two-step process"""
-        try:
-            # Step 1: Create a task
-            task_post_endpoint = f"{self.base_url}/on_page/task_post"
-            task_payload = [{
-                "target": website,
-                "max_crawl_pages": 1,  # Limit crawl to 1 pages for faster results
-                "load_resources": False, 
-                "enable_javascript": False,  
-               
-            }]
-            
-            task_response = requests.post(task_post_endpoint, auth=self.auth, json=task_payload)
-            
-            time.sleep(4)
-            task_response.raise_for_status()
-            
-            task_data = task_response.json()
-            
-            
-            # Extract task ID
-            if not task_data.get('tasks'):
-                print("No tasks returned from task_post")
-                return [{}]
-                
-            task_id = task_data['tasks'][0].get('id')
-            if  task_id:
-                # Get the summary
-                summary_endpoint = f"{self.base_url}/on_page/summary/{task_id}"
-                summary_response = requests.get(summary_endpoint, auth=self.auth)
-                summary_response.raise_for_status()
-                
-                summary_data = summary_response.json()
-                
-                
-                # Extract the result
-                if not summary_data.get('tasks'):
-                    print("No tasks returned from summary")
-                    return [{}]
-                tasks = summary_data.get('tasks', [])
-                if not tasks or not tasks[0].get('result'):
-                    return {}
-                return tasks[0].get('result', [{}])[0] if tasks else {}
-            
-        except requests.exceptions.RequestException as e:
-            print(f"API request error in _fetch_onpage_data: {str(e)}")
-            return {}
-        except Exception as e:
-            print(f"Error in _fetch_onpage_data: {str(e)}")
-            return {}
+        """
+        On-Page API integration - submit a crawl task, then collect its summary.
+
+        A crawl already submitted for this domain (by an earlier report that ran
+        out of time) is collected instead of being submitted again.
+        """
+        task_id = cache.get(onpage_task_cache_key(website))
+        if not task_id:
+            task_id = self._submit_onpage_task(website)
+        return self._collect_onpage_data(website, task_id)
+
+    @traced()
+    def _submit_onpage_task(self, website, max_pages=None):
+        """
+        Post the crawl task and remember its id until the summary is collected.
+        Reports crawl SEO_SITE_CRAWL["REPORT_PAGES"] pages (the homepage by default).
+
+        Upstream errors and timeouts propagate, and a response without a task
+        raises OnPageSubmitError, so the section is marked failed rather than
+        stored as an empty crawl.
+        """
+        task_post_endpoint = f"{self.base_url}/on_page/task_post"
+        task_payload = [{
+            "target": website,
+            "max_crawl_pages": max_pages or get_site_crawl_config()["REPORT_PAGES"],
+            "load_resources": False, 
+            "enable_javascript": False,  
+        }]
+        
+        annotate(endpoint="/on_page/task_post", payload_bytes=len(json.dumps(task_payload)))
+        with upstream_slot():
+            task_response = requests.post(task_post_endpoint, auth=self.auth, json=task_payload, timeout=upstream_timeout())
+        task_response.raise_for_status()
+        task_data = task_response.json()
+        
+        # Extract task ID
+        task_id = (task_data.get('tasks') or [{}])[0].get('id')
+        if not task_id:
+            raise OnPageSubmitError(f"No task returned from on_page/task_post for {website}")
+        cache.set(onpage_task_cache_key(website, max_pages), task_id, ONPAGE_TASK_TTL)
+        return task_id
+
+    @traced()
+    def _collect_onpage_data(self, website, task_id, max_pages=None):
+        """
+        Poll the crawl summary until the crawl has finished. Raises
+        OnPageCrawlPending once the deadline leaves no time for another poll;
+        the task id stays cached so a follow-up report collects it. A task that
+        failed upstream raises UpstreamTaskError and is forgotten.
+
+        Crawls of more than one page also get a "site_audit" built from every
+        crawled page (see _ingest_onpage_pages).
+        """
+        deadline = current_deadline() or Deadline(upstream_timeout() * 1000)
+        polls = 0
+        while True:
+            polls += 1
+            annotate(endpoint="/on_page/summary", attempts=polls)
+            summary_endpoint = f"{self.base_url}/on_page/summary/{task_id}"
+            with upstream_slot():
+                summary_response = requests.get(summary_endpoint, auth=self.auth, timeout=upstream_timeout())
+            summary_response.raise_for_status()
+            task = (summary_response.json().get('tasks') or [{}])[0]
+            if task.get('status_code') not in (20000, *TASK_QUEUED_CODES):
+                # Failed or expired upstream: forget it so the next report submits a new crawl
+                cache.delete(onpage_task_cache_key(website, max_pages))
+                raise UpstreamTaskError(
+                    f"on_page task {task_id} failed: {task.get('status_code')} {task.get('status_message', '')}".strip()
+                )
+            result = (task.get('result') or [{}])[0] or {}
+
+            if result.get('crawl_progress') == 'finished':
+                if (max_pages or get_site_crawl_config()["REPORT_PAGES"]) > 1:
+                    result = dict(result, site_audit=self._ingest_onpage_pages(website, task_id))
+                cache.delete(onpage_task_cache_key(website, max_pages))
+                return result
+            if deadline.remaining() <= ONPAGE_POLL_SECONDS:
+                raise OnPageCrawlPending(task_id)
+            sleep_within_deadline(ONPAGE_POLL_SECONDS)
     
+    @traced()
+    def _ingest_onpage_pages(self, website, task_id):
+        """
+        Read a finished crawl's pages from on_page/pages, PAGE_SIZE at a time,
+        streaming each batch to local storage and into the site audit as it
+        arrives, so memory holds one batch however large the crawl. A crawl
+        already ingested is answered from its stored audit.
+        """
+        audit = load_site_audit(website, task_id)
+        if audit is not None:
+            return audit
+
+        config = get_site_crawl_config()
+        endpoint = f"{self.base_url}/on_page/pages"
+        site_audit = SiteAudit(config)
+        offset = 0
+        with CrawlPageWriter(website, task_id) as writer:
+            while True:
+                response = self._post(endpoint, [{"id": task_id, "limit": config["PAGE_SIZE"], "offset": offset}])
+                response.raise_for_status()
+                tasks = response.json().get('tasks') or []
+                result = (tasks[0].get('result') or [{}])[0] if tasks else {}
+                pages = result.get('items') or []
+                writer.write(pages)
+                site_audit.add(pages)
+                offset += len(pages)
+                if not pages or offset >= (result.get('total_items_count') or 0):
+                    break
+            audit = site_audit.result()
+            annotate(pages=audit["pages"])
+            writer.commit(audit)
+        return audit
+
+    @traced()
     def _fetch_backlinks_data(self, website):
         """Backlinks API integration"""
         endpoint = f"{self.base_url}/backlinks/backlinks/live"
@@ -177,7 +985,7 @@ class SEOAPIService:
             "target": website,
             "limit": 10
         }]
-        response = requests.post(endpoint, auth=self.auth, json=payload)
+        response = self._post(endpoint, payload)
         response.raise_for_status()
         tasks = response.json().get('tasks', [])
         
@@ -185,37 +993,176 @@ class SEOAPIService:
         # Backlinks API is unauthorized
         return {}
     
-    def _fetch_keyword_data(self, business_name, location):
-        """Keyword Data API integration"""
+    @traced()
+    def _fetch_keyword_data(self, business_name, location, language_name="English"):
+        """
+        Keyword Data API integration
+
+        Search volumes are cached per (keyword, location, language). Only keywords
+        missing from the cache are requested, in parallel chunks of up to
+        KEYWORD_VOLUME_CHUNK_SIZE, and results are returned in the caller's order.
+        """
+        keywords = self._split_keywords(business_name)
+        if not keywords:
+            return []
+
+        cache_keys = {
+            keyword: self._keyword_volume_cache_key(keyword, location, language_name)
+            for keyword in keywords
+        }
+        cached = cache.get_many(list(cache_keys.values()))
+        missing = [keyword for keyword in keywords if cache_keys[keyword] not in cached]
+
+        fetched = {}
+        if missing:
+            chunks = [
+                missing[i:i + KEYWORD_VOLUME_CHUNK_SIZE]
+                for i in range(0, len(missing), KEYWORD_VOLUME_CHUNK_SIZE)
+            ]
+            ttl = getattr(settings, 'SEO_KEYWORD_VOLUME_CACHE_TTL', KEYWORD_VOLUME_CACHE_TTL)
+            failure = None
+            with ThreadPoolExecutor(max_workers=min(len(chunks), KEYWORD_VOLUME_MAX_WORKERS)) as executor:
+                futures = {
+                    submit_in_context(executor, self._fetch_search_volume_chunk, chunk, location, language_name): chunk
+                    for chunk in chunks
+                }
+                for future in as_completed(futures):
+                    try:
+                        items = future.result()
+                    except Exception as e:
+                        failure = failure or e
+                        continue
+                    for item in items:
+                        if item and item.get('keyword'):
+                            fetched[item['keyword'].strip().lower()] = item
+                    # Keywords a successful task returned nothing for are cached as None so
+                    # they are not requested again on every report; a failed chunk caches nothing
+                    cache.set_many(
+                        {cache_keys[keyword]: fetched.get(keyword.lower()) for keyword in futures[future]},
+                        timeout=ttl
+                    )
+            if failure is not None:
+                raise failure
+
+        results = []
+        for keyword in keywords:
+            item = cached[cache_keys[keyword]] if cache_keys[keyword] in cached else fetched.get(keyword.lower())
+            if item:
+                results.append(item)
+        return results
+
+    @traced()
+    def _fetch_search_volume_chunk(self, keywords, location, language_name):
+        """Request search volume for one chunk of keywords"""
         endpoint = f"{self.base_url}/keywords_data/google/search_volume/live"
         payload = [{
-            "keywords": business_name.split(','),
-            "location_name": location,
-            "language_name": "English"
+            "keywords": keywords,
+            **self._locale_fields(location, language_name)
         }]
-        response = requests.post(endpoint, auth=self.auth, json=payload)
+        response = self._post(endpoint, payload)
+        response.raise_for_status()
+        tasks = response.json().get('tasks') or [{}]
+        if tasks[0].get('status_code') != 20000:
+            raise UpstreamTaskError(
+                f"search_volume task failed: {tasks[0].get('status_code')} {tasks[0].get('status_message', '')}".strip()
+            )
+        return tasks[0].get('result') or []
+
+    def _split_keywords(self, business_name):
+        """Split a comma separated keyword string, dropping blanks and duplicates"""
+        keywords = []
+        seen = set()
+        for keyword in (business_name or '').split(','):
+            keyword = keyword.strip()
+            if keyword and keyword.lower() not in seen:
+                seen.add(keyword.lower())
+                keywords.append(keyword)
+        return keywords
+
+    def _post(self, endpoint, payload):
+        """
+        POST to a DataForSEO /live endpoint.
+
+        Calls are capped by the current deadline and, when SEO_HEDGING is
+        enabled, hedged with a duplicate once they run past the endpoint's
+        tracked latency percentile. Each attempt holds an upstream slot for the
+        caller's priority class and tenant, taken outside the timed call.
+        """
+        path = endpoint.replace(self.base_url, '', 1)
+        with span(f"POST {path}", endpoint=path, payload_bytes=len(json.dumps(payload)), attempts=1) as post_span:
+            response = get_hedger().call(
+                path,
+                lambda: self._send_post(endpoint, payload),
+                slot=upstream_slot,
+            )
+            if post_span is not None:
+                post_span.set(status_code=response.status_code)
+            return response
+
+    def _send_post(self, endpoint, payload):
+        """One POST attempt; the hedger holds an upstream slot for it (see _post)"""
+        return requests.post(endpoint, auth=self.auth, json=payload, timeout=upstream_timeout())
+
+    def _locale_fields(self, location, language_name):
+        """
+        Payload fields for a location/language pair.
+
+        Names known to the local locale index are sent as DataForSEO codes so the
+        API does not have to resolve free text; unknown names are sent as-is.
+        """
+        index = get_locale_index()
+        location_entry = index.locations.get(location)
+        language_entry = index.languages.get(language_name)
+
+        fields = {}
+        if location_entry:
+            fields["location_code"] = location_entry["code"]
+        else:
+            fields["location_name"] = location
+        if language_entry:
+            fields["language_code"] = language_entry["code"]
+        else:
+            fields["language_name"] = language_name
+        return fields
+
+    def fetch_locations(self):
+        """Full DataForSEO locations list (used to sync the local locale index)"""
+        return self._fetch_reference_list(f"{self.base_url}/serp/google/locations")
+
+    def fetch_languages(self):
+        """Full DataForSEO languages list (used to sync the local locale index)"""
+        return self._fetch_reference_list(f"{self.base_url}/serp/google/languages")
+
+    def _fetch_reference_list(self, endpoint):
+        with upstream_slot():
+            response = requests.get(endpoint, auth=self.auth, timeout=upstream_timeout())
         response.raise_for_status()
         tasks = response.json().get('tasks', [])
-        
-        return tasks[0].get('result', [{}]) if tasks else []
-    
-        
-    def _fetch_rank_data(self, website, keywords):
-        """Rank Tracker API integration"""
+
+        return (tasks[0].get('result') or []) if tasks else []
+
+    def _keyword_volume_cache_key(self, keyword, location, language_name):
+        raw = f"{keyword.lower()}|{location}|{language_name}".lower()
+        return "seo:search_volume:" + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @traced()
+    def _fetch_rank_data(self, website, keywords, location="United States", language_name="English"):
+        """
+        Rank Tracker integration: {keyword: {"position", "rank_absolute", "url"} or None}
+        for one website, through the shared SERP cache (see fetch_rank_tracking).
+        `keywords` are strings or search volume items with a "keyword" field.
+        """
         if not keywords or not website:
             return {}
-            
-        keyword_list = [k.get('keyword') for k in keywords[:5]]
-        endpoint = f"{self.base_url}/serp/google/organic/live"
-        payload = {
-            "keywords": keyword_list,
-            "target": website,
-            "limit": 10
-        }
-        response = requests.post(endpoint, auth=self.auth, json=payload)
-        response.raise_for_status()
-        return response.json().get('tasks', {}).get('result', [{}])
+
+        keyword_list = self._split_keywords(','.join(
+            k.get('keyword', '') if isinstance(k, dict) else str(k) for k in keywords
+        ))
+        deadline = current_deadline() or Deadline(get_report_budget_ms())
+        indexes, _ = self._fetch_serp_indexes(keyword_list, location, language_name, deadline, get_rank_tracking_config())
+        return {keyword: position_in(index, website) for keyword, index in indexes.items()}
     
+    @traced()
     def _fetch_pagespeed_data(self, website):
         """PageSpeed API integration"""
         endpoint = f"{self.base_url}/on_page/lighthouse/live/json"
@@ -225,13 +1172,14 @@ class SEOAPIService:
             "url": website,
             "for_mobile": True
         }]
-        response = requests.post(endpoint, auth=self.auth, json=payload)
+        response = self._post(endpoint, payload)
         response.raise_for_status()
         
         tasks = response.json().get('tasks', [])
       
         return tasks[0].get('result', [{}])[0] if tasks else {}
     
+    @traced()
     def _fetch_content_analysis(self, business_name):
         """Content Analysis API integration"""
         # endpoint = f"{self.base_url}/content_analysis/summary/live"
@@ -247,16 +1195,16 @@ class SEOAPIService:
         # return tasks[0].get('result', [{}])[0] if tasks else {}
         return {}
     
+    @traced()
     def _fetch_competitor_data(self, business_name, location, language):
         """Competitor API integration"""
         endpoint = f"{self.base_url}/dataforseo_labs/google/serp_competitors/live"
         payload = [{
             "keywords": business_name.split(','),
-            "location_name": location,
-            "language_name": language,
+            **self._locale_fields(location, language),
             "limit": 5
         }]
-        response = requests.post(endpoint, auth=self.auth, json=payload)
+        response = self._post(endpoint, payload)
         response.raise_for_status()
         
         tasks = response.json().get('tasks', [])
@@ -298,6 +1246,7 @@ class SEOAPIService:
             "website_analysis": {
                 "onpage_score": onpage_data.get('onpage_score', 0),
                 "domain_info": onpage_data.get('domain_info', {}),
+                "site_audit": onpage_data.get('site_audit', {}),
                 "pagespeed": {
                     "environment": pagespeed_data.get('environment', {}),
                     "audits": pagespeed_data.get('audits', {})
@@ -326,6 +1275,7 @@ class SEOAPIService:
             "authority": competitor_benchmark['score'] + 20
         }
     
+    @traced()
     def _calculate_seo_score(self, business_details_score, pagespeed_score, competitor_benchmark,  local_rankings_score, enhancement_method="logarithmic"):
         """Calculate overall SEO score from various components"""
        
@@ -368,7 +1318,11 @@ class SEOAPIService:
         return int(final_score)
     
     # 1. Google Business Profile (GBP) Score
+    @traced()
     def calculate_gbp_score(self,gmb_data):
+        # my_business_info returns a list of items; score the business profile itself
+        if isinstance(gmb_data, list):
+            gmb_data = gmb_data[0] if gmb_data else {}
         completeness_score = 0
         required_fields = ['title', 'domain', 'phone', 'description']
         
@@ -385,6 +1339,7 @@ class SEOAPIService:
 
 
     # 2. Local Search Rankings Score
+    @traced()
     def calculate_local_rankings_score(self,local_rankings):
         if not local_rankings.get('items'):
             return 0
@@ -399,6 +1354,7 @@ class SEOAPIService:
         
         return sum(rank_scores) / len(rank_scores) if rank_scores else 0
     
+    @traced()
     def calculate_business_details_score(self, data,website):
         """
         Calculate a business profile score based on Google Maps data.
@@ -410,14 +1366,11 @@ class SEOAPIService:
             float: Business profile score on a scale of 1-10
         """
         # Extract business data from the nested structure
-        business_items = data["items"] if data["items"] else []
+        business_items = data.get("items") or []
         
-        # Find the business item 
-        business = None
-        for item in business_items:
-            if website in item["domain"] or website in item["url"]:
-                business = item
-                break
+        # Find the business item by registrable domain (www/scheme/path variants match,
+        # lookalikes such as idea.com for ea.com do not)
+        business = DomainIndex(business_items).get(website) if website else None
         
         if not business:
             return 0  
@@ -450,6 +1403,7 @@ class SEOAPIService:
         
 
 
+    @traced()
     def calculate_competitor_benchmark_score(self, competitor_data, domain=None):
         """
         Calculate a benchmark score based on competitor data
@@ -480,6 +1434,7 @@ class SEOAPIService:
                 }
             
             # Extract competitor metrics
+            target_domain = registrable_domain(domain)
             competitors = []
             domain_position = None
             domain_score = 0
@@ -504,7 +1459,7 @@ class SEOAPIService:
                 competitors.append(competitor)
                 
                 # Check if this is the domain we're analyzing
-                if domain and item.get('domain', '').lower() == domain.lower():
+                if target_domain and registrable_domain(item.get('domain')) == target_domain:
                     domain_position = i + 1
                     domain_score = total_score
             
@@ -554,6 +1509,7 @@ class SEOAPIService:
                 'rank': 0,
                 'top_competitors': []
             }
+    @traced()
     def calculate_pagespeed_score(self,pagespeed_data):
         """
         Calculate a comprehensive PageSpeed score from pagespeed audit data.
@@ -564,35 +1520,26 @@ class SEOAPIService:
         Returns:
         dict: Performance scores and analysis
         """
-        # Extract audits from the data
-        audits = pagespeed_data.get("audits", {})
-        
-        # Define metrics and their weights (based on Lighthouse v8)
-        metrics = {
-            "first-contentful-paint": {"weight": 0.10, "name": "First Contentful Paint"},
-            "largest-contentful-paint": {"weight": 0.25, "name": "Largest Contentful Paint"},
-            "speed-index": {"weight": 0.15, "name": "Speed Index"},
-            "total-blocking-time": {"weight": 0.30, "name": "Total Blocking Time"},
-            "interactive": {"weight": 0.10, "name": "Time to Interactive"},
-            "cumulative-layout-shift": {"weight": 0.10, "name": "Cumulative Layout Shift"}
-        }
-        
         # Calculate weighted score
         weighted_score = 0
         total_weight = 0
-        individual_scores = {}
-        
-        for metric_id, metric_info in metrics.items():
-            if metric_id in audits and audits[metric_id].get("score") is not None:
-                score = audits[metric_id]["score"]
-                weight = metric_info["weight"]
-                
-                weighted_score += score * weight
-                total_weight += weight
-                
-        
+
+        for metric_id, score in self.pagespeed_metric_scores(pagespeed_data).items():
+            weight = PAGESPEED_METRICS[metric_id]["weight"]
+            weighted_score += score * weight
+            total_weight += weight
+
         # Calculate overall score (0-100)
         return  (weighted_score / total_weight) * 100 if total_weight > 0 else 0
+
+    def pagespeed_metric_scores(self, pagespeed_data):
+        """Lighthouse score (0-1) of each metric in PAGESPEED_METRICS that the audits report"""
+        audits = pagespeed_data.get("audits", {}) or {}
+        return {
+            metric_id: audits[metric_id]["score"]
+            for metric_id in PAGESPEED_METRICS
+            if metric_id in audits and audits[metric_id].get("score") is not None
+        }
     
     
     def _calculate_rating_review_score(self, rating, review_count, items_count):
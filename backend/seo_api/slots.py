@@ -0,0 +1,182 @@
+# seo_api/slots.py
+import contextvars
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .deadlines import DeadlineExceeded, current_deadline, upstream_timeout
+
+
+DEFAULT_UPSTREAM_SLOTS = {
+    "CAPACITY": 30,              # Upstream calls in flight at once, per process
+    "INTERACTIVE_RESERVE": 10,   # Slots bulk work can never take
+    "TENANT_WEIGHTS": {},        # Fair-queuing weight per tenant (default 1)
+}
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+WorkTag = namedtuple("WorkTag", ["priority", "tenant"])
+
+_work_tag = contextvars.ContextVar("seo_work_tag", default=WorkTag(INTERACTIVE, "default"))
+
+
+def get_slots_config():
+    config = dict(DEFAULT_UPSTREAM_SLOTS)
+    config.update(getattr(settings, "SEO_UPSTREAM_SLOTS", {}))
+    return config
+
+
+def current_work_tag():
+    return _work_tag.get()
+
+
+@contextmanager
+def work_context(priority=INTERACTIVE, tenant="default"):
+    """
+    Tag the upstream calls made in this block (and in workers started with
+    submit_in_context) with a priority class and tenant.
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {priority}")
+    token = _work_tag.set(WorkTag(priority, str(tenant or "default")))
+    try:
+        yield
+    finally:
+        _work_tag.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("event", "granted", "cancelled")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.cancelled = False
+
+
+class SlotScheduler:
+    """
+    Hands out upstream call slots.
+
+    Interactive work is always dispatched before bulk work, and bulk work is
+    only admitted while more than INTERACTIVE_RESERVE slots are free, so a large import cannot
+    starve someone waiting on a page. Within a class, tenants share slots by
+    weighted fair queuing: each request gets a virtual finish time of
+    max(class virtual time, tenant's last finish) + 1 / weight and the
+    smallest finish time goes next.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_slots_config()
+        self.in_use = {priority: 0 for priority in PRIORITIES}
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self._queues = {priority: [] for priority in PRIORITIES}
+        self._virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        self._tenant_finish = {priority: {} for priority in PRIORITIES}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _has_room(self, priority):
+        capacity = self.config["CAPACITY"]
+        if sum(self.in_use.values()) >= capacity:
+            return False
+        if priority == BULK:
+            # The reserve must stay free, whoever holds the other slots
+            return sum(self.in_use.values()) < capacity - self.config["INTERACTIVE_RESERVE"]
+        return True
+
+    def _grant(self, priority):
+        self.in_use[priority] += 1
+        self.granted[priority] += 1
+
+    def _dispatch(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and self._has_room(priority):
+                finish, _, waiter = heapq.heappop(queue)
+                if waiter.cancelled:
+                    continue
+                self._virtual_time[priority] = finish
+                self._grant(priority)
+                waiter.granted = True
+                waiter.event.set()
+            # Waiters that gave up are dropped lazily
+            while queue and queue[0][2].cancelled:
+                heapq.heappop(queue)
+            if queue:
+                # Lower classes wait while a higher class is still queued
+                return
+
+    def _forget_idle_tenants(self, priority):
+        """Tenants whose last finish time has passed are back to the class virtual time anyway"""
+        finishes = self._tenant_finish[priority]
+        if len(finishes) > 1000:
+            virtual_time = self._virtual_time[priority]
+            for tenant in [t for t, finish in finishes.items() if finish <= virtual_time]:
+                del finishes[tenant]
+
+    def acquire(self, tag, timeout=None):
+        """Wait for a slot for `tag`; raises DeadlineExceeded if none frees up within `timeout` seconds"""
+        priority, tenant = tag
+        with self._lock:
+            queued_ahead = any(self._queues[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+            if not queued_ahead and self._has_room(priority):
+                self._grant(priority)
+                return
+
+            weight = self.config["TENANT_WEIGHTS"].get(tenant, 1.0)
+            start = max(self._virtual_time[priority], self._tenant_finish[priority].get(tenant, 0.0))
+            finish = start + 1.0 / weight
+            self._tenant_finish[priority][tenant] = finish
+            self._forget_idle_tenants(priority)
+            waiter = _Waiter()
+            heapq.heappush(self._queues[priority], (finish, next(self._sequence), waiter))
+            self._dispatch()
+
+        if waiter.event.wait(timeout):
+            return
+        with self._lock:
+            if waiter.granted:
+                return
+            waiter.cancelled = True
+        raise DeadlineExceeded("No upstream slot before the deadline")
+
+    def release(self, tag):
+        with self._lock:
+            self.in_use[tag.priority] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, tag=None):
+        """Hold an upstream slot for the current work tag, waiting at most until the current deadline"""
+        tag = tag or current_work_tag()
+        deadline = current_deadline()
+        self.acquire(tag, timeout=deadline.remaining() if deadline else upstream_timeout())
+        try:
+            yield
+        finally:
+            self.release(tag)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_slot_scheduler():
+    """Process-wide scheduler, so every service instance draws from the same capacity"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = SlotScheduler()
+    return _scheduler
+
+
+def upstream_slot():
+    return get_slot_scheduler().slot()
@@ -1,10 +1,49 @@
-from django.test import TestCase
+import gzip
+import io
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
 from unittest.mock import patch, MagicMock
-from .services import SEOAPIService
-from .views import SEOReportView
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APIRequestFactory
 from rest_framework import status
 
+from .admission import AdmissionController, AdmissionRejected, DEFAULT_ADMISSION
+from .competitors import competitors_of, rank_among_competitors, record_competitors
+from .crawls import SiteAudit, crawl_pages_file
+from .deadlines import Deadline, DeadlineExceeded, deadline_scope, submit_in_context
+from .domains import canonical_host, registrable_domain
+from .exports import export_queryset, iter_export
+from .geogrid import RateLimiter, build_grid, grid_summary
+from .hedging import DEFAULT_HEDGING, Hedger
+from .locations import get_locale_index, invalidate_locale_index, normalize_name, resolve_locale
+from .models import CompetitorObservation, DataForSEOLanguage, DataForSEOLocation, ReportSection, SEOReport, SEORequestLog, TrackedDomain
+from .planner import SECTIONS, plan_sections
+from .profiling import _start_tracing, _stop_tracing
+from .ranks import position_in, serp_position_index
+from .reports import json_patch, preferred_encoding, report_etag
+from .scheduler import RefreshScheduler, first_run_time, next_run_time
+from .services import SEOAPIService, UpstreamTaskError, followup_token, onpage_task_cache_key
+from .slots import SlotScheduler, WorkTag, current_work_tag, work_context
+from .timeseries import TimeSeriesStore
+from .tracing import SpanExporter, current_span, flatten_trace, get_span_exporter, load_trace, span
+from .views import SEOReportView, request_tenant
+
 class SEOAPIServiceTests(TestCase):
     def setUp(self):
         self.service = SEOAPIService()
@@ -113,3 +152,1589 @@ class SEOReportViewTests(TestCase):
         # Assert the response
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 # Create your tests here.
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        capture_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(capture_dir.cleanup)
+        self.capture_dir = capture_dir.name
+
+    def _profiling(self, **overrides):
+        config = {'SAMPLE_RATE': 0, 'TOKEN': 'secret', 'DIR': self.capture_dir, 'MAX_CAPTURES': 2}
+        config.update(overrides)
+        return override_settings(SEO_PROFILING=config)
+
+    @patch('seo_api.services.SEOAPIService.fetch_local_seo_data')
+    def test_requested_profile_is_captured_and_listed(self, mock_fetch):
+        mock_fetch.return_value = {'seo_score': 75}
+        with self._profiling():
+            response = self.client.get(
+                '/api/seo-report/?domain=example.com&profile=1', HTTP_X_PROFILE_TOKEN='secret'
+            )
+            self.assertIn('X-Profile-Id', response)
+
+            index = self.client.get('/api/profiles/', HTTP_X_PROFILE_TOKEN='secret')
+            self.assertEqual(index.status_code, status.HTTP_200_OK)
+            captures = index.json()['captures']
+            self.assertEqual(captures[0]['id'], response['X-Profile-Id'])
+            self.assertEqual(captures[0]['reason'], 'requested')
+
+    @patch('seo_api.services.SEOAPIService.fetch_local_seo_data')
+    def test_profile_flag_without_token_is_ignored(self, mock_fetch):
+        mock_fetch.return_value = {'seo_score': 75}
+        with self._profiling():
+            response = self.client.get('/api/seo-report/?domain=example.com&profile=1')
+            self.assertNotIn('X-Profile-Id', response)
+            self.assertEqual(self.client.get('/api/profiles/').status_code, status.HTTP_403_FORBIDDEN)
+
+    @patch('seo_api.services.SEOAPIService.fetch_local_seo_data')
+    def test_captures_are_rotated(self, mock_fetch):
+        mock_fetch.return_value = {'seo_score': 75}
+        with self._profiling(SAMPLE_RATE=1):
+            for _ in range(3):
+                self.client.get('/api/seo-report/?domain=example.com')
+        self.assertEqual(len([f for f in os.listdir(self.capture_dir) if f.endswith('.json')]), 2)
+
+    def test_overlapping_captures_share_one_tracing_session(self):
+        if tracemalloc.is_tracing():
+            self.skipTest('tracemalloc is already enabled for this process')
+        _start_tracing()
+        _start_tracing()
+        _stop_tracing()
+        self.assertTrue(tracemalloc.is_tracing())
+        _stop_tracing()
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+class KeywordVolumeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.service = SEOAPIService()
+
+    def _volume_response(self, keywords):
+        response = MagicMock()
+        response.raise_for_status.return_value = None
+        response.json.return_value = {'tasks': [{'status_code': 20000, 'result': [
+            {'keyword': keyword.lower(), 'search_volume': len(keyword)} for keyword in keywords
+        ]}]}
+        return response
+
+    @patch('seo_api.services.requests.post')
+    def test_only_missing_keywords_are_requested(self, mock_post):
+        mock_post.side_effect = lambda endpoint, auth, json, **kwargs: self._volume_response(json[0]['keywords'])
+
+        first = self.service._fetch_keyword_data('plumber, electrician', 'United States')
+        self.assertEqual([item['keyword'] for item in first], ['plumber', 'electrician'])
+        self.assertEqual(mock_post.call_count, 1)
+
+        second = self.service._fetch_keyword_data('roofer,Electrician, plumber', 'United States')
+        self.assertEqual([item['keyword'] for item in second], ['roofer', 'electrician', 'plumber'])
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(mock_post.call_args[1]['json'][0]['keywords'], ['roofer'])
+
+        self.service._fetch_keyword_data('plumber,roofer', 'United States')
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('seo_api.services.requests.post')
+    def test_large_keyword_lists_are_chunked(self, mock_post):
+        mock_post.side_effect = lambda endpoint, auth, json, **kwargs: self._volume_response(json[0]['keywords'])
+        keywords = [f'keyword {i}' for i in range(2500)]
+
+        result = self.service._fetch_keyword_data(','.join(keywords), 'United States')
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertTrue(all(len(call[1]['json'][0]['keywords']) <= 1000 for call in mock_post.call_args_list))
+        self.assertEqual([item['keyword'] for item in result], keywords)
+
+        # The whole list stays cached, so repeating it costs no upstream call
+        self.service._fetch_keyword_data(','.join(keywords), 'United States')
+        self.assertEqual(mock_post.call_count, 3)
+
+
+    @patch('seo_api.services.requests.post')
+    def test_failed_tasks_are_not_cached_as_missing_volume(self, mock_post):
+        failed = MagicMock()
+        failed.json.return_value = {'tasks': [{'status_code': 40501, 'status_message': 'Invalid Field.', 'result': None}]}
+        mock_post.return_value = failed
+
+        with self.assertRaises(UpstreamTaskError):
+            self.service._fetch_keyword_data('plumber, roofer', 'United States')
+
+        mock_post.return_value = None
+        mock_post.side_effect = lambda endpoint, auth, json, **kwargs: self._volume_response(json[0]['keywords'][:1])
+        result = self.service._fetch_keyword_data('plumber, roofer', 'United States')
+        self.assertEqual([item['keyword'] for item in result], ['plumber'])
+        self.assertEqual(mock_post.call_args[1]['json'][0]['keywords'], ['plumber', 'roofer'])
+
+        # Left out by a successful task: cached as having no volume
+        self.service._fetch_keyword_data('roofer', 'United States')
+        self.assertEqual(mock_post.call_count, 2)
+
+
+class LocaleIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for code, name, kind in [
+            (2840, 'United States', 'Country'),
+            (2826, 'United Kingdom', 'Country'),
+            (1023191, 'New York,New York,United States', 'City'),
+        ]:
+            DataForSEOLocation.objects.create(
+                location_code=code, location_name=name, normalized_name=normalize_name(name), location_type=kind
+            )
+        DataForSEOLanguage.objects.create(language_code='en', language_name='English', normalized_name='english')
+        invalidate_locale_index()
+
+    def test_prefix_and_fuzzy_lookup(self):
+        index = get_locale_index()
+        self.assertEqual([e['code'] for e in index.locations.prefix('united')], [2826, 2840])
+        self.assertEqual(index.locations.fuzzy('Untied States')[0]['code'], 2840)
+        self.assertEqual(index.languages.get('EN')['name'], 'English')
+
+    def test_payloads_use_codes(self):
+        fields = SEOAPIService()._locale_fields('united states', 'English')
+        self.assertEqual(fields, {'location_code': 2840, 'language_code': 'en'})
+
+    @patch('seo_api.services.SEOAPIService.fetch_local_seo_data')
+    def test_unknown_location_is_rejected_before_fetching(self, mock_fetch):
+        response = self.client.get('/api/seo-report/?domain=example.com&location=Untied States')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('United States', response.json()['location']['suggestions'])
+        mock_fetch.assert_not_called()
+
+        response = self.client.get('/api/competitors/?domain=example.com&location=Untied States')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/competitors/?domain=example.com&location=united states')
+        self.assertEqual(response.json()['location'], 'United States')
+
+    def test_a_sync_reaches_workers_that_do_not_share_the_cache(self):
+        self.assertIsNotNone(get_locale_index().locations.get('United Kingdom'))
+
+        # Another process re-synced without a location this one could see through the cache
+        DataForSEOLocation.objects.filter(location_code=2826).delete()
+        DataForSEOLocation.objects.create(location_code=2276, location_name='Germany', normalized_name='germany')
+        with patch('seo_api.locations.INDEX_CHECK_SECONDS', 0):
+            _, _, errors = resolve_locale('United Kingdom', 'English')
+        self.assertIn('location', errors)
+        self.assertIsNotNone(get_locale_index().locations.get('Germany'))
+
+    def test_autocomplete(self):
+        response = self.client.get('/api/locations/autocomplete/?q=new y')
+        self.assertEqual(response.json()['results'][0]['code'], 1023191)
+
+
+class SectionPlannerTests(TestCase):
+    def test_full_fidelity_fetches_every_section(self):
+        plan = plan_sections(config={'MIN_FIDELITY': 1.0, 'SECTIONS': {}})
+        self.assertEqual(plan.fetch, sorted(SECTIONS, key=SECTIONS.index))
+        self.assertEqual(plan.derived, {})
+
+    def test_maps_result_is_shared_when_fidelity_allows(self):
+        plan = plan_sections(config={'MIN_FIDELITY': 0.6, 'SECTIONS': {}})
+        self.assertIn('business_details', plan.fetch)
+        self.assertNotIn('gmb', plan.fetch)
+        self.assertNotIn('local_rankings', plan.fetch)
+        self.assertIn('competitors', plan.fetch)
+        self.assertEqual(plan.derived['gmb'].source, 'business_details')
+
+    def test_per_section_override(self):
+        plan = plan_sections(config={'MIN_FIDELITY': 0.6, 'SECTIONS': {'gmb': 1.0}})
+        self.assertIn('gmb', plan.fetch)
+        self.assertEqual(plan.derived['local_rankings'].source, 'business_details')
+
+    def test_derived_sections_skip_their_own_endpoint(self):
+        service = SEOAPIService()
+        maps = {'keyword': 'plumber', 'items': [
+            {'rank_absolute': 1, 'domain': 'example.com', 'title': 'Example', 'rating': {'value': 4.5}},
+        ]}
+        skipped = {name: MagicMock() for name in ('_fetch_gmb_data', '_fetch_local_rankings', '_fetch_competitor_data')}
+        with override_settings(SEO_SECTION_PLANNER={'MIN_FIDELITY': 0.4, 'SECTIONS': {}}), patch.multiple(
+            service,
+            _fetch_business_details=MagicMock(return_value=maps),
+            **skipped,
+            _fetch_keyword_data=MagicMock(return_value=[]),
+            _fetch_onpage_data=MagicMock(return_value={}),
+            _fetch_backlinks_data=MagicMock(return_value={}),
+            _fetch_pagespeed_data=MagicMock(return_value={}),
+        ):
+            report = service.fetch_local_seo_data('plumber', 'example.com', 'United States')
+
+        for mock in skipped.values():
+            mock.assert_not_called()
+        self.assertEqual(report['sections']['competitors']['source'], 'business_details')
+        self.assertEqual(report['competitors']['top_competitors'][0]['domain'], 'example.com')
+
+
+def mock_section_fetchers(**overrides):
+    """MagicMocks for every _fetch_* section method, keyed by method name"""
+    fetchers = {
+        '_fetch_gmb_data': MagicMock(return_value={'keyword': 'plumber', 'items': None}),
+        '_fetch_local_rankings': MagicMock(return_value={'items': None}),
+        '_fetch_business_details': MagicMock(return_value={'items': None}),
+        '_fetch_onpage_data': MagicMock(return_value={'onpage_score': 90}),
+        '_fetch_backlinks_data': MagicMock(return_value={}),
+        '_fetch_keyword_data': MagicMock(return_value=[]),
+        '_fetch_pagespeed_data': MagicMock(return_value={}),
+        '_fetch_competitor_data': MagicMock(return_value={}),
+    }
+    fetchers.update(overrides)
+    return fetchers
+
+
+class IncrementalRefreshTests(TestCase):
+    def setUp(self):
+        self.service = SEOAPIService()
+
+    def _fetch(self, fetchers, **kwargs):
+        with patch.multiple(self.service, **fetchers):
+            return self.service.fetch_local_seo_data('plumber', 'example.com', 'United States', **kwargs)
+
+    def test_fresh_sections_are_reused(self):
+        first = self._fetch(mock_section_fetchers())
+        self.assertFalse(first['sections']['pagespeed']['cached'])
+
+        fetchers = mock_section_fetchers()
+        second = self._fetch(fetchers)
+        for mock in fetchers.values():
+            mock.assert_not_called()
+        self.assertTrue(second['sections']['pagespeed']['cached'])
+        self.assertEqual(second['seo_score'], first['seo_score'])
+        self.assertEqual(second['website_analysis']['onpage_score'], 90)
+
+    def test_only_stale_sections_are_refetched(self):
+        self._fetch(mock_section_fetchers())
+        ReportSection.objects.filter(section='local_rankings').update(
+            fetched_at=ReportSection.objects.get(section='local_rankings').fetched_at - timedelta(days=2)
+        )
+
+        fetchers = mock_section_fetchers()
+        report = self._fetch(fetchers, refresh=['pagespeed'])
+
+        called = [name for name, mock in fetchers.items() if mock.called]
+        self.assertEqual(sorted(called), ['_fetch_local_rankings', '_fetch_pagespeed_data'])
+        self.assertFalse(report['sections']['local_rankings']['cached'])
+        self.assertTrue(report['sections']['keywords']['cached'])
+
+    def test_domain_sections_are_shared_across_keywords(self):
+        self._fetch(mock_section_fetchers())
+        fetchers = mock_section_fetchers()
+        with patch.multiple(self.service, **fetchers):
+            self.service.fetch_local_seo_data('electrician', 'example.com', 'United States')
+        fetchers['_fetch_pagespeed_data'].assert_not_called()
+        fetchers['_fetch_gmb_data'].assert_called_once()
+
+
+@patch('seo_api.scheduler.close_old_connections', MagicMock())
+class RefreshSchedulerTests(TestCase):
+    config = {'CONCURRENCY': 2, 'WINDOW_START_HOUR': 1, 'WINDOW_HOURS': 5,
+              'JITTER_SECONDS': 0, 'POLL_SECONDS': 0, 'BATCH_SIZE': 10}
+
+    def test_daily_runs_are_spread_across_the_window(self):
+        after = datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+        runs = [
+            next_run_time(TrackedDomain(pk=pk, website=f'site{pk}.com', cadence_hours=24), after, self.config)
+            for pk in range(1, 50)
+        ]
+        self.assertTrue(all(run.date().day == 2 and 1 <= run.hour <= 6 for run in runs))
+        self.assertGreater(len({run.hour for run in runs}), 3)
+
+    def test_new_domains_are_spread_over_their_first_interval(self):
+        for pk in range(1, 41):
+            TrackedDomain.objects.create(website=f'site{pk}.com', keywords='plumber', cadence_hours=6)
+        scheduler = RefreshScheduler(config=dict(self.config, BATCH_SIZE=50), service_factory=MagicMock)
+        now = timezone.now()
+
+        self.assertEqual(scheduler.claim_due(now), [])
+        runs = list(TrackedDomain.objects.values_list('next_run_at', flat=True))
+        self.assertTrue(all(now < run <= now + timedelta(hours=6) for run in runs))
+        self.assertGreater(len({(run - now) // timedelta(hours=1) for run in runs}), 3)
+
+    def test_new_daily_domains_wait_for_their_window_slot(self):
+        now = datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+        runs = [
+            first_run_time(TrackedDomain(pk=pk, website=f'site{pk}.com', cadence_hours=72), now, self.config)
+            for pk in range(1, 50)
+        ]
+        self.assertTrue(all(now < run <= now + timedelta(hours=72) and 1 <= run.hour <= 6 for run in runs))
+        self.assertGreater(len({run.date() for run in runs}), 1)
+
+    def test_due_domains_are_refreshed_once(self):
+        tracked = TrackedDomain.objects.create(
+            website='example.com', keywords='plumber', next_run_at=timezone.now(), cadence_hours=6
+        )
+        service = MagicMock()
+        service.fetch_local_seo_data.return_value = {'seo_score': 70}
+        scheduler = RefreshScheduler(config=self.config, service_factory=lambda: service)
+
+        claimed = scheduler.claim_due()
+        self.assertEqual([t.pk for t in claimed], [tracked.pk])
+        self.assertEqual(scheduler.claim_due(), [])
+
+        self.assertEqual(scheduler.refresh(claimed[0]), 'ok')
+        service.fetch_local_seo_data.assert_called_once_with('plumber', 'example.com', 'United States', 'English')
+        tracked.refresh_from_db()
+        self.assertEqual(tracked.last_status, 'ok')
+        self.assertGreater(tracked.next_run_at, timezone.now())
+
+
+class CompetitorIndexTests(TestCase):
+    def setUp(self):
+        record_competitors('example.com', 'United States', ['plumber'], competitor_data={'items': [
+            {'domain': 'rival.com', 'avg_position': 2, 'visibility': 0.5,
+             'keywords_positions': {'plumber': [2], 'plumber near me': [4]}},
+            {'domain': 'example.com', 'avg_position': 5, 'keywords_positions': {'plumber': [5]}},
+        ]})
+        record_competitors('other.com', 'United States', ['plumber near me'], maps_data={
+            'keyword': 'plumber near me',
+            'items': [{'domain': 'maps-rival.com', 'rank_absolute': 1, 'rating': {'value': 4.8}}],
+        })
+
+    def test_competitors_across_reports(self):
+        domains = [c['domain'] for c in competitors_of('example.com', 'united states')]
+        self.assertEqual(domains[0], 'rival.com')
+        self.assertIn('maps-rival.com', domains)
+        # Ranked on organic positions only: rival.com averages 3, example.com 5
+        self.assertEqual(rank_among_competitors('example.com', 'United States')['rank'], 2)
+        self.assertIsNone(rank_among_competitors('maps-rival.com', 'United States')['rank'])
+
+    def test_maps_results_are_recorded_per_keyword(self):
+        record_competitors('example.com', 'United States', ['plumber', 'drain repair'], maps_data={
+            'keyword': 'plumber, drain repair',
+            'items': [{'domain': 'maps-rival.com', 'rank_absolute': 2}],
+        })
+        self.assertEqual(
+            sorted(CompetitorObservation.objects.filter(subject_domain='example.com', source='maps')
+                   .values_list('keyword', flat=True)),
+            ['drain repair', 'plumber']
+        )
+
+    def test_top_domains_for_keyword(self):
+        response = self.client.get('/api/competitors/?keyword=plumber&location=United States')
+        self.assertEqual([d['domain'] for d in response.json()['top_domains']], ['rival.com', 'example.com'])
+
+    def test_observations_are_updated_in_place(self):
+        record_competitors('example.com', 'United States', ['plumber'], competitor_data={'items': [
+            {'domain': 'rival.com', 'keywords_positions': {'plumber': [1]}},
+        ]})
+        self.assertEqual(
+            CompetitorObservation.objects.get(subject_domain='example.com', keyword='plumber', domain='rival.com').position, 1
+        )
+
+
+class DomainMatchingTests(TestCase):
+    def test_canonicalization(self):
+        self.assertEqual(canonical_host('HTTPS://www.Example.com:443/contact?x=1'), 'example.com')
+        self.assertEqual(registrable_domain('shop.example.co.uk'), 'example.co.uk')
+        self.assertEqual(registrable_domain('blog.example.com'), 'example.com')
+        self.assertEqual(registrable_domain(None), '')
+
+    def test_business_details_match_ignores_lookalikes_and_none_fields(self):
+        service = SEOAPIService()
+        data = {'items': [
+            {'domain': None, 'url': None},
+            {'domain': 'idea.com', 'url': 'https://idea.com', 'is_claimed': True},
+        ]}
+        self.assertEqual(service.calculate_business_details_score(data, 'ea.com'), 0)
+
+        data['items'].append({'domain': 'www.ea.com', 'url': 'https://www.ea.com/', 'is_claimed': True})
+        self.assertGreater(service.calculate_business_details_score(data, 'https://ea.com'), 0)
+
+    def test_competitor_benchmark_matches_www_variants(self):
+        service = SEOAPIService()
+        result = service.calculate_competitor_benchmark_score({'items': [
+            {'domain': 'www.example.com', 'visibility': 1, 'avg_position': 1, 'keywords_count': 10},
+            {'domain': 'rival.com', 'visibility': 0.2, 'avg_position': 5},
+        ]}, 'https://example.com/')
+        self.assertEqual(result['rank'], 1)
+        self.assertEqual(result['score'], 100)
+
+
+class LatencyBudgetTests(TestCase):
+    def test_slow_and_failing_sections_do_not_sink_the_report(self):
+        service = SEOAPIService()
+
+        def hang(*args, **kwargs):
+            time.sleep(2)
+            return {}
+
+        fetchers = mock_section_fetchers(
+            _fetch_pagespeed_data=MagicMock(side_effect=hang),
+            _fetch_backlinks_data=MagicMock(side_effect=requests.exceptions.HTTPError('401')),
+        )
+        started = time.monotonic()
+        with patch.multiple(service, **fetchers):
+            report = service.fetch_local_seo_data('plumber', 'example.com', 'United States', budget_ms=300)
+        self.assertLess(time.monotonic() - started, 1.5)
+
+        self.assertEqual(report['sections']['pagespeed']['status'], 'timeout')
+        self.assertEqual(report['sections']['backlinks']['status'], 'error')
+        self.assertEqual(report['sections']['onpage']['status'], 'ok')
+        self.assertEqual(report['website_analysis']['onpage_score'], 90)
+        self.assertTrue(report['partial'])
+
+        # Sections that missed the deadline are not stored, so the next report retries them
+        fetchers = mock_section_fetchers()
+        with patch.multiple(service, **fetchers):
+            service.fetch_local_seo_data('plumber', 'example.com', 'United States')
+        fetchers['_fetch_pagespeed_data'].assert_called_once()
+        fetchers['_fetch_onpage_data'].assert_not_called()
+
+    @patch('seo_api.services.requests.post')
+    def test_upstream_calls_are_capped_by_the_deadline(self, mock_post):
+        mock_post.return_value.json.return_value = {'tasks': []}
+        with deadline_scope(Deadline(5000)):
+            SEOAPIService()._fetch_gmb_data('plumber', 'United States')
+        self.assertLessEqual(mock_post.call_args[1]['timeout'], 5)
+
+
+class RequestHedgingTests(TestCase):
+    def _hedger(self, **overrides):
+        config = dict(DEFAULT_HEDGING, ENABLED=True, MIN_SAMPLES=5, BUDGET_RATIO=0.5, BURST=2)
+        config.update(overrides)
+        hedger = Hedger(config)
+        for _ in range(10):
+            hedger.tracker.record('/maps/live', 0.01)
+        return hedger
+
+    def test_slow_call_is_hedged_and_fastest_response_wins(self):
+        calls = itertools.count()
+
+        def upstream():
+            if next(calls) == 0:
+                time.sleep(1)
+                return 'slow'
+            return 'fast'
+
+        hedger = self._hedger()
+        hedger.budget.earn('/maps/live')
+        hedger.budget.earn('/maps/live')
+        started = time.monotonic()
+        self.assertEqual(hedger.call('/maps/live', upstream), 'fast')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(hedger.hedges_sent['/maps/live'], 1)
+
+    def test_hedges_are_capped_by_budget(self):
+        def upstream():
+            time.sleep(0.05)
+            return 'ok'
+
+        hedger = self._hedger(BUDGET_RATIO=0.25)
+        for _ in range(8):
+            hedger.call('/maps/live', upstream)
+        self.assertLessEqual(hedger.hedges_sent['/maps/live'], 2)
+
+    def test_timeouts_count_towards_the_percentile_but_fast_failures_do_not(self):
+        def timed_out():
+            time.sleep(0.2)
+            raise requests.exceptions.Timeout("read timed out")
+
+        def refused():
+            raise requests.exceptions.ConnectionError("connection refused")
+
+        hedger = self._hedger(BUDGET_RATIO=0)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            hedger.call('/maps/live', refused)
+        self.assertEqual(len(hedger.tracker._samples['/maps/live']), 10)
+        with self.assertRaises(requests.exceptions.Timeout):
+            hedger.call('/maps/live', timed_out)
+        self.assertGreaterEqual(hedger.tracker.percentile('/maps/live', 100), 0.2)
+
+    def test_waits_are_bounded_by_the_deadline(self):
+        hedger = self._hedger(BUDGET_RATIO=0)
+
+        started = time.monotonic()
+        with deadline_scope(Deadline(200)), self.assertRaises(DeadlineExceeded):
+            hedger.call('/maps/live', lambda: time.sleep(1))
+        self.assertLess(time.monotonic() - started, 0.8)
+
+    def test_disabled_hedger_calls_through(self):
+        hedger = self._hedger(ENABLED=False)
+        self.assertEqual(hedger.call('/maps/live', lambda: 'ok'), 'ok')
+        self.assertEqual(hedger.hedges_sent, {})
+
+
+class ConditionalReportTests(TestCase):
+    url = '/api/seo-report/?domain=example.com&keywords=plumber'
+
+    def test_etag_round_trip(self):
+        with patch.multiple('seo_api.services.SEOAPIService', **mock_section_fetchers()):
+            first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        etag = first['ETag']
+        self.assertIn('max-age=', first['Cache-Control'])
+
+        fetchers = mock_section_fetchers()
+        with patch.multiple('seo_api.services.SEOAPIService', **fetchers):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            cached = self.client.get(self.url)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(cached.json()['seo_score'], first.json()['seo_score'])
+        self.assertEqual(cached['ETag'], etag)
+        for mock in fetchers.values():
+            mock.assert_not_called()
+
+    def test_unchanged_content_keeps_its_etag_after_refresh(self):
+        with patch.multiple('seo_api.services.SEOAPIService', **mock_section_fetchers()):
+            first = self.client.get(self.url)
+            refreshed = self.client.get(self.url + '&refresh=all', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(refreshed.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_content_hash_ignores_section_metadata(self):
+        a = {'seo_score': 70, 'sections': {'gmb': {'cached': True}}}
+        b = {'sections': {'gmb': {'cached': False}}, 'seo_score': 70}
+        self.assertEqual(report_etag(a), report_etag(b))
+        self.assertNotEqual(report_etag(a), report_etag({'seo_score': 71}))
+        # The bytes served differ in the left-out metadata, so the ETag is weak
+        self.assertTrue(report_etag(a).startswith('W/"'))
+
+
+class ComparisonTests(TestCase):
+    def test_keyword_sections_are_fetched_once(self):
+        fetchers = mock_section_fetchers(_fetch_competitor_data=MagicMock(return_value={'items': [
+            {'domain': 'rival.com', 'visibility': 1, 'avg_position': 1, 'keywords_count': 10},
+            {'domain': 'example.com', 'visibility': 0.5, 'avg_position': 3, 'keywords_count': 5},
+        ]}))
+        with patch.multiple('seo_api.services.SEOAPIService', **fetchers):
+            response = self.client.get(
+                '/api/seo-compare/?keywords=plumber&domains=example.com,https://www.rival.com/,other.com,rival.com'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        domains = response.json()['domains']
+        self.assertEqual([d['domain'] for d in domains], ['example.com', 'rival.com', 'other.com'])
+        self.assertEqual(domains[1]['scores']['competitor_rank'], 1)
+        self.assertGreater(domains[1]['scores']['competitor_benchmark'], domains[0]['scores']['competitor_benchmark'])
+        for name in ('_fetch_gmb_data', '_fetch_local_rankings', '_fetch_business_details',
+                     '_fetch_keyword_data', '_fetch_competitor_data'):
+            self.assertEqual(fetchers[name].call_count, 1, name)
+        self.assertEqual(fetchers['_fetch_pagespeed_data'].call_count, 3)
+
+    def test_shared_and_per_domain_sections_are_fetched_concurrently(self):
+        # Passes only if the maps call and both pagespeed calls are in flight together
+        barrier = threading.Barrier(3, timeout=2)
+
+        def meet(*args):
+            barrier.wait()
+            return {}
+
+        fetchers = mock_section_fetchers(
+            _fetch_gmb_data=MagicMock(side_effect=meet),
+            _fetch_pagespeed_data=MagicMock(side_effect=meet),
+        )
+        with patch.multiple('seo_api.services.SEOAPIService', **fetchers):
+            comparison = SEOAPIService().fetch_comparison('plumber', ['example.com', 'rival.com'], 'United States')
+        self.assertEqual(comparison['shared_sections']['gmb']['status'], 'ok')
+        self.assertEqual([d['sections']['pagespeed']['status'] for d in comparison['domains']], ['ok', 'ok'])
+
+    def test_requires_two_domains(self):
+        response = self.client.get('/api/seo-compare/?keywords=plumber&domains=example.com,www.example.com')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+_local_storage_override = None
+
+
+def setUpModule():
+    # Reports generated by any test append to the metric history, the trace log and crawl storage; keep them out of the project
+    global _local_storage_override
+    _local_storage_override = override_settings(
+        SEO_TIMESERIES_DIR=tempfile.mkdtemp(),
+        SEO_TRACING={'SAMPLE_RATE': 1.0, 'DIR': tempfile.mkdtemp()},
+        SEO_SITE_CRAWL={'DIR': tempfile.mkdtemp()},
+    )
+    _local_storage_override.enable()
+
+
+def tearDownModule():
+    paths = [settings.SEO_TIMESERIES_DIR, settings.SEO_TRACING['DIR'], settings.SEO_SITE_CRAWL['DIR']]
+    _local_storage_override.disable()
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class MetricHistoryTests(TestCase):
+    def setUp(self):
+        store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(store_dir.cleanup)
+        self.store = TimeSeriesStore(store_dir.name)
+
+    def test_range_read_and_downsampling(self):
+        day = 24 * 60 * 60
+        for i in range(3 * 365):
+            self.store.append('https://www.example.com/', {'seo_score': i}, timestamp=i * day)
+
+        window = self.store.read('example.com', 'seo_score', start=10 * day, end=12 * day)
+        self.assertEqual(window, [[10 * day, 10.0], [11 * day, 11.0], [12 * day, 12.0]])
+
+        series = self.store.read('example.com', 'seo_score', points=10)
+        self.assertEqual(len(series), 10)
+        self.assertLess(series[0][1], series[-1][1])
+        self.assertAlmostEqual(sum(v for _, v in series) / 10, (3 * 365 - 1) / 2, delta=5)
+
+    def test_out_of_order_points_are_skipped(self):
+        self.assertEqual(self.store.append('example.com', {'authority': 50, 'local_rank': None}, timestamp=100), 1)
+        self.assertEqual(self.store.append('example.com', {'authority': 40}, timestamp=50), 0)
+        self.assertEqual(self.store.read('example.com', 'authority'), [[100, 50.0]])
+        self.assertEqual(self.store.metrics('example.com'), ['authority'])
+
+    def test_reports_feed_the_history_endpoint(self):
+        pagespeed = {'audits': {'speed-index': {'score': 0.5}, 'interactive': {'score': 1}}}
+        local_rankings = {'items': [
+            {'domain': 'rival.com', 'rank_absolute': 1},
+            {'url': 'https://www.example.com/', 'rank_absolute': 2},
+        ]}
+        fetchers = mock_section_fetchers(
+            _fetch_pagespeed_data=MagicMock(return_value=pagespeed),
+            _fetch_local_rankings=MagicMock(return_value=local_rankings),
+        )
+        with patch.multiple('seo_api.services.SEOAPIService', **fetchers):
+            SEOAPIService().fetch_local_seo_data('plumber', 'example.com', 'United States')
+
+        self.assertIn('lighthouse.speed-index', TimeSeriesStore().metrics('example.com'))
+        response = self.client.get('/api/history/?domain=www.example.com&metric=local_rank&start=2000-01-01')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([v for _, v in response.json()['points']], [2.0])
+
+        response = self.client.get('/api/history/?domain=example.com&metric=seo_score&start=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/history/?domain=example.com&metric=seo_score&start=inf')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cached_sections_are_not_recorded_again(self):
+        local_rankings = {'items': [{'domain': 'cached-example.com', 'rank_absolute': 2}]}
+        fetchers = mock_section_fetchers(_fetch_local_rankings=MagicMock(return_value=local_rankings))
+        with patch.multiple('seo_api.services.SEOAPIService', **fetchers):
+            SEOAPIService().fetch_local_seo_data('plumber', 'cached-example.com', 'United States')
+            SEOAPIService().fetch_local_seo_data('plumber', 'cached-example.com', 'United States', refresh=['backlinks'])
+
+        store = TimeSeriesStore()
+        self.assertEqual(len(store.read('cached-example.com', 'seo_score')), 2)
+        self.assertEqual(len(store.read('cached-example.com', 'local_rank')), 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            SEORequestLog.objects.create(domain=f'site{i}.com', response_status=200, seo_score=i * 10)
+        SEOReport.objects.create(
+            report_key='a' * 40, business_name='plumber', website='example.com', location='United States',
+            language='English', data={'seo_score': 70, 'keywords': {'top_keywords': []}},
+            seo_score=70, generated_at=timezone.now(),
+        )
+
+    def test_rows_are_streamed_in_chunks(self):
+        chunks = list(iter_export('logs', 'csv', chunk_size=2))
+        self.assertEqual(len(chunks), 3)
+        lines = ''.join(chunks).splitlines()
+        self.assertEqual(lines[0], 'id,domain,request_time,response_status,seo_score')
+        self.assertEqual(len(lines), 6)
+
+    def get(self, url):
+        with self.settings(SEO_PROFILING={'TOKEN': 'secret'}):
+            return self.client.get(url, HTTP_X_PROFILE_TOKEN='secret')
+
+    def test_ndjson_report_export(self):
+        response = self.get('/api/export/reports.ndjson?domain=https://www.example.com/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['data']['seo_score'], 70)
+
+    def test_gzip_export(self):
+        response = self.get('/api/export/logs.csv?gzip=1&domain=site3.com')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('logs.csv.gz', response['Content-Disposition'])
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('site3.com', lines[1])
+
+    def test_unknown_export(self):
+        self.assertEqual(self.get('/api/export/users.csv').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.get('/api/export/logs.xml').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_exports_require_a_token(self):
+        with self.settings(SEO_PROFILING={'TOKEN': 'secret'}):
+            self.assertEqual(self.client.get('/api/export/logs.csv').status_code, status.HTTP_403_FORBIDDEN)
+            self.assertEqual(
+                self.client.get('/api/export/logs.csv', HTTP_X_PROFILE_TOKEN='wrong').status_code,
+                status.HTTP_403_FORBIDDEN
+            )
+
+    def test_domain_filter_matches_the_exact_host(self):
+        SEORequestLog.objects.create(domain='idea.com', response_status=200)
+        SEORequestLog.objects.create(domain='https://www.ea.com/contact', response_status=200)
+        self.assertEqual(
+            list(export_queryset('logs', domain='ea.com').values_list('domain', flat=True)),
+            ['https://www.ea.com/contact']
+        )
+        self.assertEqual(export_queryset('logs', domain='ite3.com').count(), 0)
+
+    def test_management_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, 'reports.ndjson.gz')
+            call_command('export_seo_data', 'reports', '--format', 'ndjson', '--gzip', '--output', path, stderr=MagicMock())
+            with gzip.open(path, 'rt') as f:
+                self.assertIn('"website":"example.com"', f.read())
+
+    def test_management_command_writes_to_its_stdout(self):
+        out = io.StringIO()
+        call_command('export_seo_data', 'logs', '--chunk-size', '2', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 6)
+        with self.assertRaises(CommandError):
+            call_command('export_seo_data', 'logs', '--chunk-size', '0', stdout=out)
+        with self.assertRaises(CommandError):
+            call_command('export_seo_data', 'logs', '--since', '2024-02-30T00:00', stdout=out)
+
+    def test_impossible_dates_are_rejected(self):
+        response = self.get('/api/export/logs.csv?since=2024-02-30T00:00')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OnPagePipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _summary(self, progress):
+        response = MagicMock()
+        response.json.return_value = {'tasks': [
+            {'status_code': 20000, 'result': [{'crawl_progress': progress, 'onpage_score': 88}]}
+        ]}
+        return response
+
+    def _task_post(self):
+        response = MagicMock()
+        response.json.return_value = {'tasks': [{'id': 'task-1'}]}
+        return response
+
+    @patch('seo_api.services.sleep_within_deadline')
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_summary_is_polled_until_the_crawl_finishes(self, mock_post, mock_get, mock_sleep):
+        mock_post.return_value = self._task_post()
+        mock_get.side_effect = [self._summary('in_progress'), self._summary('finished')]
+
+        result = SEOAPIService()._fetch_onpage_data('example.com')
+
+        self.assertEqual(result['onpage_score'], 88)
+        self.assertEqual(mock_get.call_count, 2)
+        mock_sleep.assert_called_once()
+
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_unfinished_crawl_returns_a_followup_token(self, mock_post, mock_get):
+        mock_post.return_value = self._task_post()
+        mock_get.return_value = self._summary('in_progress')
+        fetchers = mock_section_fetchers()
+        del fetchers['_fetch_onpage_data']
+        url = '/api/seo-report/?keywords=plumber&domain=example.com'
+
+        with patch.multiple('seo_api.services.SEOAPIService', **fetchers):
+            first = self.client.get(url + '&budget_ms=1500').json()
+            self.assertEqual(first['sections']['onpage']['status'], 'pending')
+            self.assertTrue(first['partial'])
+
+            mock_get.return_value = self._summary('finished')
+            second = self.client.get(url + '&followup=' + first['followup']).json()
+
+        mock_post.assert_called_once()
+        self.assertEqual(second['sections']['onpage']['status'], 'ok')
+        self.assertEqual(second['website_analysis']['onpage_score'], 88)
+        self.assertNotIn('followup', second)
+
+    @patch('seo_api.services.requests.post')
+    def test_failed_submit_is_not_stored_as_an_empty_crawl(self, mock_post):
+        fetchers = mock_section_fetchers()
+        del fetchers['_fetch_onpage_data']
+        url = '/api/seo-report/?keywords=plumber&domain=example.com'
+
+        for error, section_status in ((requests.exceptions.Timeout('slow'), 'timeout'),
+                                      (requests.exceptions.ConnectionError('down'), 'error')):
+            mock_post.side_effect = error
+            with patch.multiple('seo_api.services.SEOAPIService', **fetchers):
+                report = self.client.get(url + '&refresh=onpage').json()
+            self.assertEqual(report['sections']['onpage']['status'], section_status)
+            self.assertFalse(ReportSection.objects.filter(section='onpage').exists())
+
+    def test_followup_token_is_checked(self):
+        url = '/api/seo-report/?keywords=plumber&domain=example.com&followup='
+        self.assertEqual(self.client.get(url + 'forged').status_code, status.HTTP_400_BAD_REQUEST)
+        token = followup_token('other.com', {'onpage': 'task-1'})
+        self.assertEqual(self.client.get(url + token).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class GeoGridTests(TestCase):
+    url = '/api/geo-grid/?keywords=plumber&domain=example.com&size=3&lat=40&lng=-74&budget_ms=1000'
+
+    def setUp(self):
+        cache.clear()
+
+    def _scan(self, status_codes):
+        """Scan a 3x3 grid whose points answer task_get with status_codes[(row, col)] (default 20000)"""
+
+        def task_post(url, auth=None, json=None, timeout=None):
+            response = MagicMock()
+            response.json.return_value = {'tasks': [
+                {'id': f"task-{task['tag']}", 'status_code': 20100, 'data': {'tag': task['tag']}} for task in json
+            ]}
+            return response
+
+        def task_get(url, auth=None, timeout=None):
+            row, col = map(int, url.rsplit('task-', 1)[1].split(','))
+            code = status_codes.get((row, col), 20000)
+            response = MagicMock()
+            response.json.return_value = {'tasks': [
+                {'status_code': code, 'status_message': 'Task failed.', 'result': [{'items': []}]}
+            ]}
+            return response
+
+        with patch('seo_api.services.get_rate_limiter', return_value=RateLimiter(10 ** 9)), \
+                patch('seo_api.services.requests.post', side_effect=task_post) as mock_post, \
+                patch('seo_api.services.requests.get', side_effect=task_get) as mock_get:
+            grid = self.client.get(self.url).json()
+        return grid, mock_post, mock_get
+
+    def test_failed_points_are_errors_not_polled_until_the_deadline(self):
+        grid, _, mock_get = self._scan({(0, 0): 40501})
+        self.assertEqual(grid['errors'], [{'point': [0, 0], 'error': '40501 Task failed.'}])
+        self.assertEqual(grid['pending'], [])
+        self.assertEqual(mock_get.call_count, 9)
+
+    @patch('seo_api.services.sleep_within_deadline')
+    def test_rescans_collect_posted_points_instead_of_posting_them_again(self, mock_sleep):
+        grid, mock_post, _ = self._scan({(1, 1): 40602})
+        self.assertEqual(grid['pending'], [[1, 1]])
+        self.assertEqual(len(mock_post.call_args.kwargs['json']), 9)
+
+        grid, mock_post, _ = self._scan({})
+        self.assertEqual(grid['pending'], [])
+        mock_post.assert_not_called()
+
+    def test_grid_is_centred_on_the_business(self):
+        points = build_grid(40.0, -74.0, 7, 1.0)
+        self.assertEqual(len(points), 49)
+        self.assertEqual(points[24], (3, 3, 40.0, -74.0))
+        # Row 0 is north, column 0 is west, about 3 km from the centre
+        self.assertAlmostEqual((points[0][2] - 40.0) * 111.32, 3.0, places=3)
+        self.assertLess(points[0][3], -74.0)
+
+    def test_summary_scores(self):
+        summary = grid_summary([[1, 2], [None, 5]], depth=20, pending=[(1, 1)])
+        self.assertEqual(summary['average_rank'], 1.5)
+        self.assertEqual(summary['average_total_rank'], round((1 + 2 + 21) / 3, 2))
+        self.assertEqual(summary['top3_share'], round(2 / 3, 3))
+        self.assertEqual(summary['found_share'], round(2 / 3, 3))
+
+    def test_scan_packs_points_and_builds_the_heatmap(self):
+        def task_post(url, auth=None, json=None, timeout=None):
+            response = MagicMock()
+            response.json.return_value = {'tasks': [
+                {'id': f"task-{task['tag']}", 'data': {'tag': task['tag']}} for task in json
+            ]}
+            return response
+
+        def task_get(url, auth=None, timeout=None):
+            row, col = map(int, url.rsplit('task-', 1)[1].split(','))
+            response = MagicMock()
+            if (row, col) == (4, 4):
+                response.json.return_value = {'tasks': [{'status_code': 40602}]}
+                return response
+            items = [{'domain': 'rival.com', 'rank_group': 1}]
+            if col:
+                items.append({'url': 'https://www.example.com/', 'rank_group': row + 2})
+            response.json.return_value = {'tasks': [{'status_code': 20000, 'result': [{'items': items}]}]}
+            return response
+
+        with patch('seo_api.services.get_rate_limiter', return_value=RateLimiter(10 ** 9)), \
+                patch('seo_api.services.requests.post', side_effect=task_post) as mock_post, \
+                patch('seo_api.services.requests.get', side_effect=task_get), \
+                self.settings(SEO_GEOGRID={'TASKS_PER_POST': 10}):
+            response = self.client.get(
+                '/api/geo-grid/?keywords=plumber&domain=example.com&size=5&lat=40&lng=-74&budget_ms=1500'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        grid = response.json()
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(len(mock_post.call_args_list[0].kwargs['json']), 10)
+        self.assertEqual(grid['matrix'][0], [None, 2, 2, 2, 2])
+        self.assertEqual(grid['matrix'][3][1], 5)
+        self.assertEqual(grid['pending'], [[4, 4]])
+        self.assertEqual(grid['summary']['found_share'], round(19 / 24, 3))
+
+    def test_rejects_unsupported_sizes(self):
+        response = self.client.get('/api/geo-grid/?keywords=plumber&domain=example.com&size=8&lat=1&lng=1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TracingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_trace_context_follows_work_into_threads(self):
+        def work():
+            with span('worker') as child:
+                return child.trace_id, child.parent_id
+
+        with span('root', root=True) as root:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                trace_id, parent_id = submit_in_context(executor, work).result()
+        self.assertEqual((trace_id, parent_id), (root.trace_id, root.span_id))
+        self.assertIsNone(current_span())
+
+        trace = load_trace(root.trace_id)
+        self.assertEqual(trace['roots'][0]['children'][0]['name'], 'worker')
+
+    def test_spans_are_written_off_the_request_thread(self):
+        writers = []
+        write = SpanExporter._write
+
+        def record(exporter, spans):
+            writers.append(threading.current_thread().name)
+            write(exporter, spans)
+
+        get_span_exporter().flush()
+        with patch.object(SpanExporter, '_write', record):
+            with span('root', root=True):
+                pass
+            get_span_exporter().flush()
+        self.assertEqual(writers, ['span-exporter'])
+
+    def test_spans_outside_a_trace_are_not_recorded(self):
+        with span('orphan') as orphan:
+            self.assertIsNone(orphan)
+
+    @patch('seo_api.services.requests.post')
+    def test_upstream_calls_record_endpoint_and_payload_size(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=200)
+        with span('root', root=True) as root:
+            SEOAPIService()._post('https://api.dataforseo.com/v3/serp/google/maps/live/advanced', [{'keyword': 'x'}])
+
+        post = load_trace(root.trace_id)['roots'][0]['children'][0]
+        self.assertEqual(post['attributes']['endpoint'], '/serp/google/maps/live/advanced')
+        self.assertEqual(post['attributes']['payload_bytes'], len('[{"keyword": "x"}]'))
+        self.assertEqual(post['attributes']['attempts'], 1)
+
+    def test_report_request_produces_a_span_tree(self):
+        with patch.multiple('seo_api.services.SEOAPIService', **mock_section_fetchers()):
+            response = self.client.get('/api/seo-report/?keywords=plumber&domain=example.com')
+
+        trace = load_trace(response['X-Trace-Id'])
+        names = [span['name'] for span, _ in flatten_trace(trace)]
+        self.assertEqual(names[0], 'SEOReportView.get')
+        self.assertIn('SEOAPIService.fetch_local_seo_data', names)
+        self.assertIn('section:pagespeed', names)
+        self.assertIn('SEOAPIService.calculate_competitor_benchmark_score', names)
+        section = next(span for span, _ in flatten_trace(trace) if span['name'] == 'section:pagespeed')
+        self.assertNotEqual(section['thread'], trace['roots'][0]['thread'])
+
+        with self.settings(SEO_PROFILING={'TOKEN': 'secret'}):
+            url = f"/api/traces/{response['X-Trace-Id']}/waterfall/"
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+            waterfall = self.client.get(url, HTTP_X_PROFILE_TOKEN='secret')
+            self.assertEqual(waterfall.status_code, status.HTTP_200_OK)
+            self.assertContains(waterfall, 'section:pagespeed')
+            traces = self.client.get('/api/traces/', HTTP_X_PROFILE_TOKEN='secret').json()['traces']
+            self.assertEqual(traces[0]['trace_id'], response['X-Trace-Id'])
+
+
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _controller(self, **config):
+        return AdmissionController({**DEFAULT_ADMISSION, **config})
+
+    def test_requests_over_the_queue_are_rejected(self):
+        controller = self._controller(MAX_CONCURRENT=1, MAX_QUEUE=0)
+        with controller.admit():
+            with self.assertRaises(AdmissionRejected) as rejected:
+                with controller.admit():
+                    pass
+        self.assertEqual(rejected.exception.retry_after, 5)
+        with controller.admit() as waited_ms:
+            self.assertLess(waited_ms, 100)
+
+    def test_queued_request_gets_the_freed_slot(self):
+        controller = self._controller(MAX_CONCURRENT=1, MAX_QUEUE=1, QUEUE_TIMEOUT_MS=2000)
+        release = threading.Event()
+
+        def hold():
+            with controller.admit():
+                release.wait()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        while controller.active == 0:
+            pass
+        threading.Timer(0.05, release.set).start()
+        with controller.admit() as waited_ms:
+            self.assertGreater(waited_ms, 0)
+        holder.join()
+
+        controller.config['QUEUE_TIMEOUT_MS'] = 10
+        with controller.admit():
+            with self.assertRaises(AdmissionRejected):
+                with controller.admit():
+                    pass
+
+    def test_overloaded_report_view_sheds_load(self):
+        url = '/api/seo-report/?keywords=plumber&domain=example.com'
+        full = self._controller(MAX_CONCURRENT=0, MAX_QUEUE=0)
+
+        with patch('seo_api.views.get_admission_controller', return_value=full):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response['Retry-After'], '5')
+
+            with patch.multiple('seo_api.services.SEOAPIService', **mock_section_fetchers()):
+                with patch('seo_api.views.get_admission_controller', return_value=self._controller()):
+                    generated = self.client.get(url)
+            # A fresh stored report never waits for admission
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+            SEOReport.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+            stale = self.client.get(url)
+            self.assertEqual(stale.status_code, status.HTTP_200_OK)
+            self.assertIn('Stale', stale['Warning'])
+            self.assertEqual(stale.json()['seo_score'], generated.json()['seo_score'])
+        self.assertEqual(full.rejected, 2)
+
+
+class UpstreamSlotTests(TestCase):
+    def _scheduler(self, capacity, reserve=0, weights=None):
+        return SlotScheduler({'CAPACITY': capacity, 'INTERACTIVE_RESERVE': reserve, 'TENANT_WEIGHTS': weights or {}})
+
+    def _queue(self, scheduler, tag, granted):
+        """Start a thread that waits for a slot, records its tag and releases it at once"""
+        tag = WorkTag(*tag)
+        queued = sum(len(q) for q in scheduler._queues.values())
+
+        def run():
+            scheduler.acquire(tag, timeout=5)
+            granted.append(tag)
+            scheduler.release(tag)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        while sum(len(q) for q in scheduler._queues.values()) == queued:
+            pass
+        return thread
+
+    def test_bulk_never_takes_the_interactive_reserve(self):
+        scheduler = self._scheduler(capacity=2, reserve=1)
+        scheduler.acquire(WorkTag('bulk', 'import'))
+        with self.assertRaises(DeadlineExceeded):
+            scheduler.acquire(WorkTag('bulk', 'import'), timeout=0.01)
+        scheduler.acquire(WorkTag('interactive', 'user'), timeout=0.01)
+        self.assertEqual(scheduler.in_use, {'interactive': 1, 'bulk': 1})
+
+    def test_bulk_leaves_the_reserve_free_under_interactive_load(self):
+        scheduler = self._scheduler(capacity=30, reserve=10)
+        for _ in range(25):
+            scheduler.acquire(WorkTag('interactive', 'user'))
+        with self.assertRaises(DeadlineExceeded):
+            scheduler.acquire(WorkTag('bulk', 'import'), timeout=0.01)
+        self.assertEqual(scheduler.in_use['bulk'], 0)
+
+    def test_slot_wait_is_not_counted_as_upstream_latency(self):
+        @contextmanager
+        def slow_slot():
+            time.sleep(0.05)
+            yield
+
+        hedger = Hedger({'ENABLED': True, 'PERCENTILE': 90, 'MIN_SAMPLES': 1, 'WINDOW': 10,
+                         'BUDGET_RATIO': 1, 'BURST': 5, 'MAX_WORKERS': 2})
+        for _ in range(3):
+            hedger.call('/maps/live', lambda: 'ok', slot=slow_slot)
+        self.assertLess(hedger.tracker.percentile('/maps/live', 100), 0.04)
+        self.assertEqual(hedger.hedges_sent['/maps/live'], 0)
+
+    def test_saturated_hedger_gives_up_at_the_deadline(self):
+        hedger = Hedger({'ENABLED': True, 'PERCENTILE': 90, 'MIN_SAMPLES': 1, 'WINDOW': 10,
+                         'BUDGET_RATIO': 1, 'BURST': 5, 'MAX_WORKERS': 1})
+        hedger.tracker.record('/maps/live', 0.01)
+        release = threading.Event()
+        hedger.executor.submit(release.wait, 5)
+
+        started = time.monotonic()
+        with deadline_scope(Deadline(200)), self.assertRaises(DeadlineExceeded):
+            hedger.call('/maps/live', lambda: 'ok')
+        release.set()
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_interactive_waiters_go_first(self):
+        scheduler = self._scheduler(capacity=1)
+        holder = WorkTag('bulk', 'import')
+        scheduler.acquire(holder)
+        granted = []
+        threads = [
+            self._queue(scheduler, ('bulk', 'import'), granted),
+            self._queue(scheduler, ('interactive', 'user'), granted),
+        ]
+        scheduler.release(holder)
+        for thread in threads:
+            thread.join()
+        self.assertEqual([tag.priority for tag in granted], ['interactive', 'bulk'])
+
+    def test_tenants_share_a_class_by_weight(self):
+        scheduler = self._scheduler(capacity=1, weights={'big': 2})
+        holder = WorkTag('interactive', 'x')
+        scheduler.acquire(holder)
+        granted = []
+        threads = [self._queue(scheduler, ('interactive', 'small'), granted) for _ in range(4)]
+        threads += [self._queue(scheduler, ('interactive', 'big'), granted) for _ in range(4)]
+        scheduler.release(holder)
+        for thread in threads:
+            thread.join()
+        # big (weight 2) finishes its 4 requests by virtual time 2, small needs 4
+        self.assertEqual(
+            [tag.tenant for tag in granted],
+            ['big', 'small', 'big', 'big', 'small', 'big', 'small', 'small']
+        )
+
+    def test_work_tag_follows_work_into_threads(self):
+        with work_context(priority='bulk', tenant='acme'):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                tag = submit_in_context(executor, current_work_tag).result()
+        self.assertEqual(tuple(tag), ('bulk', 'acme'))
+        self.assertEqual(current_work_tag().priority, 'interactive')
+
+
+    def test_tenant_header_is_only_taken_from_privileged_callers(self):
+        def tenant(**headers):
+            request = RequestFactory().get('/api/seo-report/', REMOTE_ADDR='203.0.113.7', **headers)
+            request.user = AnonymousUser()
+            return request_tenant(request)
+
+        with self.settings(SEO_PROFILING={'TOKEN': 'secret'}):
+            self.assertEqual(tenant(HTTP_X_TENANT='acme'), '203.0.113.7')
+            self.assertEqual(tenant(HTTP_X_TENANT='acme', HTTP_X_PROFILE_TOKEN='secret'), 'acme')
+
+
+class EncodedReportCacheTests(TestCase):
+    url = '/api/seo-report/?keywords=plumber&domain=example.com'
+
+    def setUp(self):
+        cache.clear()
+        with patch.multiple('seo_api.services.SEOAPIService', **mock_section_fetchers()):
+            self.report = self.client.get(self.url).json()
+
+    def test_accept_encoding_negotiation(self):
+        with patch('seo_api.reports.brotli', None):
+            self.assertEqual(preferred_encoding('gzip, deflate, br'), 'gzip')
+            self.assertEqual(preferred_encoding('gzip;q=0, deflate'), 'identity')
+            self.assertEqual(preferred_encoding(''), 'identity')
+        with patch('seo_api.reports.brotli', MagicMock()):
+            self.assertEqual(preferred_encoding('gzip, br;q=0.5'), 'br')
+
+    def test_hits_are_served_pre_compressed_from_one_query(self):
+        # Only the validators are read from the database
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.report)
+
+        with self.assertNumQueries(1):
+            plain = self.client.get(self.url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain.json(), self.report)
+
+    def test_each_coding_has_its_own_etag(self):
+        gzipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        plain = self.client.get(self.url)
+        self.assertNotEqual(gzipped['ETag'], plain['ETag'])
+        self.assertTrue(gzipped['ETag'].endswith('-gzip"'))
+
+        # The same content in another coding is still not modified
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=plain['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], gzipped['ETag'])
+
+    def test_writes_outside_store_report_are_not_hidden_by_the_cache(self):
+        SEOReport.objects.update(etag='"changed"', data={'seo_score': 1})
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), {'seo_score': 1})
+        self.assertEqual(response['ETag'], '"changed"')
+
+    def test_evicted_bodies_are_rebuilt_from_the_stored_report(self):
+        cache.clear()
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.report)
+        with self.assertNumQueries(1):
+            self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+
+class ReportDeltaTests(TestCase):
+    report_url = '/api/seo-report/?domain=example.com&keywords=plumber'
+    delta_url = '/api/seo-report/delta/?domain=example.com&keywords=plumber'
+
+    def setUp(self):
+        cache.clear()
+        with patch.multiple('seo_api.services.SEOAPIService', **mock_section_fetchers()):
+            self.first = self.client.get(self.report_url).json()
+
+    def _refresh_pagespeed(self):
+        pagespeed = MagicMock(return_value={'environment': {'networkUserAgent': 'test'}})
+        with patch.multiple('seo_api.services.SEOAPIService', **mock_section_fetchers(_fetch_pagespeed_data=pagespeed)):
+            return self.client.get(self.report_url + '&refresh=pagespeed').json()
+
+    def test_first_poll_gets_the_whole_report(self):
+        response = self.client.get(self.delta_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['report'], self.first)
+        self.assertIn('gmb_profile', response.json()['hashes'])
+
+    def test_unchanged_snapshot_gets_an_empty_patch(self):
+        snapshot = self.client.get(self.delta_url).json()['snapshot']
+        response = self.client.get(self.delta_url + '&since=' + snapshot)
+        # Only the section statuses and follow-up token, which the snapshot leaves out
+        self.assertEqual([op['path'] for op in response.json()['patch']], ['/sections', '/followup'])
+        self.assertEqual(response.json()['patch'][0]['value'], self.first['sections'])
+        self.assertEqual(response.json()['snapshot'], snapshot)
+
+    def test_only_changed_sections_are_patched(self):
+        before = self.client.get(self.delta_url).json()
+        self._refresh_pagespeed()
+
+        for query in ('&since=' + before['snapshot'],
+                      '&hashes=' + ','.join(f'{k}:{v}' for k, v in before['hashes'].items())):
+            delta = self.client.get(self.delta_url + query).json()
+            self.assertNotEqual(delta['snapshot'], before['snapshot'])
+            self.assertNotIn('/gmb_profile', [op['path'] for op in delta['patch']])
+            self.assertEqual(delta['patch'][0], {
+                'op': 'add', 'path': '/website_analysis/pagespeed/environment/networkUserAgent', 'value': 'test'
+            })
+            self.assertEqual(delta['patch'][-2]['path'], '/sections')
+
+    def test_expired_snapshot_falls_back_to_the_whole_report(self):
+        before = self.client.get(self.delta_url).json()
+        refreshed = self._refresh_pagespeed()
+        cache.delete_many([f'seo:snapshot-section:{digest}' for digest in before['hashes'].values()])
+        delta = self.client.get(self.delta_url + '&since=' + before['snapshot']).json()
+        # The old section contents are gone, the old hashes are not
+        self.assertEqual(delta['report'], refreshed)
+
+        unknown = self.client.get(self.delta_url + '&since=0123abcd').json()
+        self.assertIn('report', unknown)
+
+    def test_bad_hashes_and_missing_reports(self):
+        response = self.client.get(self.delta_url + '&hashes=gmb_profile')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/seo-report/delta/?domain=other.com')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_json_patch_keeps_nulls_as_values(self):
+        old = {'a': 1, 'b': {'c': 1, 'd': 2}, 'e': [1], 'rank': 3}
+        new = {'a': 1, 'b': {'c': 2}, 'e': [1, 2], 'f/g': 3, 'rank': None}
+        self.assertEqual(json_patch(old, new), [
+            {'op': 'remove', 'path': '/b/d'},
+            {'op': 'replace', 'path': '/b/c', 'value': 2},
+            {'op': 'replace', 'path': '/e', 'value': [1, 2]},
+            {'op': 'add', 'path': '/f~1g', 'value': 3},
+            {'op': 'replace', 'path': '/rank', 'value': None},
+        ])
+
+
+class SiteCrawlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _page(self, n, title, duration, checks=None):
+        return {
+            'url': f'https://example.com/{n}',
+            'status_code': 404 if n == 3 else 200,
+            'onpage_score': 80,
+            'meta': {'title': title},
+            'page_timing': {'duration_time': duration},
+            'checks': checks or {},
+        }
+
+    def _response(self, result):
+        response = MagicMock()
+        response.json.return_value = {'tasks': [{'id': 'task-1', 'status_code': 20000, 'result': [result]}]}
+        return response
+
+    def get(self, url):
+        with self.settings(SEO_PROFILING={'TOKEN': 'secret'}):
+            return self.client.get(url, HTTP_X_PROFILE_TOKEN='secret')
+
+    def test_crawls_require_a_profiling_token(self):
+        with self.settings(SEO_PROFILING={'TOKEN': 'secret'}):
+            response = self.client.get('/api/site-crawl/?domain=example.com')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get('/api/site-crawl/task-1/pages/?domain=example.com')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_crawl_failed_upstream_is_an_error_not_pending(self, mock_post, mock_get):
+        mock_post.return_value = self._response({})
+        failed = MagicMock()
+        failed.json.return_value = {'tasks': [{'status_code': 40401, 'status_message': 'Task Not Found.', 'result': None}]}
+        mock_get.return_value = failed
+        fetchers = mock_section_fetchers()
+        del fetchers['_fetch_onpage_data']
+
+        with patch.multiple('seo_api.services.SEOAPIService', **fetchers):
+            report = self.client.get('/api/seo-report/?keywords=plumber&domain=example.com&budget_ms=1500').json()
+        self.assertEqual(report['sections']['onpage']['status'], 'error')
+        self.assertNotIn('followup', report)
+        self.assertIsNone(cache.get(onpage_task_cache_key('example.com')))
+
+        response = self.get('/api/site-crawl/?domain=example.com&max_pages=20&budget_ms=1000')
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertEqual(response.json()['status'], 'failed')
+
+    def test_audit_is_built_batch_by_batch(self):
+        audit = SiteAudit({'SLOWEST_PAGES': 2, 'DUPLICATE_TITLES': 5, 'SAMPLE_URLS': 2})
+        audit.add([
+            self._page(1, 'Home', 300, {'no_h1_tag': True, 'is_https': True}),
+            self._page(2, 'Plumbing', 900, {'no_h1_tag': True, 'no_description': True}),
+        ])
+        audit.add([self._page(3, 'plumbing ', 100), self._page(4, 'Plumbing', 500)])
+        result = audit.result()
+
+        self.assertEqual(result['pages'], 4)
+        self.assertEqual(result['issues'], {'no_h1_tag': 2, 'no_description': 1})
+        self.assertEqual(result['status_codes'], {'2xx': 3, '4xx': 1})
+        self.assertEqual([p['duration_time'] for p in result['slowest_pages']], [900, 500])
+        self.assertEqual(result['duplicate_titles'], [
+            {'title': 'plumbing', 'count': 3, 'urls': ['https://example.com/2', 'https://example.com/3']}
+        ])
+
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_site_crawl_streams_every_page_to_storage(self, mock_post, mock_get):
+        pages = [self._page(n, f'Page {n}', n * 100) for n in range(5)]
+        mock_get.return_value = self._response({'crawl_progress': 'finished', 'crawl_status': {'pages_crawled': 5}})
+        mock_post.side_effect = [
+            self._response({}),  # task_post
+            self._response({'total_items_count': 5, 'items': pages[:2]}),
+            self._response({'total_items_count': 5, 'items': pages[2:4]}),
+            self._response({'total_items_count': 5, 'items': pages[4:]}),
+        ]
+
+        with self.settings(SEO_SITE_CRAWL={**settings.SEO_SITE_CRAWL, 'PAGE_SIZE': 2}):
+            response = self.get('/api/site-crawl/?domain=www.example.com&max_pages=50')
+            path = crawl_pages_file('example.com', 'task-1')
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(mock_post.call_args_list[0].kwargs['json'][0]['max_crawl_pages'], 50)
+            self.assertEqual([c.kwargs['json'][0]['offset'] for c in mock_post.call_args_list[1:]], [0, 2, 4])
+            self.assertEqual(response.json()['site_audit']['pages'], 5)
+            self.assertEqual(response.json()['pages_crawled'], 5)
+            with gzip.open(path, 'rt') as f:
+                self.assertEqual([json.loads(line)['url'] for line in f], [p['url'] for p in pages])
+
+            download = self.get('/api/site-crawl/task-1/pages/?domain=example.com')
+            self.assertEqual(download.status_code, status.HTTP_200_OK)
+
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_unfinished_crawl_is_pending_and_resumed(self, mock_post, mock_get):
+        mock_post.return_value = self._response({})
+        mock_get.return_value = self._response({'crawl_progress': 'in_progress'})
+        url = '/api/site-crawl/?domain=example.com&max_pages=20&budget_ms=1000'
+
+        response = self.get(url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()['task_id'], 'task-1')
+        self.get(url)
+        mock_post.assert_called_once()
+
+    def test_page_budget_is_checked(self):
+        response = self.get('/api/site-crawl/?domain=example.com&max_pages=100000')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.get('/api/site-crawl/task-1/pages/?domain=example.com')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RankTrackingTests(TestCase):
+    url = '/api/rank-tracking/'
+
+    def setUp(self):
+        cache.clear()
+
+    def _task_post(self, payload_count):
+        def post(endpoint, auth=None, json=None, timeout=None):
+            response = MagicMock()
+            response.json.return_value = {'tasks': [
+                {'id': f"task-{task['keyword'].lower()}", 'data': {'tag': task['tag']}} for task in json
+            ]}
+            payload_count.append(len(json))
+            return response
+        return post
+
+    def _task_get(self, ready=True, status_codes=None, listed=None):
+        serps = {
+            'plumber': [
+                {'type': 'organic', 'rank_group': 1, 'rank_absolute': 2, 'url': 'https://rival.com/'},
+                {'type': 'local_pack', 'rank_group': 1, 'rank_absolute': 1, 'url': 'https://example.com/'},
+                {'type': 'organic', 'rank_group': 2, 'rank_absolute': 3, 'url': 'https://www.example.com/a'},
+                {'type': 'organic', 'rank_group': 3, 'rank_absolute': 4, 'url': 'https://example.com/b'},
+            ],
+            'drain repair': [{'type': 'organic', 'rank_group': 1, 'rank_absolute': 1, 'url': 'https://rival.com/'}],
+            'boiler': [{'type': 'organic', 'rank_group': 7, 'rank_absolute': 8, 'url': 'https://shop.example.com/'}],
+        }
+
+        status_codes = status_codes or {}
+
+        def get(endpoint, auth=None, timeout=None):
+            response = MagicMock()
+            if endpoint.endswith('/tasks_ready'):
+                finished = [f"task-{keyword}" for keyword in serps if ready or keyword in status_codes]
+                response.json.return_value = {'tasks': [
+                    {'status_code': 20000, 'result': [{'id': task_id} for task_id in listed or finished]}
+                ]}
+                return response
+            keyword = endpoint.rsplit('/task-', 1)[1].lower()
+            if keyword in status_codes:
+                task = {'status_code': status_codes[keyword], 'status_message': 'Task failed.'}
+            elif ready:
+                task = {'status_code': 20000, 'result': [{'items': serps[keyword]}]}
+            else:
+                task = {'status_code': 40602}
+            response.json.return_value = {'tasks': [task]}
+            return response
+        return get
+
+    def test_position_index_keeps_each_domains_best_organic_result(self):
+        index = serp_position_index([
+            {'type': 'organic', 'rank_group': 3, 'rank_absolute': 4, 'url': 'https://example.com/b'},
+            {'type': 'local_pack', 'rank_group': 1, 'rank_absolute': 1, 'url': 'https://example.com/'},
+            {'type': 'organic', 'rank_group': 2, 'rank_absolute': 3, 'url': 'https://www.example.com/a'},
+        ])
+        self.assertEqual(position_in(index, 'https://example.com'), {
+            'position': 2, 'rank_absolute': 3, 'url': 'https://www.example.com/a'
+        })
+        self.assertIsNone(position_in(index, 'other.com'))
+
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_serps_are_posted_in_batches_and_shared_across_domains(self, mock_post, mock_get):
+        payloads = []
+        mock_post.side_effect = self._task_post(payloads)
+        mock_get.side_effect = self._task_get()
+
+        with self.settings(SEO_RANK_TRACKING={'TASKS_PER_POST': 2}):
+            response = self.client.get(self.url + '?domains=example.com,rival.com&keywords=plumber,Drain repair,boiler,PLUMBER')
+        data = response.json()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(payloads), [1, 2])
+        self.assertEqual(data['keywords'], ['plumber', 'Drain repair', 'boiler'])
+        self.assertEqual(data['positions']['example.com']['plumber']['position'], 2)
+        self.assertIsNone(data['positions']['example.com']['Drain repair'])
+        self.assertEqual(data['positions']['example.com']['boiler']['position'], 7)
+        self.assertEqual(data['summary']['rival.com'], {
+            'tracked': 3, 'ranked': 2, 'top3': 2, 'top10': 2, 'average_position': 1.0
+        })
+        self.assertEqual(data['pending'], [])
+
+        # Another domain on the same keywords is answered from the cached SERPs
+        mock_post.reset_mock()
+        mock_get.reset_mock()
+        response = self.client.post(
+            self.url, {'domains': ['other.com'], 'keywords': ['plumber', 'boiler']}, content_type='application/json'
+        )
+        self.assertEqual(response.json()['summary']['other.com']['ranked'], 0)
+        mock_post.assert_not_called()
+        mock_get.assert_not_called()
+
+    @patch('seo_api.services.sleep_within_deadline')
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_queued_serps_are_pending_and_collected_later(self, mock_post, mock_get, mock_sleep):
+        payloads = []
+        mock_post.side_effect = self._task_post(payloads)
+        mock_get.side_effect = self._task_get(ready=False)
+        url = self.url + '?domains=example.com&keywords=plumber,boiler&budget_ms=1000'
+
+        self.assertEqual(self.client.get(url).json()['pending'], ['plumber', 'boiler'])
+
+        mock_get.side_effect = self._task_get()
+        data = self.client.get(url).json()
+        self.assertEqual(data['pending'], [])
+        self.assertEqual(data['positions']['example.com']['boiler']['position'], 7)
+        self.assertEqual(payloads, [2])
+
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_only_tasks_listed_as_ready_are_fetched(self, mock_post, mock_get):
+        mock_post.side_effect = self._task_post([])
+        mock_get.side_effect = self._task_get()
+
+        self.client.get(self.url + '?domains=example.com&keywords=plumber,boiler')
+
+        endpoints = [call.args[0] for call in mock_get.call_args_list]
+        self.assertEqual(sum(endpoint.endswith('/tasks_ready') for endpoint in endpoints), 1)
+        self.assertEqual(sorted(endpoint.rsplit('/', 1)[1] for endpoint in endpoints if '/task_get/' in endpoint),
+                         ['task-boiler', 'task-plumber'])
+
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_tasks_hidden_by_a_full_tasks_ready_list_are_fetched_directly(self, mock_post, mock_get):
+        mock_post.side_effect = self._task_post([])
+        mock_get.side_effect = self._task_get(listed=[f'task-orphan-{i}' for i in range(1000)])
+
+        data = self.client.get(self.url + '?domains=example.com&keywords=plumber,boiler').json()
+
+        self.assertEqual(data['pending'], [])
+        self.assertEqual(data['positions']['example.com']['boiler']['position'], 7)
+
+    @patch('seo_api.services.sleep_within_deadline')
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_failed_serp_tasks_are_errors_not_pending(self, mock_post, mock_get, mock_sleep):
+        payloads = []
+        mock_post.side_effect = self._task_post(payloads)
+        mock_get.side_effect = self._task_get(ready=False, status_codes={'boiler': 40501})
+        url = self.url + '?domains=example.com&keywords=plumber,boiler&budget_ms=1000'
+
+        data = self.client.get(url).json()
+        self.assertEqual(data['pending'], ['plumber'])
+        self.assertEqual(data['errors'], {'boiler': '40501 Task failed.'})
+
+        # The failed task is forgotten and posted again; the queued one is not
+        mock_get.side_effect = self._task_get()
+        data = self.client.get(url).json()
+        self.assertEqual(data['errors'], {})
+        self.assertEqual(data['positions']['example.com']['boiler']['position'], 7)
+        self.assertEqual(payloads, [2, 1])
+
+    @patch('seo_api.services.sleep_within_deadline')
+    @patch('seo_api.services.requests.get')
+    @patch('seo_api.services.requests.post')
+    def test_a_failed_batch_keeps_the_other_batches_tasks(self, mock_post, mock_get, mock_sleep):
+        payloads = []
+        post = self._task_post(payloads)
+
+        def flaky_post(endpoint, auth=None, json=None, timeout=None):
+            if any(task['keyword'] == 'boiler' for task in json):
+                raise requests.exceptions.ConnectionError("connection reset")
+            return post(endpoint, json=json)
+
+        mock_post.side_effect = flaky_post
+        mock_get.side_effect = self._task_get(ready=False)
+        url = self.url + '?domains=example.com&keywords=plumber,drain repair,boiler&budget_ms=1000'
+
+        with self.settings(SEO_RANK_TRACKING={'TASKS_PER_POST': 2}):
+            data = self.client.get(url).json()
+            self.assertEqual(data['pending'], ['plumber', 'drain repair'])
+            self.assertEqual(data['errors'], {'boiler': 'connection reset'})
+
+            # Only the failed batch is posted again
+            mock_post.side_effect = post
+            mock_get.side_effect = self._task_get()
+            data = self.client.get(url).json()
+        self.assertEqual(data['pending'], [])
+        self.assertEqual(data['positions']['example.com']['boiler']['position'], 7)
+        self.assertEqual(payloads, [2, 1])
+
+    def test_domains_and_keywords_are_required(self):
+        response = self.client.get(self.url + '?domains=example.com')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
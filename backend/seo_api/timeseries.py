@@ -0,0 +1,174 @@
+# seo_api/timeseries.py
+import hashlib
+import mmap
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .domains import canonical_host
+
+try:
+    import fcntl
+except ImportError:  # Windows: the in-process lock is all we get
+    fcntl = None
+
+
+DEFAULT_MAX_POINTS = 1000
+
+# Each (domain, metric) series is two fixed-width columns of the same length
+TIMESTAMP_TYPE = 'q'   # int64 seconds since the epoch
+VALUE_TYPE = 'd'       # float64
+
+_SAFE_NAME = re.compile(r'^[a-z0-9][a-z0-9._-]{0,99}$')
+_write_lock = threading.Lock()
+
+
+def get_timeseries_dir():
+    return getattr(settings, 'SEO_TIMESERIES_DIR', os.path.join(settings.BASE_DIR, 'timeseries'))
+
+
+def get_max_points():
+    return getattr(settings, 'SEO_TIMESERIES_MAX_POINTS', DEFAULT_MAX_POINTS)
+
+
+def _safe_name(value):
+    """A file name for a domain or metric; anything unusual is hashed"""
+    value = str(value or '').strip().lower()
+    if _SAFE_NAME.match(value) and '..' not in value:
+        return value
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def _mapped(path, typecode):
+    """
+    A read-only memoryview of a column file. The file is memory-mapped, so a
+    range read only touches the pages it needs. A trailing partial item (a
+    torn append) is ignored.
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        yield memoryview(array(typecode))
+        return
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        size -= size % array(typecode).itemsize
+        if not size:
+            yield memoryview(array(typecode))
+            return
+        mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        view = memoryview(mm).cast(typecode)
+        try:
+            yield view
+        finally:
+            view.release()
+            mm.close()
+
+
+def _last_timestamp(path):
+    with _mapped(path, TIMESTAMP_TYPE) as timestamps:
+        return timestamps[-1] if len(timestamps) else None
+
+
+def downsample(timestamps, values, points):
+    """
+    Average `values` into at most `points` equal time buckets. Each bucket is
+    found by bisecting the (sorted) timestamps, so the cost is one pass over
+    the values plus a binary search per bucket.
+    """
+    count = min(len(timestamps), len(values))
+    if count <= points:
+        return [[t, v] for t, v in zip(timestamps[:count].tolist(), values[:count].tolist())]
+
+    first, last = timestamps[0], timestamps[count - 1]
+    width = (last - first + 1) / points
+    series = []
+    lo = 0
+    for bucket in range(points):
+        bucket_end = first + int(width * (bucket + 1))
+        hi = count if bucket == points - 1 else bisect_left(timestamps, bucket_end, lo, count)
+        if hi > lo:
+            chunk = values[lo:hi]
+            series.append([first + int(width * bucket), sum(chunk) / len(chunk)])
+        lo = hi
+    return series
+
+
+class TimeSeriesStore:
+    """
+    Append-only, column-oriented metric history.
+
+    Every (domain, metric) pair has two files under the store directory,
+    <domain>/<metric>.ts (int64 timestamps) and <domain>/<metric>.val (float64
+    values), written in timestamp order. Reads memory-map the columns, bisect
+    the timestamps for the requested range and downsample the values.
+    """
+
+    def __init__(self, base_dir=None):
+        self.base_dir = str(base_dir or get_timeseries_dir())
+
+    def _paths(self, domain, metric):
+        folder = os.path.join(self.base_dir, _safe_name(canonical_host(domain) or domain))
+        name = _safe_name(metric)
+        return folder, os.path.join(folder, name + '.ts'), os.path.join(folder, name + '.val')
+
+    def append(self, domain, metrics, timestamp=None):
+        """
+        Append one point per metric in `metrics` ({name: value}). Points older
+        than a series' last point are skipped so each column stays sorted.
+        Returns the number of points written.
+        """
+        timestamp = int(time.time() if timestamp is None else timestamp)
+        written = 0
+        with _write_lock:
+            for metric, value in metrics.items():
+                if value is None:
+                    continue
+                folder, ts_path, val_path = self._paths(domain, metric)
+                os.makedirs(folder, exist_ok=True)
+                with open(ts_path, 'ab') as ts_file, open(val_path, 'ab') as val_file:
+                    if fcntl:
+                        fcntl.flock(ts_file.fileno(), fcntl.LOCK_EX)
+                    try:
+                        # Columns can differ in length after a crash mid-append; trim to the shorter
+                        ts_items = ts_file.tell() // 8
+                        val_items = val_file.tell() // 8
+                        if ts_items != val_items:
+                            ts_file.truncate(min(ts_items, val_items) * 8)
+                            val_file.truncate(min(ts_items, val_items) * 8)
+                        last = _last_timestamp(ts_path)
+                        if last is not None and timestamp < last:
+                            continue
+                        ts_file.write(array(TIMESTAMP_TYPE, [timestamp]).tobytes())
+                        val_file.write(array(VALUE_TYPE, [float(value)]).tobytes())
+                        written += 1
+                    finally:
+                        if fcntl:
+                            fcntl.flock(ts_file.fileno(), fcntl.LOCK_UN)
+        return written
+
+    def read(self, domain, metric, start=None, end=None, points=None):
+        """[[timestamp, value], ...] between start and end (epoch seconds, inclusive), downsampled to `points`"""
+        _, ts_path, val_path = self._paths(domain, metric)
+        points = max(1, min(points or get_max_points(), get_max_points()))
+        with _mapped(ts_path, TIMESTAMP_TYPE) as timestamps, _mapped(val_path, VALUE_TYPE) as values:
+            count = min(len(timestamps), len(values))
+            lo = 0 if start is None else bisect_left(timestamps, int(start), 0, count)
+            hi = count if end is None else bisect_right(timestamps, int(end), lo, count)
+            return downsample(timestamps[lo:hi], values[lo:hi], points)
+
+    def metrics(self, domain):
+        """Names of the metrics recorded for a domain"""
+        folder, _, _ = self._paths(domain, '')
+        try:
+            names = os.listdir(folder)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-3] for name in names if name.endswith('.ts'))
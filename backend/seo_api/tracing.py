@@ -0,0 +1,304 @@
+# seo_api/tracing.py
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+
+DEFAULT_TRACING = {
+    "SAMPLE_RATE": 0.01,         # Fraction of root spans (reports, comparisons, scans) recorded
+    "DIR": "traces",             # Span log directory (relative to BASE_DIR)
+    "MAX_BYTES": 20 * 1024 * 1024,  # spans.jsonl is rotated to spans.jsonl.1 beyond this
+    "MAX_QUEUED": 10000,         # Finished spans waiting for the writer; more are dropped
+}
+
+_current_span = contextvars.ContextVar('seo_span', default=None)
+
+
+def get_tracing_config():
+    config = dict(DEFAULT_TRACING)
+    config.update(getattr(settings, "SEO_TRACING", {}))
+    return config
+
+
+def get_trace_file():
+    trace_dir = Path(get_tracing_config()["DIR"])
+    if not trace_dir.is_absolute():
+        trace_dir = Path(settings.BASE_DIR) / trace_dir
+    return trace_dir / "spans.jsonl"
+
+
+class Span:
+    """
+    One timed operation in a trace. Spans are recorded only when their trace
+    was sampled; an unsampled span still carries the context so its children
+    know not to record either.
+    """
+
+    def __init__(self, name, parent=None, sampled=True, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.sampled = parent.sampled if parent else sampled
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if self.sampled:
+            export_span(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms or 0, 3),
+            "status": self.status,
+            "thread": threading.current_thread().name,
+            "attributes": self.attributes,
+        }
+
+
+def current_span():
+    return _current_span.get()
+
+
+def annotate(**attributes):
+    """Add attributes to the current span, if any"""
+    span_ = _current_span.get()
+    if span_ is not None:
+        span_.set(**attributes)
+
+
+@contextmanager
+def span(name, root=False, **attributes):
+    """
+    Time the enclosed block as a child of the current span. Without a current
+    span a new trace is started only for root=True (sampled at SAMPLE_RATE);
+    otherwise the block runs untraced.
+
+    Context variables carry the current span, so work handed to
+    submit_in_context() lands in the same trace.
+    """
+    parent = _current_span.get()
+    if parent is None and not root:
+        yield None
+        return
+
+    sampled = parent is not None or random.random() < get_tracing_config()["SAMPLE_RATE"]
+    span_ = Span(name, parent=parent, sampled=sampled, attributes=attributes)
+    token = _current_span.set(span_)
+    try:
+        yield span_
+    except BaseException as e:
+        span_.status = "error"
+        span_.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        span_.finish()
+
+
+def traced(name=None, root=False):
+    """Decorator form of span(), named after the function by default"""
+
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, root=root):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_view(name):
+    """
+    Decorator for an APIView handler: the request becomes the root span and
+    the response carries its id in X-Trace-Id.
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            with span(name, root=True, method=request.method, path=request.get_full_path()) as root:
+                response = handler(view, request, *args, **kwargs)
+                root.set(status_code=response.status_code)
+                if root.sampled:
+                    response["X-Trace-Id"] = root.trace_id
+                return response
+
+        return wrapper
+
+    return decorator
+
+
+class SpanExporter:
+    """
+    Appends finished spans to the span log from a background thread. The
+    request thread only queues the span; the writer takes everything queued
+    and appends it in one write. When the writer falls MAX_QUEUED spans
+    behind, further spans are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_tracing_config()
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=self.config["MAX_QUEUED"])
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def export(self, span_dict):
+        try:
+            self._queue.put_nowait(span_dict)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self._ensure_writer()
+
+    def flush(self):
+        """Wait until every span queued so far is written"""
+        self._ensure_writer()
+        self._queue.join()
+
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            with self._lock:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._writer.start()
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(spans)
+            finally:
+                for _ in spans:
+                    self._queue.task_done()
+
+    def _write(self, spans):
+        path = get_trace_file()
+        lines = "".join(json.dumps(span_dict, default=str) + "\n" for span_dict in spans)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists() and path.stat().st_size > self.config["MAX_BYTES"]:
+                os.replace(path, path.with_name(path.name + ".1"))
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            print(f"Error writing trace spans: {str(e)}")
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_span_exporter():
+    """Process-wide span exporter, so every request shares one writer thread"""
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                _exporter = SpanExporter()
+                atexit.register(_exporter.flush)
+    return _exporter
+
+
+def export_span(span_):
+    """Queue a finished span for the local JSON lines log"""
+    get_span_exporter().export(span_.to_dict())
+
+
+def _read_spans(match=None):
+    # Include spans still waiting for the writer, such as the ones of the request asking
+    get_span_exporter().flush()
+    path = get_trace_file()
+    for candidate in (path.with_name(path.name + ".1"), path):
+        if not candidate.exists():
+            continue
+        with open(candidate, encoding="utf-8") as f:
+            for line in f:
+                # Cheap substring filter before parsing
+                if match and match not in line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def load_trace(trace_id):
+    """
+    The spans of one trace as a tree: each span dict gets "children" (by start
+    time) and "offset_ms" from the trace start. Returns None if unknown.
+    """
+    if not trace_id.isalnum():
+        return None
+    spans = [s for s in _read_spans(trace_id) if s.get("trace_id") == trace_id]
+    if not spans:
+        return None
+
+    trace_start = min(s["start"] for s in spans)
+    by_id = {s["span_id"]: s for s in spans}
+    roots = []
+    for s in sorted(spans, key=lambda s: s["start"]):
+        s["offset_ms"] = round((s["start"] - trace_start) * 1000, 3)
+        s.setdefault("children", [])
+        parent = by_id.get(s["parent_id"])
+        if parent is not None:
+            parent.setdefault("children", []).append(s)
+        else:
+            roots.append(s)
+
+    duration_ms = max(s["offset_ms"] + s["duration_ms"] for s in spans)
+    return {"trace_id": trace_id, "duration_ms": round(duration_ms, 3), "spans": len(spans), "roots": roots}
+
+
+def flatten_trace(trace):
+    """Depth-first (span, depth) rows for a waterfall view"""
+    rows = []
+
+    def walk(span_, depth):
+        rows.append((span_, depth))
+        for child in span_["children"]:
+            walk(child, depth + 1)
+
+    for root in trace["roots"]:
+        walk(root, 0)
+    return rows
+
+
+def list_traces(limit=20):
+    """The most recent root spans, newest first"""
+    roots = [s for s in _read_spans('"parent_id": null') if s.get("parent_id") is None]
+    roots.sort(key=lambda s: s["start"], reverse=True)
+    return roots[:limit]
@@ -1,6 +1,38 @@
 from django.urls import path
-from .views import SEOReportView
+from .views import (
+    SEOReportView,
+    SEOReportDeltaView,
+    SEOComparisonView,
+    RankTrackingView,
+    GeoGridView,
+    SiteCrawlView,
+    SiteCrawlPagesView,
+    LocaleAutocompleteView,
+    CompetitorIndexView,
+    MetricHistoryView,
+    ExportView,
+    TraceIndexView,
+    TraceDetailView,
+    TraceWaterfallView,
+    ProfileIndexView,
+    ProfileDownloadView,
+)
 
 urlpatterns = [
     path('seo-report/', SEOReportView.as_view(), name='seo-report'),
+    path('seo-report/delta/', SEOReportDeltaView.as_view(), name='seo-report-delta'),
+    path('seo-compare/', SEOComparisonView.as_view(), name='seo-compare'),
+    path('rank-tracking/', RankTrackingView.as_view(), name='rank-tracking'),
+    path('geo-grid/', GeoGridView.as_view(), name='geo-grid'),
+    path('site-crawl/', SiteCrawlView.as_view(), name='site-crawl'),
+    path('site-crawl/<str:task_id>/pages/', SiteCrawlPagesView.as_view(), name='site-crawl-pages'),
+    path('locations/autocomplete/', LocaleAutocompleteView.as_view(), name='locale-autocomplete'),
+    path('competitors/', CompetitorIndexView.as_view(), name='competitor-index'),
+    path('history/', MetricHistoryView.as_view(), name='metric-history'),
+    path('export/<slug:kind>.<slug:fmt>', ExportView.as_view(), name='export'),
+    path('traces/', TraceIndexView.as_view(), name='trace-index'),
+    path('traces/<str:trace_id>/', TraceDetailView.as_view(), name='trace-detail'),
+    path('traces/<str:trace_id>/waterfall/', TraceWaterfallView.as_view(), name='trace-waterfall'),
+    path('profiles/', ProfileIndexView.as_view(), name='profile-index'),
+    path('profiles/<str:capture_id>/<str:kind>/', ProfileDownloadView.as_view(), name='profile-download'),
 ]
\ No newline at end of file
@@ -1,10 +1,112 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.cache import get_conditional_response, parse_etags, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .models import SEORequestLog
-from .services import SEOAPIService
+from .models import SEORequestLog, SEOReport
+from .services import SEOAPIService, ONPAGE_TASK_TTL, onpage_task_cache_key, read_followup_token
+from .profiling import is_privileged, list_captures, get_capture_file
+from .locations import get_locale_index, resolve_locale
+from .competitors import competitors_of, top_domains_for_keyword, rank_among_competitors
+from .deadlines import get_report_budget_ms
+from .reports import (
+    cache_report_body, coding_etag, get_cached_body, get_report_meta, preferred_encoding, report_etags,
+    report_delta, report_metadata_patch, report_section_hashes, snapshot_hashes, snapshot_id,
+)
+from .domains import canonical_host
+from .timeseries import TimeSeriesStore
+from .exports import EXPORTS, EXPORT_FORMATS, gzip_stream, iter_export
+from .geogrid import get_geogrid_config
+from .crawls import crawl_pages_file, get_site_crawl_config
+from .ranks import get_rank_tracking_config
+from .admission import AdmissionRejected, get_admission_controller
+from .slots import BULK, INTERACTIVE, work_context
+from .tracing import flatten_trace, list_traces, load_trace, trace_view
+
+# Below this a report cannot finish even a single upstream call
+MIN_BUDGET_MS = 1000
+
+
+def parse_timestamp(value):
+    """Epoch seconds from an epoch number, ISO date or ISO datetime; None if empty, ValueError if invalid"""
+    if not value:
+        return None
+    try:
+        return int(float(value))
+    except (ValueError, OverflowError):
+        pass
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid timestamp: {value}")
+        parsed = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return int(parsed.timestamp())
+
+
+def parse_budget_ms(request):
+    """The request's ?budget_ms= clamped to the allowed range, or None if it is not a number"""
+    try:
+        budget_ms = int(request.query_params.get('budget_ms', get_report_budget_ms()))
+    except ValueError:
+        return None
+    return max(MIN_BUDGET_MS, min(budget_ms, settings.SEO_REPORT_MAX_BUDGET_MS))
+
+
+def validate_locale(location, language):
+    """
+    Check a location/language pair against the local locale index before any
+    upstream call. Returns (location, language) with their canonical names, or
+    a 400 Response listing suggestions for whichever is unknown.
+    """
+    location_entry, language_entry, locale_errors = resolve_locale(location, language)
+    if locale_errors:
+        return Response(
+            {"error": "Invalid location or language", **locale_errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if location_entry:
+        location = location_entry["name"]
+    if language_entry:
+        language = language_entry["name"]
+    return location, language
+
+
+def request_tenant(request):
+    """
+    The fair-queuing tenant of a request: the authenticated user, else the
+    client address. X-Tenant is only taken from privileged callers (e.g. a
+    trusted gateway), since a client naming a fresh tenant on every request
+    would always start at the front of its class.
+    """
+    if request.headers.get('X-Tenant') and is_privileged(request):
+        return request.headers['X-Tenant']
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.get_username()}"
+    return request.META.get('REMOTE_ADDR') or 'default'
+
+
+def request_work_context(request):
+    """Tag a request's upstream calls: X-Priority: bulk marks batch clients"""
+    priority = BULK if request.headers.get('X-Priority', '').lower() == BULK else INTERACTIVE
+    return work_context(priority=priority, tenant=request_tenant(request))
+
 
 class SEOReportView(APIView):
+    @trace_view("SEOReportView.get")
     def get(self, request):
        
         
@@ -14,13 +116,74 @@ class SEOReportView(APIView):
         language = request.query_params.get('language', 'English')
         keywords = request.query_params.get('keywords', '')
         website = request.query_params.get('domain', '')
+        # Comma separated section names (or "all") to re-fetch even if still fresh
+        refresh = [name.strip() for name in request.query_params.get('refresh', '').split(',') if name.strip()]
+
+        # A follow-up token from a partial report: collect the sections still in progress
+        followup = request.query_params.get('followup')
+        if followup:
+            try:
+                pending = read_followup_token(followup)
+            except signing.BadSignature:
+                return Response(
+                    {"error": "Invalid or expired followup token"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if pending["website"] != canonical_host(website):
+                return Response(
+                    {"error": "followup token is for a different domain"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if pending["tasks"].get("onpage"):
+                cache.add(onpage_task_cache_key(website), pending["tasks"]["onpage"], ONPAGE_TASK_TTL)
+            refresh += list(pending["tasks"])
+        
+        budget_ms = parse_budget_ms(request)
+        if budget_ms is None:
+            return Response(
+                {"error": "budget_ms must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         if not website:
             return Response(
                 {"error": "Domain parameter is required"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
+
+        locale = validate_locale(location, language)
+        if isinstance(locale, Response):
+            return locale
+        location, language = locale
+
+        # A stored report whose sections are all still fresh is answered without
+        # re-fetching; a matching If-None-Match/If-Modified-Since gets a 304
+        # without even loading the report body.
+        # The body is served pre-encoded in the best coding the client accepts.
+        meta = None if refresh else get_report_meta(keywords, website, location, language)
+        if meta and meta.expires_at and meta.expires_at > timezone.now():
+            coding = preferred_encoding(request.headers.get('Accept-Encoding'))
+            not_modified = self._conditional_response(request, meta, coding)
+            if not_modified is not None:
+                return not_modified
+            body = get_cached_body(meta, coding)
+            if body is None:
+                body = cache_report_body(meta)[coding]
+            return self._with_validators(self._encoded_response(body, coding), meta, coding)
+
+        # Everything below generates a report, so it goes through admission control;
+        # fresh stored reports above are always answered without waiting
+        try:
+            with get_admission_controller().admit() as waited_ms, request_work_context(request):
+                return self._generate_report(
+                    request, keywords, website, location, language, refresh,
+                    max(MIN_BUDGET_MS, budget_ms - int(waited_ms))
+                )
+        except AdmissionRejected as e:
+            return self._overloaded(keywords, website, location, language, e.retry_after)
+
+    def _generate_report(self, request, keywords, website, location, language, refresh, budget_ms):
+        """Fetch the stale sections, store the report and answer with it"""
         try:
             # Initialize the SEO API service
             seo_service = SEOAPIService()
@@ -61,7 +224,9 @@ class SEOReportView(APIView):
 
             
             # Fetch real SEO data
-            seo_data = seo_service.fetch_local_seo_data(keywords, website, location, language)
+            seo_data = seo_service.fetch_local_seo_data(
+                keywords, website, location, language, refresh=refresh, budget_ms=budget_ms
+            )
             
             if not seo_data:
                 return Response(
@@ -79,6 +244,12 @@ class SEOReportView(APIView):
             #     seo_score=seo_data["seo_score"]
             # )
             
+            meta = get_report_meta(keywords, website, location, language)
+            if meta:
+                not_modified = self._conditional_response(request, meta)
+                if not_modified is not None:
+                    return not_modified
+                return self._with_validators(Response(seo_data), meta)
             return Response(seo_data)
             
         except Exception as e:
@@ -93,3 +264,623 @@ class SEOReportView(APIView):
                 {"erro": str(e)}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+    def _overloaded(self, keywords, website, location, language, retry_after):
+        """
+        Shed load: answer with the last stored report, marked stale, if there
+        is one, otherwise 503. Either way the client is told when to retry.
+        """
+        meta = get_report_meta(keywords, website, location, language)
+        if meta:
+            data = SEOReport.objects.values_list('data', flat=True).get(pk=meta.pk)
+            response = self._with_validators(Response(data), meta)
+            response['Warning'] = '110 - "Response is Stale"'
+        else:
+            response = Response(
+                {"error": "Too many reports are being generated; try again shortly"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    def _encoded_response(self, body, coding):
+        """A response carrying an already rendered (and compressed) report body"""
+        response = HttpResponse(body, content_type='application/json')
+        if coding != 'identity':
+            response['Content-Encoding'] = coding
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+    def _conditional_response(self, request, meta, coding='identity'):
+        """
+        A 304 response if the client's validators match the stored report, else
+        None. A client holding the same content in another coding also gets a 304,
+        which carries the ETag of the coding this request would have been sent.
+        """
+        known = parse_etags(request.headers.get('If-None-Match', ''))
+        matched = next((tag for tag in report_etags(meta.etag) if tag in known), coding_etag(meta.etag, coding))
+        response = get_conditional_response(
+            request,
+            etag=matched,
+            last_modified=int(meta.last_modified.timestamp()) if meta.last_modified else None,
+        )
+        if response is None:
+            return None
+        return self._with_validators(response, meta, coding)
+
+    def _with_validators(self, response, meta, coding='identity'):
+        """ETag/Last-Modified plus a max-age that runs out when the first section goes stale"""
+        response['ETag'] = coding_etag(meta.etag, coding)
+        if meta.last_modified:
+            response['Last-Modified'] = http_date(meta.last_modified.timestamp())
+        max_age = int((meta.expires_at - timezone.now()).total_seconds()) if meta.expires_at else 0
+        if max_age > 0:
+            patch_cache_control(response, public=True, max_age=max_age)
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
+
+
+def parse_section_hashes(value):
+    """{section: hash} from "section:hash,section:hash"; ValueError if malformed"""
+    hashes = {}
+    for part in value.split(','):
+        section, sep, digest = part.strip().partition(':')
+        if not sep or not section or not digest.isalnum():
+            raise ValueError(f"Invalid section hash: {part.strip()}")
+        hashes[section] = digest
+    return hashes
+
+
+class SEOReportDeltaView(APIView):
+    """
+    What changed in a stored report since the client last saw it. The client
+    names what it holds with ?since=<snapshot id> or ?hashes=section:hash,...
+    and gets back {"snapshot", "hashes", "patch"}, the patch being JSON Patch
+    (RFC 6902) operations for the changed sections plus the current section
+    statuses and follow-up token. When there is nothing to patch against
+    (first poll, or an expired snapshot) "report" holds the whole report
+    instead of "patch".
+
+    Reports are not generated here; the stored report is kept current by
+    /api/seo-report/ requests and the refresh scheduler.
+    """
+
+    def get(self, request):
+        location = request.query_params.get('location', 'United States')
+        language = request.query_params.get('language', 'English')
+        keywords = request.query_params.get('keywords', '')
+        website = request.query_params.get('domain', '')
+        since = snapshot_id(request.query_params.get('since', ''))
+
+        if not website:
+            return Response(
+                {"error": "Domain parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            known = parse_section_hashes(request.query_params['hashes']) if request.query_params.get('hashes') else None
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        locale = validate_locale(location, language)
+        if isinstance(locale, Response):
+            return locale
+        location, language = locale
+
+        meta = get_report_meta(keywords, website, location, language)
+        if meta is None:
+            return Response(
+                {"error": "No report yet; request /api/seo-report/ first"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        current = snapshot_id(meta.etag)
+        if known is None:
+            known = snapshot_hashes(since)
+
+        body = get_cached_body(meta, 'identity')
+        if body is not None:
+            report = json.loads(body)
+        else:
+            report = SEOReport.objects.values_list('data', flat=True).get(pk=meta.pk)
+
+        # Unchanged content since the client's snapshot: only statuses and follow-up can have moved
+        hashes = snapshot_hashes(current)
+        if hashes is not None and (since == current or known == hashes):
+            return Response({"snapshot": current, "hashes": hashes, "patch": report_metadata_patch(report)})
+
+        delta = {"snapshot": current, "hashes": report_section_hashes(report)}
+        patch = report_delta(report, known) if known is not None else None
+        if patch is None:
+            delta["report"] = report
+        else:
+            delta["patch"] = patch
+        return Response(delta)
+
+
+class SEOComparisonView(APIView):
+    def get(self, request):
+        location = request.query_params.get('location', 'United States')
+        language = request.query_params.get('language', 'English')
+        keywords = request.query_params.get('keywords', '')
+
+        # Deduplicate www/scheme variants of the same site, keeping the caller's order
+        websites = []
+        seen = set()
+        for website in request.query_params.get('domains', '').split(','):
+            host = canonical_host(website)
+            if host and host not in seen:
+                seen.add(host)
+                websites.append(host)
+
+        if len(websites) < 2:
+            return Response(
+                {"error": "At least two comma separated domains are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(websites) > settings.SEO_COMPARE_MAX_DOMAINS:
+            return Response(
+                {"error": f"At most {settings.SEO_COMPARE_MAX_DOMAINS} domains can be compared"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not keywords:
+            return Response(
+                {"error": "Keywords parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        budget_ms = parse_budget_ms(request)
+        if budget_ms is None:
+            return Response(
+                {"error": "budget_ms must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        locale = validate_locale(location, language)
+        if isinstance(locale, Response):
+            return locale
+        location, language = locale
+
+        try:
+            with request_work_context(request):
+                comparison = SEOAPIService().fetch_comparison(
+                    keywords, websites, location, language, budget_ms=budget_ms
+                )
+            return Response(comparison)
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class RankTrackingView(APIView):
+    """
+    Organic positions of one or more domains for a list of keywords. GET takes
+    comma separated ?domains= and ?keywords=; for long keyword lists POST a JSON
+    body with "domains" and "keywords" lists (plus "location" and "language").
+    """
+
+    def get(self, request):
+        return self._track(
+            request,
+            request.query_params.get('domains', '').split(','),
+            request.query_params.get('keywords', '').split(','),
+            request.query_params.get('location', 'United States'),
+            request.query_params.get('language', 'English'),
+        )
+
+    def post(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        domains, keywords = data.get('domains') or [], data.get('keywords') or []
+        if not isinstance(domains, list) or not isinstance(keywords, list):
+            return Response(
+                {"error": "domains and keywords must be lists"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return self._track(
+            request, domains, keywords,
+            data.get('location') or 'United States', data.get('language') or 'English',
+        )
+
+    def _track(self, request, domains, keywords, location, language):
+        websites = []
+        for website in domains:
+            host = canonical_host(website)
+            if host and host not in websites:
+                websites.append(host)
+        # Same keyword in any case or spacing is one SERP
+        unique = {}
+        for keyword in keywords:
+            keyword = str(keyword).strip()
+            if keyword:
+                unique.setdefault(keyword.lower(), keyword)
+        keywords = list(unique.values())
+
+        if not websites or not keywords:
+            return Response(
+                {"error": "At least one domain and one keyword are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_keywords = get_rank_tracking_config()["MAX_KEYWORDS"]
+        if len(keywords) > max_keywords:
+            return Response(
+                {"error": f"At most {max_keywords} keywords can be tracked per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        budget_ms = parse_budget_ms(request)
+        if budget_ms is None:
+            return Response(
+                {"error": "budget_ms must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        locale = validate_locale(location, language)
+        if isinstance(locale, Response):
+            return locale
+        location, language = locale
+
+        try:
+            with request_work_context(request):
+                ranks = SEOAPIService().fetch_rank_tracking(
+                    websites, keywords, location, language, budget_ms=budget_ms
+                )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response(ranks)
+
+
+class GeoGridView(APIView):
+    def get(self, request):
+        location = request.query_params.get('location', 'United States')
+        language = request.query_params.get('language', 'English')
+        keywords = request.query_params.get('keywords', '')
+        website = canonical_host(request.query_params.get('domain', ''))
+
+        if not website or not keywords:
+            return Response(
+                {"error": "Domain and keywords parameters are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        sizes = get_geogrid_config()["SIZES"]
+        try:
+            size = int(request.query_params.get('size', 7))
+            spacing_km = float(request.query_params.get('spacing_km', 0)) or None
+            lat, lng = request.query_params.get('lat'), request.query_params.get('lng')
+            center = (float(lat), float(lng)) if lat and lng else None
+        except ValueError:
+            return Response(
+                {"error": "size, spacing_km, lat and lng must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if size not in sizes:
+            return Response(
+                {"error": f"size must be one of {', '.join(str(s) for s in sizes)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        budget_ms = parse_budget_ms(request)
+        if budget_ms is None:
+            return Response(
+                {"error": "budget_ms must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        locale = validate_locale(location, language)
+        if isinstance(locale, Response):
+            return locale
+        location, language = locale
+
+        try:
+            with request_work_context(request):
+                grid = SEOAPIService().fetch_local_rank_grid(
+                    keywords, website, location, language,
+                    size=size, spacing_km=spacing_km, center=center, budget_ms=budget_ms
+                )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        if grid is None:
+            return Response(
+                {"error": "Business not found in the maps results; pass lat and lng"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(grid)
+
+
+class SiteCrawlView(APIView):
+    def get(self, request):
+        if not is_privileged(request):
+            return Response(
+                {"error": "Site crawls require a profiling token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        website = canonical_host(request.query_params.get('domain', ''))
+        if not website:
+            return Response(
+                {"error": "Domain parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        limit = get_site_crawl_config()["MAX_PAGES"]
+        try:
+            max_pages = int(request.query_params.get('max_pages', 100))
+        except ValueError:
+            max_pages = 0
+        if not 1 <= max_pages <= limit:
+            return Response(
+                {"error": f"max_pages must be between 1 and {limit}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        budget_ms = parse_budget_ms(request)
+        if budget_ms is None:
+            return Response(
+                {"error": "budget_ms must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with request_work_context(request):
+                crawl = SEOAPIService().fetch_site_crawl(website, max_pages, budget_ms=budget_ms)
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        if crawl is None:
+            return Response(
+                {"error": "Failed to submit the crawl"},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
+        if crawl["status"] == "pending":
+            return Response(crawl, status=status.HTTP_202_ACCEPTED)
+        if crawl["status"] == "failed":
+            return Response(crawl, status=status.HTTP_502_BAD_GATEWAY)
+        return Response(crawl)
+
+
+class SiteCrawlPagesView(APIView):
+    def get(self, request, task_id):
+        """Every crawled page of a finished site crawl, as gzipped JSON lines"""
+        if not is_privileged(request):
+            return Response(
+                {"error": "Site crawls require a profiling token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        website = canonical_host(request.query_params.get('domain', ''))
+        path = crawl_pages_file(website, task_id) if website else None
+        if path is None or not path.exists():
+            return Response({"error": "Crawl not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+
+class LocaleAutocompleteView(APIView):
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        kind = request.query_params.get('type', 'location')
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            limit = 10
+
+        if kind not in ('location', 'language'):
+            return Response(
+                {"error": "type must be 'location' or 'language'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        index = get_locale_index()
+        names = index.locations if kind == 'location' else index.languages
+        results = [
+            {key: value for key, value in entry.items() if key != 'normalized_name'}
+            for entry in names.search(query, limit=limit)
+        ]
+        return Response({"results": results})
+
+
+class CompetitorIndexView(APIView):
+    def get(self, request):
+        location = request.query_params.get('location', 'United States')
+        domain = request.query_params.get('domain', '')
+        keyword = request.query_params.get('keyword', '')
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            limit = 20
+
+        locale = validate_locale(location, 'English')
+        if isinstance(locale, Response):
+            return locale
+        location, _ = locale
+
+        if keyword:
+            return Response({
+                "keyword": keyword,
+                "location": location,
+                "top_domains": top_domains_for_keyword(keyword, location, limit=limit)
+            })
+
+        if domain:
+            return Response({
+                "domain": domain,
+                "location": location,
+                "competitors": competitors_of(domain, location, limit=limit),
+                "rank": rank_among_competitors(domain, location)
+            })
+
+        return Response(
+            {"error": "Either domain or keyword parameter is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+
+class MetricHistoryView(APIView):
+    def get(self, request):
+        domain = canonical_host(request.query_params.get('domain', ''))
+        metric = request.query_params.get('metric', '')
+
+        if not domain:
+            return Response(
+                {"error": "Domain parameter is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        store = TimeSeriesStore()
+        if not metric:
+            return Response({"domain": domain, "metrics": store.metrics(domain)})
+
+        try:
+            start = parse_timestamp(request.query_params.get('start'))
+            end = parse_timestamp(request.query_params.get('end'))
+            points = int(request.query_params.get('points', settings.SEO_TIMESERIES_MAX_POINTS))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "domain": domain,
+            "metric": metric,
+            "start": start,
+            "end": end,
+            "points": store.read(domain, metric, start=start, end=end, points=points),
+        })
+
+
+class ExportView(APIView):
+    def get(self, request, kind, fmt):
+        if not is_privileged(request):
+            return Response(
+                {"error": "Exports require a profiling token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"Exports are {', '.join(sorted(EXPORTS))} as {', '.join(sorted(EXPORT_FORMATS))}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        filters = {"domain": request.query_params.get('domain', '')}
+        for name in ('since', 'until'):
+            value = request.query_params.get(name)
+            if value:
+                try:
+                    filters[name] = parse_datetime(value)
+                except ValueError:
+                    filters[name] = None
+                if filters[name] is None:
+                    return Response(
+                        {"error": f"{name} must be an ISO datetime"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+        filename = f"{kind}.{fmt}"
+        chunks = iter_export(kind, fmt, **filters)
+        if request.query_params.get('gzip') in ('1', 'true'):
+            response = StreamingHttpResponse(gzip_stream(chunks), content_type='application/gzip')
+            filename += '.gz'
+        else:
+            response = StreamingHttpResponse(chunks, content_type=f"{EXPORT_FORMATS[fmt]}; charset=utf-8")
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class TraceIndexView(APIView):
+    def get(self, request):
+        if not is_privileged(request):
+            return Response(
+                {"error": "Traces require a profiling token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 20
+
+        return Response({"traces": list_traces(limit=limit)})
+
+
+class TraceDetailView(APIView):
+    def get(self, request, trace_id):
+        if not is_privileged(request):
+            return Response(
+                {"error": "Traces require a profiling token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        trace = load_trace(trace_id)
+        if trace is None:
+            return Response({"error": "Trace not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(trace)
+
+
+class TraceWaterfallView(APIView):
+    def get(self, request, trace_id):
+        if not is_privileged(request):
+            return Response(
+                {"error": "Traces require a profiling token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        trace = load_trace(trace_id)
+        if trace is None:
+            return Response({"error": "Trace not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        total = trace["duration_ms"] or 1
+        rows = [
+            {
+                "span": span,
+                "indent": depth * 16,
+                "left": span["offset_ms"] / total * 100,
+                "width": max(span["duration_ms"] / total * 100, 0.2),
+            }
+            for span, depth in flatten_trace(trace)
+        ]
+        return render(request, "seo_api/trace_waterfall.html", {"trace": trace, "rows": rows})
+
+
+class ProfileIndexView(APIView):
+    def get(self, request):
+        if not is_privileged(request):
+            return Response(
+                {"error": "Profiling captures require a profiling token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 20
+
+        return Response({"captures": list_captures(limit=limit)})
+
+
+class ProfileDownloadView(APIView):
+    def get(self, request, capture_id, kind):
+        if not is_privileged(request):
+            return Response(
+                {"error": "Profiling captures require a profiling token"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        path = get_capture_file(capture_id, kind)
+        if not path:
+            return Response({"error": "Capture not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
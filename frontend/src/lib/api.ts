@@ -79,3 +79,26 @@ export async function fetchSEOReport(domain: string, keywords: string): Promise<
     throw error;
   }
 }
+
+export interface LocaleSuggestion {
+  code: number | string;
+  name: string;
+  type?: string;
+  country_iso_code?: string;
+}
+
+export async function fetchLocaleSuggestions(
+  query: string,
+  type: 'location' | 'language' = 'location'
+): Promise<LocaleSuggestion[]> {
+  const response = await fetch(
+    `${API_BASE_URL}/locations/autocomplete/?q=${encodeURIComponent(query)}&type=${type}`
+  );
+
+  if (!response.ok) {
+    throw new Error(`API error: ${response.status}`);
+  }
+
+  const data = await response.json();
+  return data.results;
+}